@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # Entrypoint script for Django Factory Maintenance System
-# Wait for PostgreSQL database and run migrations
+# Wait for PostgreSQL database and bootstrap the application
 
 set -e
 
@@ -20,33 +20,11 @@ if [ "$DB_HOST" != "" ]; then
     wait_for_postgres
 fi
 
-# Run database migrations
-echo "Running database migrations..."
-python manage.py migrate --noinput
-
-# Collect static files
-echo "Collecting static files..."
-python manage.py collectstatic --noinput --clear
-
-# Load initial data if fixtures exist
-if [ -f "maintenance/fixtures/initial_full.json" ]; then
-    echo "Loading initial data..."
-    python manage.py loaddata initial_full.json || echo "No fixtures to load or already loaded"
-fi
-
-# Create superuser if it doesn't exist (for development)
-if [ "$DJANGO_SUPERUSER_USERNAME" ] && [ "$DJANGO_SUPERUSER_PASSWORD" ] && [ "$DJANGO_SUPERUSER_EMAIL" ]; then
-    echo "Creating superuser..."
-    python manage.py shell -c "
-from django.contrib.auth import get_user_model
-User = get_user_model()
-if not User.objects.filter(username='$DJANGO_SUPERUSER_USERNAME').exists():
-    User.objects.create_superuser('$DJANGO_SUPERUSER_USERNAME', '$DJANGO_SUPERUSER_EMAIL', '$DJANGO_SUPERUSER_PASSWORD')
-    print('Superuser created successfully')
-else:
-    print('Superuser already exists')
-"
-fi
+# Collect static files, run system checks and migrations, load fixtures, refresh the journal
+# partitions / PM calendar / reliability snapshots and create the superuser in one Django process.
+# Steps with nothing to do (no pending migrations, unchanged static sources or fixtures) are skipped;
+# the PM calendar and reliability snapshots are only rebuilt when this run applied migrations or fixtures.
+python manage.py bootstrap
 
 echo "Starting application..."
 exec "$@"
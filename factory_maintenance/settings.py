@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 from pathlib import Path
+import importlib.util
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # โหลดค่าจาก .env file
@@ -54,11 +56,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # เพิ่มบรรทัดนี้
+    # WhiteNoise ที่รองรับ async (ดู maintenance/staticfiles.py) middleware ทุกตัวต้องรองรับ async
+    # ไม่เช่นนั้นภายใต้ uvicorn ทุก request (รวม async view) จะถูกย้ายไปทำงานใน thread
+    'maintenance.staticfiles.WhiteNoiseMiddleware',
+    'maintenance.instrumentation.InstrumentationMiddleware',  # เวลา/จำนวน query ต่อ request (ไม่นับ static)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'maintenance.journal.JournalMiddleware',  # เขียนประวัติใบงานของ request เป็นชุดเดียวตอนจบ
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -97,7 +103,7 @@ WSGI_APPLICATION = 'factory_maintenance.wsgi.application'
 # === PostgreSQL ===
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.getenv('DB_NAME', 'postgres'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
@@ -109,6 +115,84 @@ DATABASES = {
     }
 }
 
+# === Database connections ===
+# DB_POOL=auto (ค่าเริ่มต้น): ใช้ connection pool ของ psycopg 3 ถ้าติดตั้ง psycopg[pool] ไว้
+#   เหมาะกับ uvicorn (ASGI) ที่ query รันใน thread ต่างกัน แต่ละ worker process มี pool ของตัวเอง
+#   จำนวน connection สูงสุดต่อฐานข้อมูลจึงเป็น DB_POOL_MAX_SIZE x จำนวน worker
+# DB_POOL=0: ไม่ใช้ pool เก็บ connection ไว้ใช้ซ้ำ DB_CONN_MAX_AGE วินาที (0 = เปิดใหม่ทุก request)
+#   เหมาะกับ gunicorn แบบ sync worker (หนึ่ง thread ต่อ worker)
+# DB_HEALTH_CHECKS=1: ตรวจว่า connection ยังใช้ได้ก่อนนำกลับมาใช้ (เช่น หลังฐานข้อมูล restart)
+#   ทั้งแบบ pool (ตอนยืมจาก pool) และแบบ persistent (ต้น request)
+_db_pool = os.getenv('DB_POOL', 'auto').lower()
+_db_pool = importlib.util.find_spec('psycopg_pool') is not None if _db_pool == 'auto' else _db_pool in ('1', 'true', 'yes')
+DATABASES['default']['CONN_HEALTH_CHECKS'] = os.getenv('DB_HEALTH_CHECKS', '1').lower() in ('1', 'true', 'yes')
+if _db_pool:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),         # วินาทีที่รอ connection ว่างก่อน error
+        'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+
+
+# === Cache ===
+# ค่าเริ่มต้นใช้ไฟล์ (แชร์ได้ทุก worker บนเครื่องเดียวกัน จึงล้าง cache แล้วเห็นผลทุก worker)
+# ตั้ง REDIS_URL (เช่น redis://redis:6379/1) เพื่อใช้ Redis แทน (ต้องติดตั้งแพ็กเกจ redis เพิ่ม)
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'factory_maintenance_cache')),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+MAINTENANCE_CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', '600'))
+
+# === Instrumentation (maintenance/instrumentation.py) ===
+# สุ่ม request มาวัด query / template (0-1) และ log request ที่ช้ากว่า SLOW_REQUEST_MS เสมอ
+MAINTENANCE_METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '0.05'))
+MAINTENANCE_SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', '1000'))
+MAINTENANCE_METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'factory_maintenance_metrics'))
+# ถ้าตั้งไว้ /metrics ต้องส่ง Authorization: Bearer <token> (ถ้าไม่ตั้งต้องล็อกอินเป็น staff)
+MAINTENANCE_METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOG_DIR = os.getenv('LOG_DIR', os.path.join(BASE_DIR, 'logs'))
+os.makedirs(LOG_DIR, exist_ok=True)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        # แต่ละบรรทัดเป็น JSON ของหนึ่ง request
+        'json_lines': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'request_log': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(LOG_DIR, 'requests.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'json_lines',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'maintenance.requests': {
+            'handlers': ['request_log'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -153,6 +237,8 @@ STATICFILES_DIRS = [Path.joinpath(BASE_DIR, 'static')]
 # === Media files (User uploads) ===
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# location แบบ internal ของ nginx สำหรับ X-Accel-Redirect (เช่น /protected-media/) ว่าง = Django ส่งไฟล์เอง
+MAINTENANCE_MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -164,6 +250,22 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 
-# === WhiteNoise configuration for media files ===
-WHITENOISE_USE_FINDERS = True
-WHITENOISE_AUTOREFRESH = True
+# === Static files mode ===
+# STATIC_MODE=production: collectstatic ใส่ hash ในชื่อไฟล์ (manifest) และบีบอัด gzip / brotli ไว้ล่วงหน้า
+# WhiteNoise / nginx ส่งไฟล์ที่มี hash พร้อม Cache-Control immutable, Django ไม่มี route สำหรับ /static/
+# และ system check (maintenance/checks.py) ไม่ให้ start ถ้า template อ้างไฟล์ที่ไม่มี hash
+MAINTENANCE_STATIC_PRODUCTION = os.getenv('STATIC_MODE', 'development').lower() == 'production'
+
+if MAINTENANCE_STATIC_PRODUCTION:
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+    }
+    WHITENOISE_USE_FINDERS = False
+    WHITENOISE_AUTOREFRESH = False
+    # ไฟล์ที่มี hash ได้ max-age 10 ปี + immutable อัตโนมัติ ค่านี้ใช้กับไฟล์ที่ไม่มี hash เท่านั้น
+    WHITENOISE_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '3600'))
+else:
+    # โหมดพัฒนา: อ่านไฟล์จาก STATICFILES_DIRS โดยตรงและเห็นไฟล์ใหม่ทันที
+    WHITENOISE_USE_FINDERS = True
+    WHITENOISE_AUTOREFRESH = True
@@ -5,6 +5,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.static import serve
 from maintenance.forms import BootstrapAuthenticationForm
+from maintenance.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -24,12 +25,14 @@ urlpatterns = [
     path('', include('maintenance.urls')),
 ]
 
-# เพิ่ม static files และ media files สำหรับทั้ง development และ production
-urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
-# สำหรับ production - เพิ่มการให้บริการไฟล์ media โดยตรง
+# media ต้องล็อกอินและตรวจสิทธิ์ก่อน แล้วส่งไฟล์ผ่าน nginx (X-Accel-Redirect) หรือ FileResponse (ดู maintenance/media.py)
 urlpatterns += [
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
-    re_path(r'^static/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),
-]
\ No newline at end of file
+    re_path(r'^media/(?P<path>.+)$', serve_media, name='media'),
+]
+
+# โหมดพัฒนาเท่านั้น: production ให้ WhiteNoise / nginx ส่งไฟล์ static ที่มี hash เอง
+if not settings.MAINTENANCE_STATIC_PRODUCTION:
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+    urlpatterns += [
+        re_path(r'^static/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),
+    ]
\ No newline at end of file
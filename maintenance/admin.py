@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import MachineCategory, Location, Machine, MaintenancePlan, WorkOrder, WorkOrderTask, Attachment
+from .models import (
+    MachineCategory, Location, Machine, MaintenancePlan, WorkOrder, WorkOrderTask, Attachment,
+    ArchivedWorkOrder, ArchivedWorkOrderTask,
+)
 
 @admin.register(MachineCategory)
 class MachineCategoryAdmin(admin.ModelAdmin):
@@ -35,3 +38,28 @@ class WorkOrderAdmin(admin.ModelAdmin):
 @admin.register(Attachment)
 class AttachmentAdmin(admin.ModelAdmin):
     list_display = ['machine', 'workorder', 'uploaded_at']
+
+# ใบงานที่เก็บถาวร (archive.py) ดูได้อย่างเดียว
+class ArchivedWorkOrderTaskInline(admin.TabularInline):
+    model = ArchivedWorkOrderTask
+    extra = 0
+    can_delete = False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedWorkOrder)
+class ArchivedWorkOrderAdmin(admin.ModelAdmin):
+    list_display = ['code', 'wo_type', 'status', 'machine', 'reported_at', 'finished_at', 'archived_at']
+    list_filter = ['wo_type', 'status']
+    search_fields = ['code', 'machine__code', 'summary']
+    inlines = [ArchivedWorkOrderTaskInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
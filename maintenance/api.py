@@ -0,0 +1,304 @@
+"""
+JSON API แบบอ่านอย่างเดียวสำหรับระบบภายนอก (MES / แท็บเล็ตหน้าไลน์) แทนการอ่านหน้า HTML
+
+GET /api/<resource>/?fields=id,code&after=<id>&limit=100  ->  {"results": [...], "next": "..."}
+GET /api/<resource>/<pk>/?fields=...                       ->  {...}
+
+- fields: เลือกเฉพาะฟิลด์ที่ต้องการ (ไม่ระบุ = ทุกฟิลด์ใน default_fields)
+- อ่านด้วย values_list() ตามคอลัมน์ที่เลือกเท่านั้น ไม่สร้าง model instance
+  ฟิลด์ของ model ที่เกี่ยวข้อง (เช่น machine__code) ได้มาจาก JOIN ใน query เดียวกัน
+  ส่วนรายการลูก (tasks ของใบงาน) อ่านทีหลังด้วย query เดียวต่อหน้า (WHERE workorder_id IN ...)
+- เรียงตาม id และแบ่งหน้าด้วย keyset (?after=<id ของแถวสุดท้าย>)
+- ETag / Last-Modified มาจากเลขเวอร์ชันของกลุ่มข้อมูลใน caching.py
+  การ poll ซ้ำที่ข้อมูลไม่เปลี่ยนจึงได้ 304 โดยไม่ต้อง query ตารางข้อมูลเลย
+"""
+import hashlib
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from . import caching
+from .models import Attachment, Machine, MaintenancePlan, WorkOrder, WorkOrderEvent, WorkOrderTask
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+DEFAULT_EVENT_DAYS = 30
+
+
+def _file_url(name):
+    return default_storage.url(name) if name else None
+
+
+def _boolean(value):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(value)
+
+
+class ApiError(Exception):
+    """พารามิเตอร์ของ request ไม่ถูกต้อง: errors เป็น dict ชื่อพารามิเตอร์ -> รายการข้อความ"""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class Resource:
+    """
+    นิยาม resource ของ API
+    fields: ชื่อใน JSON -> lookup ของ values_list() (ข้าม relation ด้วย __ ได้)
+    converters: ชื่อใน JSON -> ฟังก์ชันแปลงค่า (เช่น ชื่อไฟล์ -> URL)
+    related: ชื่อใน JSON -> (model ลูก, ชื่อ FK ไปยัง resource นี้, ฟิลด์ของลูก)
+    filters: query param -> (lookup, ฟังก์ชันแปลงค่า)
+    depends_on: กลุ่มข้อมูลใน caching.py ที่ใช้ทำ ETag / Last-Modified
+    """
+    model = None
+    fields = {}
+    converters = {}
+    related = {}
+    filters = {}
+    depends_on = ()
+
+    @property
+    def default_fields(self):
+        return [*self.fields, *self.related]
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def select(self, raw):
+        """แปลง ?fields=a,b เป็นรายชื่อฟิลด์ (id อยู่เสมอ เพื่อใช้แบ่งหน้าและจับคู่รายการลูก)"""
+        if not raw:
+            return self.default_fields
+        names = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields and name not in self.related]
+        if unknown:
+            raise ApiError({'fields': [f'ไม่รู้จักฟิลด์: {", ".join(unknown)}']})
+        return ['id', *dict.fromkeys(name for name in names if name != 'id')]
+
+    def filter(self, queryset, params):
+        errors = {}
+        for param, (lookup, convert) in self.filters.items():
+            if param in params:
+                try:
+                    queryset = queryset.filter(**{lookup: convert(params[param])})
+                except ValueError:
+                    errors[param] = [f'ค่าไม่ถูกต้อง: {params[param]}']
+        if errors:
+            raise ApiError(errors)
+        return queryset
+
+    def serialize(self, queryset, names):
+        """อ่านแถวเป็น list ของ dict ตามฟิลด์ที่เลือก"""
+        columns = [name for name in names if name in self.fields]
+        rows = []
+        for values in queryset.values_list(*(self.fields[name] for name in columns)):
+            row = dict(zip(columns, values))
+            for name, convert in self.converters.items():
+                if name in row:
+                    row[name] = convert(row[name])
+            rows.append(row)
+        for name in names:
+            if name in self.related:
+                self.attach(rows, name)
+        return rows
+
+    def attach(self, rows, name):
+        """ใส่รายการลูกให้ทุกแถวของหน้าด้วย query เดียว"""
+        model, parent, child_fields = self.related[name]
+        children = {row['id']: [] for row in rows}
+        if children:
+            child_rows = (
+                model._default_manager.filter(**{f'{parent}__in': children})
+                .order_by(parent, 'pk').values(parent, *child_fields)
+            )
+            for child in child_rows:
+                children[child.pop(parent)].append(child)
+        for row in rows:
+            row[name] = children[row['id']]
+
+    def etag(self, request):
+        """ETag จากเวอร์ชันของข้อมูล + URL (ฟิลด์/ตัวกรอง/หน้าที่ต่างกันได้ ETag ต่างกัน)"""
+        parts = f'{caching.version_token(*self.depends_on)}:{request.get_full_path()}'
+        return '"{}"'.format(hashlib.md5(parts.encode(), usedforsecurity=False).hexdigest())
+
+    def last_modified(self):
+        return caching.last_modified(*self.depends_on)
+
+
+class MachineResource(Resource):
+    model = Machine
+    fields = {
+        'id': 'id',
+        'code': 'code',
+        'name': 'name',
+        'category_id': 'category_id',
+        'category': 'category__name',
+        'location_id': 'location_id',
+        'location': 'location__name',
+        'serial_no': 'serial_no',
+        'purchase_date': 'purchase_date',
+        'image': 'image',
+        'is_active': 'is_active',
+        'open_workorders': 'open_workorder_count',
+        'last_maintenance_at': 'last_maintenance_at',
+    }
+    converters = {'image': _file_url}
+    filters = {
+        'category': ('category_id', int),
+        'location': ('location_id', int),
+        'is_active': ('is_active', _boolean),
+    }
+    # open_workorders / last_maintenance_at เปลี่ยนตามใบงาน (counters.py ปรับด้วย UPDATE ที่ล้างกลุ่ม workorder)
+    depends_on = ('machine', 'workorder')
+
+
+class PlanResource(Resource):
+    model = MaintenancePlan
+    fields = {
+        'id': 'id',
+        'machine_id': 'machine_id',
+        'machine': 'machine__code',
+        'title': 'title',
+        'description': 'description',
+        'frequency_value': 'frequency_value',
+        'frequency_unit': 'frequency_unit',
+        'last_done_date': 'last_done_date',
+        'next_due_date': 'next_due_date',
+    }
+    filters = {'machine': ('machine_id', int)}
+    depends_on = ('machine', 'plan')
+
+
+class WorkOrderResource(Resource):
+    model = WorkOrder
+    fields = {
+        'id': 'id',
+        'code': 'code',
+        'wo_type': 'wo_type',
+        'priority': 'priority',
+        'status': 'status',
+        'machine_id': 'machine_id',
+        'machine': 'machine__code',
+        'plan_id': 'plan_id',
+        'reported_by': f'reported_by__{get_user_model().USERNAME_FIELD}',
+        'assigned_to': f'assigned_to__{get_user_model().USERNAME_FIELD}',
+        'reported_at': 'reported_at',
+        'due_date': 'due_date',
+        'started_at': 'started_at',
+        'finished_at': 'finished_at',
+        'summary': 'summary',
+        'notes': 'notes',
+        'task_total': 'task_total',
+        'task_done': 'task_done',
+    }
+    related = {'tasks': (WorkOrderTask, 'workorder_id', ('id', 'title', 'is_done'))}
+    filters = {
+        'machine': ('machine_id', int),
+        'status': ('status', str),
+        'wo_type': ('wo_type', str),
+        'assigned_to': ('assigned_to_id', int),
+    }
+    depends_on = ('machine', 'plan', 'workorder', 'user')
+
+
+class AttachmentResource(Resource):
+    model = Attachment
+    fields = {
+        'id': 'id',
+        'machine_id': 'machine_id',
+        'workorder_id': 'workorder_id',
+        'file': 'file',
+        'uploaded_at': 'uploaded_at',
+    }
+    converters = {'file': _file_url}
+    filters = {
+        'machine': ('machine_id', int),
+        'workorder': ('workorder_id', int),
+    }
+    depends_on = ('attachment',)
+
+
+class EventResource(Resource):
+    """
+    ประวัติการเปลี่ยนแปลงของใบงาน (journal.py) ในช่วง ?since=YYYY-MM-DD&until=YYYY-MM-DD (รวมวัน until)
+    ไม่ระบุ since = ย้อนหลัง MAINTENANCE_API_EVENT_DAYS วันจาก until ช่วงเวลาจึงมีเสมอ
+    และ PostgreSQL อ่านเฉพาะ partition ของช่วงนั้น
+    """
+    model = WorkOrderEvent
+    fields = {
+        'id': 'id',
+        'occurred_at': 'occurred_at',
+        'workorder_id': 'workorder_id',
+        'user': f'user__{get_user_model().USERNAME_FIELD}',
+        'kind': 'kind',
+        'task_id': 'task_id',
+        'value_from': 'value_from',
+        'value_to': 'value_to',
+    }
+    filters = {
+        'workorder': ('workorder_id', int),
+        'user': ('user_id', int),
+        'kind': ('kind', int),
+    }
+    depends_on = ('journal',)
+
+    def filter(self, queryset, params):
+        queryset = super().filter(queryset, params)
+        bounds = {}
+        for param in ('since', 'until'):
+            try:
+                day = date.fromisoformat(params[param]) if params.get(param) else None
+            except ValueError:
+                raise ApiError({param: ['ต้องเป็นวันที่รูปแบบ YYYY-MM-DD']})
+            bounds[param] = timezone.make_aware(datetime.combine(day, time.min)) if day else None
+        end = bounds['until'] + timedelta(days=1) if bounds['until'] else timezone.now()
+        start = bounds['since'] or end - timedelta(days=getattr(settings, 'MAINTENANCE_API_EVENT_DAYS',
+                                                                 DEFAULT_EVENT_DAYS))
+        return queryset.filter(occurred_at__gte=start, occurred_at__lt=end)
+
+
+RESOURCES = {
+    'machines': MachineResource(),
+    'plans': PlanResource(),
+    'workorders': WorkOrderResource(),
+    'attachments': AttachmentResource(),
+    'events': EventResource(),
+}
+
+
+def get_limit(raw):
+    maximum = getattr(settings, 'MAINTENANCE_API_MAX_LIMIT', MAX_LIMIT)
+    if not raw:
+        return min(DEFAULT_LIMIT, maximum)
+    if not raw.isdigit() or not 0 < int(raw) <= maximum:
+        raise ApiError({'limit': [f'ต้องเป็นตัวเลข 1-{maximum}']})
+    return int(raw)
+
+
+def list_page(resource, params):
+    """หน้าหนึ่งของรายการ คืนค่า (rows, id ของแถวสุดท้ายถ้ายังมีหน้าถัดไป)"""
+    names = resource.select(params.get('fields'))
+    limit = get_limit(params.get('limit'))
+    queryset = resource.filter(resource.get_queryset(), params).order_by('pk')
+    after = params.get('after')
+    if after:
+        if not after.isdigit():
+            raise ApiError({'after': ['ต้องเป็นตัวเลข']})
+        queryset = queryset.filter(pk__gt=int(after))
+    rows = resource.serialize(queryset[:limit + 1], names)
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]['id']
+    return rows, None
+
+
+def detail(resource, pk, params):
+    """แถวเดียวตาม pk หรือ None ถ้าไม่พบ"""
+    names = resource.select(params.get('fields'))
+    rows = resource.serialize(resource.get_queryset().filter(pk=pk), names)
+    return rows[0] if rows else None
@@ -0,0 +1,102 @@
+"""
+ย้ายใบงานที่ปิดแล้วและเก่าไปตารางเก็บถาวร (manage.py archive_workorders) ให้ตารางที่ใช้ทุกวันมีขนาดเล็ก
+
+- ใบงานที่ DONE / CANCELLED และปิดมานานกว่า MAINTENANCE_ARCHIVE_AFTER_DAYS วัน (ค่าเริ่มต้น 365)
+  ย้ายพร้อมงานย่อยและข้อมูลไฟล์แนบไปยัง ArchivedWorkOrder / ArchivedWorkOrderTask / ArchivedAttachment
+  (ตัวไฟล์ไม่ย้าย) ทีละชุดละหนึ่ง transaction โดยเก็บ id เดิม
+- ลบจากตารางหลักด้วย DELETE ตรง ๆ ไม่ผ่าน signal: ตัวนับของเครื่องจักร / WorkOrderStat / ประวัติใน
+  WorkOrderEvent ไม่เปลี่ยน เพราะใบงานยังอยู่ใน WorkOrderHistory (view ที่รวมสองตาราง)
+- หน้ารายการ / ค้นหา / API / export อ่านเฉพาะ WorkOrder ส่วนรายงานและการคำนวณย้อนหลัง
+  (reliability, metrics.rebuild, counters) อ่านจาก WorkOrderHistory
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import caching
+from .models import (
+    ArchivedAttachment, ArchivedWorkOrder, ArchivedWorkOrderTask, Attachment, WorkOrder, WorkOrderTask,
+)
+
+DEFAULT_AFTER_DAYS = 365
+# จำนวนใบงานต่อ transaction (id ของทั้งชุดอยู่ใน IN (...) จึงไม่ควรเกินขีดจำกัดพารามิเตอร์ของ SQLite)
+DEFAULT_BATCH_SIZE = 500
+CLOSED_STATUSES = (WorkOrder.STATUS_DONE, WorkOrder.STATUS_CANCEL)
+
+# (ตารางหลัก, ตารางเก็บถาวร) เรียงจากแม่ไปลูก
+COPIES = [
+    (WorkOrder, ArchivedWorkOrder),
+    (WorkOrderTask, ArchivedWorkOrderTask),
+    (Attachment, ArchivedAttachment),
+]
+
+
+def _columns(archive_model):
+    return [field.attname for field in archive_model._meta.concrete_fields if field.name != 'archived_at']
+
+
+def cutoff(after_days=None):
+    if after_days is None:
+        after_days = getattr(settings, 'MAINTENANCE_ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS)
+    return timezone.now() - timedelta(days=after_days)
+
+
+def candidates(before):
+    """
+    ใบงานที่ปิดก่อน before (ใบงานที่ยกเลิกไม่มี finished_at ใช้เวลาแจ้งแทน)
+    finished_at ไม่มีทางก่อน reported_at เงื่อนไข reported_at จึงใช้ index (status, reported_at) ได้
+    """
+    return WorkOrder.objects.filter(
+        Q(finished_at__lt=before) | Q(finished_at__isnull=True),
+        status__in=CLOSED_STATUSES, reported_at__lt=before,
+    )
+
+
+def _rows(model, ids):
+    if model is WorkOrder:
+        return model.objects.filter(pk__in=ids)
+    return model.objects.filter(workorder_id__in=ids)
+
+
+def _move(ids):
+    """ย้ายใบงานชุดหนึ่งพร้อมงานย่อยและไฟล์แนบ คืนค่าจำนวนแถวของแต่ละตาราง"""
+    moved = {}
+    for model, archive_model in COPIES:
+        rows = [archive_model(**row) for row in _rows(model, ids).values(*_columns(archive_model))]
+        archive_model.objects.bulk_create(rows)
+        moved[archive_model._meta.model_name] = len(rows)
+    # ลบลูกก่อนแม่ด้วย DELETE คำสั่งเดียวต่อตาราง ไม่ผ่าน Collector / signal
+    for model, _ in reversed(COPIES):
+        queryset = _rows(model, ids)
+        queryset._raw_delete(queryset.db)
+    return moved
+
+
+def archive(after_days=None, batch_size=None, limit=None, progress=None):
+    """
+    ย้ายใบงานที่เข้าเงื่อนไขทีละ batch_size ใบต่อ transaction (ไม่เกิน limit ใบ ถ้าระบุ)
+    แถวที่ถูกล็อกโดย request อื่นอยู่จะข้ามไปรอบหน้า คืนค่า dict ชื่อ model -> จำนวนแถวที่ย้าย
+    """
+    before = cutoff(after_days)
+    batch_size = batch_size or getattr(settings, 'MAINTENANCE_ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    totals = Counter()
+    last_id = 0
+    while limit is None or totals['archivedworkorder'] < limit:
+        size = batch_size if limit is None else min(batch_size, limit - totals['archivedworkorder'])
+        with transaction.atomic():
+            ids = list(
+                candidates(before).filter(pk__gt=last_id).order_by('pk')
+                .select_for_update(skip_locked=True).values_list('pk', flat=True)[:size]
+            )
+            if not ids:
+                break
+            totals.update(_move(ids))
+            caching.invalidate('workorder', 'attachment')
+        last_id = ids[-1]
+        if progress:
+            progress(dict(totals))
+    return dict(totals)
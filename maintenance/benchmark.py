@@ -0,0 +1,205 @@
+"""
+วัดความเร็วของทุกหน้า (manage.py benchmark) เพื่อจับว่าการแก้โค้ดทำให้หน้าไหนช้าลง
+
+- ไล่ทุก URL ใน maintenance/urls.py และหน้า changelist ของ admin ทุก model
+  URL ที่มีพารามิเตอร์ใช้ id ของข้อมูลแถวแรก (ควรรันบนข้อมูลจาก generate_factory_data)
+- เรียกด้วย django.test.Client ที่ล็อกอินเป็น superuser วัดเวลาและจำนวน query ต่อ request
+  รายงาน p50 / p95 / mean (ms) และจำนวน query
+- ผลบันทึกเป็น JSON เปรียบเทียบกับผลครั้งก่อนด้วย compare() เพื่อหา regression
+- connection_overhead() วัดต้นทุนการได้ connection ต่อ request แยกต่างหาก
+  (test client ปิดการปิด/คืน connection ระหว่าง request จึงไม่เห็นต้นทุนนี้ในการวัดหน้าเว็บ)
+"""
+import math
+import platform
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core import signals
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import api
+from .models import Machine, MaintenancePlan, WorkOrder
+from .urls import urlpatterns
+
+DEFAULT_ITERATIONS = 20
+DEFAULT_WARMUP = 2
+DEFAULT_CONNECTION_ITERATIONS = 200
+DEFAULT_THRESHOLD = 0.2
+# ความต่างที่น้อยกว่านี้ (ms) ถือเป็น noise ของการวัด
+MIN_DELTA_MS = 1.0
+BENCHMARK_USER = 'benchmark'
+
+# หน้าที่ไม่วัด: stream ที่ไม่จบ (SSE) และ endpoint ที่รับเฉพาะ POST
+SKIP = {'workorder_events', 'workorder_tasks_toggle'}
+# ค่าของพารามิเตอร์ที่ไม่ใช่ pk: ชื่อ URL -> รายการ kwargs ที่ต้องวัด
+EXTRA_KWARGS = {
+    'autocomplete': [{'kind': kind} for kind in ('machine', 'plan', 'user')],
+    'api_list': [{'resource': name} for name in api.RESOURCES],
+    'api_detail': [{'resource': name} for name in api.RESOURCES],
+}
+# ชื่อ URL -> model ของ <int:pk>
+PK_MODELS = {
+    'machine_detail': Machine,
+    'machine_edit': Machine,
+    'plan_edit': MaintenancePlan,
+    'workorder_edit': WorkOrder,
+    'workorder_tasks': WorkOrder,
+}
+
+
+def percentile(values, pct):
+    """percentile แบบ nearest-rank"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def targets():
+    """(ชื่อ, url) ของทุกหน้าที่จะวัด"""
+    found = []
+    for pattern in urlpatterns:
+        if not isinstance(pattern, URLPattern) or pattern.name in SKIP:
+            continue
+        for kwargs in EXTRA_KWARGS.get(pattern.name, [{}]):
+            kwargs = dict(kwargs)
+            if 'pk' in pattern.pattern.converters:
+                model = PK_MODELS.get(pattern.name)
+                if 'resource' in kwargs:
+                    model = api.RESOURCES[kwargs['resource']].model
+                pk = model._default_manager.order_by('pk').values_list('pk', flat=True).first() if model else None
+                if pk is None:
+                    continue
+                kwargs['pk'] = pk
+            name = ':'.join([pattern.name, *(str(v) for k, v in kwargs.items() if k != 'pk')])
+            found.append((name, reverse(pattern.name, kwargs=kwargs)))
+    for model in admin.site._registry:
+        opts = model._meta
+        found.append((f'admin:{opts.model_name}', reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')))
+    return found
+
+
+def _client():
+    User = get_user_model()
+    user = User.objects.filter(username=BENCHMARK_USER).first()
+    if user is None:
+        user = User.objects.create_superuser(BENCHMARK_USER, password=None)
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def measure(client, url, iterations, warmup, cold=False):
+    for _ in range(warmup):
+        client.get(url)
+    timings, queries, status = [], [], None
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(ctx.captured_queries))
+        status = response.status_code
+    return {'url': url, 'status': status, **_summary(timings), 'queries': max(queries)}
+
+
+def run(iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP, cold=False, only=None, progress=None):
+    """
+    วัดทุกหน้า (หรือเฉพาะชื่อที่มีคำใน only) คืนค่า dict ที่บันทึกเป็น JSON ได้
+    cold=True ล้าง cache ก่อนทุก request (วัดกรณี cache ว่าง)
+    """
+    client = _client()
+    results = {}
+    for name, url in targets():
+        if only and not any(word in name for word in only):
+            continue
+        results[name] = measure(client, url, iterations, warmup, cold)
+        if progress:
+            progress(name, results[name])
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'cache': settings.CACHES['default']['BACKEND'],
+            'iterations': iterations,
+            'warmup': warmup,
+            'cold': cold,
+            'rows': {model.__name__: model.objects.count() for model in (Machine, MaintenancePlan, WorkOrder)},
+        },
+        'results': results,
+    }
+
+
+def _summary(timings):
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+    }
+
+
+def connection_overhead(iterations=DEFAULT_CONNECTION_ITERATIONS, alias=DEFAULT_DB_ALIAS):
+    """
+    เวลาของ "ได้ connection + SELECT 1" ต่อหนึ่ง request
+    - reconnect: เปิด connection ใหม่ทุกครั้ง (ไม่มี pool และ CONN_MAX_AGE=0)
+    - configured: วงจร request ตาม settings ปัจจุบัน (request_started -> query -> request_finished)
+      ซึ่ง Django จะคืน connection เข้า pool หรือเก็บไว้ใช้ซ้ำตาม CONN_MAX_AGE
+    ต้องไม่อยู่ใน transaction เพราะ request_finished ปิด connection
+    """
+    configured = connections[alias]
+    fresh = connections.create_connection(alias)
+    options = {key: value for key, value in fresh.settings_dict['OPTIONS'].items() if key != 'pool'}
+    fresh.settings_dict = {**fresh.settings_dict, 'OPTIONS': options, 'CONN_MAX_AGE': 0}
+
+    def reconnect():
+        with fresh.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        fresh.close()
+
+    def request_cycle():
+        signals.request_started.send(sender=None)
+        with configured.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        signals.request_finished.send(sender=None)
+
+    results = {}
+    for name, cycle in (('reconnect', reconnect), ('configured', request_cycle)):
+        cycle()  # warmup: เปิด pool / connection แรก
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            cycle()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = _summary(timings)
+
+    pool = configured.settings_dict['OPTIONS'].get('pool')
+    results['mode'] = 'pool' if pool else f"conn_max_age={configured.settings_dict['CONN_MAX_AGE']}"
+    results['health_checks'] = configured.settings_dict['CONN_HEALTH_CHECKS']
+    results['speedup'] = round(results['reconnect']['mean_ms'] / max(results['configured']['mean_ms'], 1e-6), 1)
+    return results
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    หน้าที่ช้าลงกว่า baseline เกิน threshold (สัดส่วนของ p95) หรือใช้ query มากขึ้น
+    คืนค่า list ของ (ชื่อ, ข้อความ)
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > max(before['p95_ms'] * (1 + threshold), before['p95_ms'] + MIN_DELTA_MS):
+            regressions.append((name, f"p95 {before['p95_ms']} -> {result['p95_ms']} ms"))
+        if result['queries'] > before['queries']:
+            regressions.append((name, f"queries {before['queries']} -> {result['queries']}"))
+    return regressions
@@ -0,0 +1,134 @@
+"""
+ขั้นตอนเตรียมระบบตอน container start (manage.py bootstrap) ใน Django process เดียว
+
+แต่ละขั้นตอนตรวจก่อนว่ามีอะไรต้องทำหรือไม่ การ restart / scale-out จึงเร็วเมื่อไม่มีอะไรเปลี่ยน
+- migrate: ข้ามเมื่อ migration plan ว่าง
+- collectstatic: ข้ามเมื่อ hash ของไฟล์ต้นทาง (ทุก finder) ตรงกับที่บันทึกไว้ข้าง manifest ใน STATIC_ROOT
+- fixture: โหลดเมื่อ checksum ของไฟล์ต่างจากที่บันทึกใน BootstrapRecord
+- superuser: สร้างเมื่อยังไม่มีผู้ใช้ชื่อนั้น
+"""
+import hashlib
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+from . import counters, metrics
+from .models import BootstrapRecord
+
+DEFAULT_FIXTURES = ['initial_full.json']
+STATIC_HASH_FILE = '.source-hash'
+CHUNK_SIZE = 1 << 20
+
+
+def _file_digest(path, digest):
+    with open(path, 'rb') as fh:
+        while chunk := fh.read(CHUNK_SIZE):
+            digest.update(chunk)
+
+
+def migration_plan(database=DEFAULT_DB_ALIAS):
+    """migration ที่ยังไม่ได้ apply (list ว่างถ้าฐานข้อมูลเป็นปัจจุบันแล้ว)"""
+    executor = MigrationExecutor(connections[database])
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def static_source_hash():
+    """
+    hash ของไฟล์ static ต้นทางที่ collectstatic จะคัดลอก (ชื่อ + เนื้อหา ตามลำดับชื่อ) และ backend ของ storage
+    ไฟล์ชื่อซ้ำใช้ของ finder ตัวแรก เหมือน collectstatic
+    """
+    ignore = apps.get_app_config('staticfiles').ignore_patterns
+    sources = {}
+    for finder in finders.get_finders():
+        for path, storage in finder.list(ignore):
+            name = os.path.join(storage.prefix, path) if getattr(storage, 'prefix', None) else path
+            sources.setdefault(name, storage.path(path))
+    digest = hashlib.sha256(settings.STORAGES['staticfiles']['BACKEND'].encode())
+    for name in sorted(sources):
+        digest.update(name.encode() + b'\0')
+        _file_digest(sources[name], digest)
+    return digest.hexdigest()
+
+
+def _static_hash_path():
+    return os.path.join(settings.STATIC_ROOT, STATIC_HASH_FILE)
+
+
+def static_is_current(source_hash):
+    """STATIC_ROOT ถูก collect จากไฟล์ชุดนี้แล้ว และ manifest (ถ้า storage ใช้) ยังอยู่"""
+    manifest = getattr(staticfiles_storage, 'manifest_name', None)
+    if manifest and not os.path.exists(os.path.join(settings.STATIC_ROOT, manifest)):
+        return False
+    try:
+        with open(_static_hash_path()) as fh:
+            return fh.read().strip() == source_hash
+    except OSError:
+        return False
+
+
+def collect_static(source_hash, verbosity=0):
+    call_command('collectstatic', interactive=False, clear=True, verbosity=verbosity)
+    with open(_static_hash_path(), 'w') as fh:
+        fh.write(source_hash)
+
+
+def fixtures():
+    return getattr(settings, 'MAINTENANCE_BOOTSTRAP_FIXTURES', DEFAULT_FIXTURES)
+
+
+def fixture_path(name):
+    """path ของ fixture ในโฟลเดอร์ fixtures ของ app หรือ FIXTURE_DIRS (None ถ้าไม่พบ)"""
+    directories = [os.path.join(config.path, 'fixtures') for config in apps.get_app_configs()]
+    for directory in [*settings.FIXTURE_DIRS, *directories]:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def fixture_checksum(path):
+    digest = hashlib.sha256()
+    _file_digest(path, digest)
+    return digest.hexdigest()
+
+
+def load_fixture(name, verbosity=0):
+    """
+    โหลด fixture เมื่อเนื้อหาเปลี่ยนจากครั้งที่บันทึกไว้ คืนค่า 'loaded' / 'unchanged' / 'missing'
+    บันทึก checksum หลังโหลดสำเร็จเท่านั้น ถ้าโหลดไม่สำเร็จจะลองใหม่ตอน start ครั้งหน้า
+    loaddata บันทึกแบบ raw (ไม่ปรับตัวนับ / WorkOrderStat และเขียนทับตัวนับด้วยค่าใน fixture)
+    จึงคำนวณตัวนับและสถิติใหม่ทั้งหมดหลังโหลด
+    """
+    path = fixture_path(name)
+    if path is None:
+        return 'missing'
+    checksum = fixture_checksum(path)
+    key = f'fixture:{name}'
+    if BootstrapRecord.objects.filter(name=key, checksum=checksum).exists():
+        return 'unchanged'
+    call_command('loaddata', path, verbosity=verbosity)
+    counters.rebuild()
+    metrics.rebuild()
+    BootstrapRecord.objects.update_or_create(name=key, defaults={'checksum': checksum})
+    return 'loaded'
+
+
+def ensure_superuser(username, email, password):
+    """สร้าง superuser ถ้ายังไม่มีผู้ใช้ชื่อนี้ (ไม่แก้รหัสผ่านของผู้ใช้ที่มีอยู่) คืนค่า True ถ้าสร้างใหม่"""
+    User = get_user_model()
+    if User.objects.filter(**{User.USERNAME_FIELD: username}).exists():
+        return False
+    try:
+        with transaction.atomic():
+            User.objects.create_superuser(username, email, password)
+    except IntegrityError:
+        # container อื่นที่ start พร้อมกันสร้างไปก่อนแล้ว
+        return False
+    return True
@@ -0,0 +1,108 @@
+"""
+Cache ของหน้าเว็บที่อ่านบ่อยแต่ข้อมูลเปลี่ยนไม่บ่อย (แดชบอร์ด หน้ารายการ ตารางแผนของเครื่องจักร)
+
+ใช้ key แบบมีเวอร์ชัน: แต่ละกลุ่มข้อมูล (machine / plan / workorder) มีเลขเวอร์ชันเก็บใน cache
+และทุก key ที่ขึ้นกับกลุ่มนั้นจะมีเลขเวอร์ชันอยู่ใน key ด้วย
+เมื่อข้อมูลเปลี่ยน (signals.py หรืองานแบบ bulk) เพิ่มเลขเวอร์ชันหลัง commit
+key เดิมทั้งหมดจึงใช้ไม่ได้ทันที โดยไม่ต้องรู้ว่ามี key ของ query params ใดบ้าง
+(key เก่าหมดอายุตาม timeout เอง)
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'maintenance'
+DEFAULT_TIMEOUT = 600
+
+
+def get_timeout():
+    return getattr(settings, 'MAINTENANCE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _version_key(label):
+    return f'{KEY_PREFIX}:version:{label}'
+
+
+def _modified_key(label):
+    return f'{KEY_PREFIX}:modified:{label}'
+
+
+def versions(labels):
+    """เลขเวอร์ชันปัจจุบันของแต่ละกลุ่มข้อมูล (อ่านด้วย get_many ครั้งเดียว)"""
+    keys = [_version_key(label) for label in labels]
+    found = cache.get_many(keys)
+    # เริ่มจากเวลาปัจจุบัน: ถ้า key เวอร์ชันถูกลบไป จะไม่วนกลับมาใช้เลขเดิมที่ยังค้างใน cache
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def version_token(*labels):
+    return '-'.join(str(v) for v in versions(labels))
+
+
+def last_modified(*labels):
+    """เวลา (epoch วินาที) ที่กลุ่มข้อมูลใดกลุ่มหนึ่งเปลี่ยนล่าสุด ใช้ทำ Last-Modified ของ API"""
+    keys = [_modified_key(label) for label in labels]
+    found = cache.get_many(keys)
+    missing = {key: int(time.time()) for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return max(found.values())
+
+
+def bump(*labels):
+    now = int(time.time())
+    for label in labels:
+        key = _version_key(label)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    cache.set_many({_modified_key(label): now for label in labels}, None)
+
+
+def invalidate(*labels):
+    """ล้าง cache ของกลุ่มข้อมูลหลัง transaction commit (กันการ cache ข้อมูลเก่าระหว่าง transaction)"""
+    transaction.on_commit(lambda: bump(*labels))
+
+
+def make_key(name, labels, parts=()):
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'{KEY_PREFIX}:{name}:{version_token(*labels)}:{digest}'
+
+
+def get_or_set(name, labels, parts, default, timeout=None):
+    """
+    อ่านค่าจาก cache หรือคำนวณด้วย default() แล้วเก็บไว้
+    labels: กลุ่มข้อมูลที่ค่านี้ขึ้นอยู่ด้วย parts: ค่าอื่นที่ทำให้ผลต่างกัน (เช่น query params)
+    """
+    key = make_key(name, labels, parts)
+    value = cache.get(key)
+    if value is None:
+        value = default()
+        cache.set(key, value, timeout or get_timeout())
+    return value
+
+
+class CachedPageMixin:
+    """
+    Mixin สำหรับ ListView ที่ใช้ KeysetPaginationMixin: cache ผลของแต่ละหน้าตาม path + query params
+    cache_depends_on: กลุ่มข้อมูลที่หน้านี้แสดง (เปลี่ยนเมื่อไหร่ cache ของหน้าทั้งหมดใช้ไม่ได้)
+    ผลการค้นหา (Paginator ปกติ) ไม่ถูก cache
+    """
+    cache_depends_on = ()
+
+    def paginate_queryset(self, queryset, page_size):
+        paginate = super().paginate_queryset
+        if not self.get_keyset_fields():
+            return paginate(queryset, page_size)
+        parts = (self.request.path, sorted(self.request.GET.lists()), page_size)
+        return get_or_set(type(self).__name__, self.cache_depends_on, parts,
+                          lambda: paginate(queryset, page_size))
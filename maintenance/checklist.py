@@ -0,0 +1,191 @@
+"""
+บันทึกรายการงานย่อย (checklist) ของใบสั่งงานเป็นชุด
+
+แผน PM หนึ่งแผนอาจมีงานย่อยหลายสิบข้อ การบันทึกทีละแถวจึงเป็น UPDATE/INSERT/DELETE หลายสิบคำสั่ง
+apply() รวมการเปลี่ยนแปลงทั้งหมดใน transaction เดียว: bulk_create งานใหม่ bulk_update งานที่แก้
+และ DELETE ครั้งเดียวสำหรับงานที่ลบ ใช้ได้ทั้งจาก formset (save_formset) และ JSON API
+(views.WorkOrderChecklistView) ส่วน toggle() เปลี่ยน is_done หลายข้อด้วย UPDATE เดียว
+
+งานแบบ bulk ไม่ส่ง signal จึงปรับตัวนับ task_total / task_done (counters.py) ล้าง cache
+บันทึกประวัติ (journal.py) และแจ้งความคืบหน้า (events) เองหลัง commit
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import caching, counters, events, journal
+from .models import WorkOrder, WorkOrderEvent, WorkOrderTask
+
+UPDATE_FIELDS = ['title', 'is_done']
+
+
+def ratio(done, total):
+    return round(done / total, 4) if total else 0
+
+
+def progress(workorder_id):
+    """
+    จำนวนงานย่อยทั้งหมด / ที่เสร็จแล้ว (ตัวนับบน WorkOrder) และสัดส่วนความคืบหน้า (0-1)
+    คืนค่า None ถ้าไม่มีใบงานนี้แล้ว
+    """
+    counts = WorkOrder.objects.filter(pk=workorder_id).values('task_total', 'task_done').first()
+    if counts is None:
+        return None
+    counts['ratio'] = ratio(counts['task_done'], counts['task_total'])
+    return counts
+
+
+def publish_progress(workorder_id):
+    """แจ้งความคืบหน้าของใบงานไปยังหน้าเว็บที่เปิดอยู่ หลัง transaction commit"""
+    def publish():
+        counts = progress(workorder_id)
+        if counts is None:
+            # ใบงานถูกลบก่อน commit
+            return
+        del counts['ratio']
+        events.publish('task', id=workorder_id, **counts)
+    transaction.on_commit(publish)
+
+
+def _changed(workorder_id):
+    caching.invalidate('workorder')
+    publish_progress(workorder_id)
+
+
+def apply(workorder, created=(), updated=(), deleted=()):
+    """
+    บันทึกการเปลี่ยนแปลงงานย่อยของใบงานใน transaction เดียว
+    created / updated: instance ของ WorkOrderTask (updated ต้องเป็นงานของใบงานนี้)
+    deleted: instance หรือ pk ของงานที่ต้องลบ
+    """
+    created = list(created)
+    updated = [task for task in updated if task.pk]
+    deleted = [getattr(task, 'pk', task) for task in deleted]
+    if not (created or updated or deleted):
+        return
+    for task in created:
+        task.workorder = workorder
+    with transaction.atomic():
+        # ค่าเดิมของงานที่แก้/ลบ สำหรับบันทึกประวัติ (query เดียว)
+        previous = {}
+        if updated or deleted:
+            previous = {
+                pk: (title, is_done) for pk, title, is_done in
+                WorkOrderTask.objects.filter(workorder=workorder, pk__in=[task.pk for task in updated] + deleted)
+                .values_list('pk', 'title', 'is_done')
+            }
+        if deleted:
+            # ลบด้วย DELETE คำสั่งเดียวโดยไม่ผ่าน Collector (ซึ่งจะ SELECT ก่อนและส่ง post_delete ทีละแถว)
+            # WorkOrderTask ไม่มีตารางอื่นอ้างถึง จึงไม่มีอะไรต้อง cascade
+            queryset = WorkOrderTask.objects.filter(workorder=workorder, pk__in=deleted)
+            queryset._raw_delete(queryset.db)
+        if updated:
+            WorkOrderTask.objects.bulk_update(updated, UPDATE_FIELDS)
+        if created:
+            WorkOrderTask.objects.bulk_create(created)
+        counters.refresh_tasks(WorkOrder.objects.filter(pk=workorder.pk))
+        history = []
+        for pk in deleted:
+            if pk in previous:
+                history += journal.task_events(workorder.pk, pk, previous[pk], None)
+        for task in updated:
+            history += journal.task_events(workorder.pk, task.pk, previous.get(task.pk), (task.title, task.is_done))
+        for task in created:
+            history += journal.task_events(workorder.pk, task.pk, None, (task.title, task.is_done))
+        journal.record(*history)
+        _changed(workorder.pk)
+
+
+def toggle(workorder, ids, is_done):
+    """
+    ตั้ง is_done ของงานย่อยหลายข้อด้วย UPDATE เดียว คืนค่าจำนวนแถวที่เปลี่ยน
+    ล็อกแถวที่จะเปลี่ยนก่อน เพื่อให้ประวัติตรงกับแถวที่ UPDATE จริง
+    """
+    with transaction.atomic():
+        changed = list(
+            WorkOrderTask.objects.filter(workorder=workorder, pk__in=ids)
+            .exclude(is_done=is_done)
+            .select_for_update()
+            .values_list('pk', flat=True)
+        )
+        if changed:
+            WorkOrderTask.objects.filter(pk__in=changed).update(is_done=is_done)
+            count = len(changed)
+            counters.add_tasks(workorder.pk, done=count if is_done else -count)
+            kind = WorkOrderEvent.KIND_TASK_DONE if is_done else WorkOrderEvent.KIND_TASK_REOPENED
+            journal.record(*(journal.event(workorder.pk, kind, task_id=pk) for pk in changed))
+            _changed(workorder.pk)
+    return len(changed)
+
+
+def save_formset(formset):
+    """บันทึก WorkOrderTaskFormSet ที่ผ่านการตรวจสอบแล้วด้วย apply() แทนการ save ทีละฟอร์ม"""
+    formset.save(commit=False)
+    apply(
+        formset.instance,
+        created=formset.new_objects,
+        updated=[task for task, _ in formset.changed_objects],
+        deleted=formset.deleted_objects,
+    )
+
+
+def _task(data, instance=None):
+    if not isinstance(data, dict):
+        raise ValidationError('ต้องเป็น object')
+    task = instance or WorkOrderTask()
+    if 'title' in data:
+        task.title = str(data['title']).strip()
+    if 'is_done' in data:
+        if not isinstance(data['is_done'], bool):
+            raise ValidationError({'is_done': 'ต้องเป็น true หรือ false'})
+        task.is_done = data['is_done']
+    task.clean_fields(exclude=['workorder'])
+    return task
+
+
+def parse_changes(workorder, payload):
+    """
+    แปลง payload ของ JSON API เป็นอาร์กิวเมนต์ของ apply()
+        {"create": [{"title": ..., "is_done": ...}],
+         "update": [{"id": ..., "title": ..., "is_done": ...}],
+         "delete": [id, ...]}
+    งานที่อ้างถึงโหลดด้วย query เดียว คืนค่า (changes, errors) โดย errors เป็น dict ตามตำแหน่งรายการ
+    """
+    if not isinstance(payload, dict):
+        return None, {'__all__': ['ต้องเป็น JSON object']}
+    errors = {}
+    lists = {}
+    for key in ('create', 'update', 'delete'):
+        lists[key] = payload.get(key) or []
+        if not isinstance(lists[key], list):
+            errors[key] = ['ต้องเป็น list']
+    if errors:
+        return None, errors
+
+    ids = [item.get('id') for item in lists['update'] if isinstance(item, dict)] + lists['delete']
+    if not all(type(pk) is int for pk in ids):
+        return None, {'__all__': ['id ต้องเป็นตัวเลข']}
+    existing = WorkOrderTask.objects.filter(workorder=workorder).in_bulk(ids) if ids else {}
+
+    changes = {'created': [], 'updated': [], 'deleted': []}
+    for i, data in enumerate(lists['create']):
+        try:
+            if not isinstance(data, dict) or 'title' not in data:
+                raise ValidationError({'title': 'จำเป็นต้องระบุ'})
+            changes['created'].append(_task(data))
+        except ValidationError as e:
+            errors[f'create.{i}'] = e.messages
+    for i, data in enumerate(lists['update']):
+        task = existing.get(data['id']) if isinstance(data, dict) else None
+        if task is None:
+            errors[f'update.{i}'] = ['ไม่พบงานย่อยนี้ในใบงาน']
+            continue
+        try:
+            changes['updated'].append(_task(data, task))
+        except ValidationError as e:
+            errors[f'update.{i}'] = e.messages
+    for i, pk in enumerate(lists['delete']):
+        if pk not in existing:
+            errors[f'delete.{i}'] = ['ไม่พบงานย่อยนี้ในใบงาน']
+        else:
+            changes['deleted'].append(pk)
+    return (None, errors) if errors else (changes, {})
@@ -0,0 +1,86 @@
+"""
+System check ของการอ้าง static files ใน template (รันกับทุกคำสั่ง manage.py ที่ตรวจ check รวมถึง migrate
+ใน entrypoint ระบบจึงไม่ start ถ้าไม่ผ่าน)
+
+- maintenance.E001: template อ้าง /static/... หรือ STATIC_URL ตรง ๆ แทน {% static %} ในโหมด production
+  path แบบนี้ไม่มี hash จึง cache แบบ immutable ไม่ได้ และ browser จะได้ไฟล์เก่าหลัง deploy
+- maintenance.E002: โหมด production (MAINTENANCE_STATIC_PRODUCTION) แต่ไฟล์ใน {% static '...' %}
+  ไม่มีใน manifest ของ collectstatic (ยังไม่รัน collectstatic หรือไฟล์หายไป) หน้านั้นจะ error ตอน render
+"""
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.checks import Error, Tags, register
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+_STATIC_TAG = re.compile(r"""{%\s*static\s+(["'])(?P<name>[^"']+)\1""")
+
+
+def _hardcoded_pattern():
+    prefixes = [r'{{\s*STATIC_URL\s*}}', r'{%\s*get_static_prefix\s*%}']
+    if settings.STATIC_URL:
+        prefixes.append(r'(?<=["\'(=\s])' + re.escape(settings.STATIC_URL))
+    return re.compile('|'.join(prefixes))
+
+
+def _templates():
+    """(path, เนื้อหา) ของทุก template ในทุก engine แบบ Django templates"""
+    seen = set()
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for directory in engine.template_dirs:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    path = os.path.join(root, name)
+                    if path in seen:
+                        continue
+                    seen.add(path)
+                    try:
+                        with open(path, encoding='utf-8') as fh:
+                            yield path, fh.read()
+                    except (OSError, UnicodeDecodeError):
+                        continue
+
+
+def _line(text, offset):
+    return text.count('\n', 0, offset) + 1
+
+
+@register(Tags.templates)
+def check_static_references(app_configs=None, **kwargs):
+    if not getattr(settings, 'MAINTENANCE_STATIC_PRODUCTION', False):
+        return []
+    errors = []
+    hardcoded = _hardcoded_pattern()
+    referenced = {}
+    for path, text in _templates():
+        for match in hardcoded.finditer(text):
+            errors.append(Error(
+                f'{path}:{_line(text, match.start())} references a static asset without {{% static %}}.',
+                hint="Use {% static 'path' %} so the hashed file name is rendered.",
+                id='maintenance.E001',
+            ))
+        for match in _STATIC_TAG.finditer(text):
+            referenced.setdefault(match['name'], f'{path}:{_line(text, match.start())}')
+
+    if referenced and not staticfiles_storage.hashed_files:
+        errors.append(Error(
+            f'The static manifest {staticfiles_storage.manifest_name!r} is missing or empty.',
+            hint='Run collectstatic before starting.',
+            id='maintenance.E002',
+        ))
+        return errors
+    for name, where in referenced.items():
+        try:
+            staticfiles_storage.stored_name(name)
+        except ValueError:
+            errors.append(Error(
+                f'{where} references {name!r}, which has no hashed entry in the static manifest.',
+                hint='Run collectstatic before starting, or fix the asset path.',
+                id='maintenance.E002',
+            ))
+    return errors
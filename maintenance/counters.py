@@ -0,0 +1,128 @@
+"""
+ตัวนับแบบ denormalized บน Machine และ WorkOrder
+
+- Machine.open_workorder_count: จำนวนใบงานที่ยังไม่ปิด (OPEN / IN_PROGRESS)
+- Machine.last_maintenance_at: finished_at ล่าสุดของใบงานที่ DONE (รวมใบงานที่เก็บถาวรแล้ว)
+- WorkOrder.task_total / task_done: จำนวนงานย่อยทั้งหมด / ที่เสร็จแล้ว
+
+หน้ารายการจึงแสดง เรียง และกรองตามค่าเหล่านี้ได้จากคอลัมน์ของแถวเอง (มี index)
+แทน COUNT subquery ต่อแถว ตัวนับถูกปรับแบบ atomic ด้วย F() จาก signals.py
+และจากงาน bulk (importer / checklist) ถ้าสงสัยว่าไม่ตรงให้รัน manage.py rebuild_counters
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from . import caching
+from .models import Machine, WorkOrder, WorkOrderHistory, WorkOrderTask
+
+OPEN_STATUSES = (WorkOrder.STATUS_OPEN, WorkOrder.STATUS_INPROG)
+REBUILD_BATCH = 10000
+
+
+def workorder_state(values):
+    """(machine_id, เปิดอยู่หรือไม่, finished_at ถ้า DONE) จาก dict ของใบงาน"""
+    finished = values['finished_at'] if values['status'] == WorkOrder.STATUS_DONE else None
+    return values['machine_id'], values['status'] in OPEN_STATUSES, finished
+
+
+def add_open(machine_id, delta):
+    if delta:
+        Machine.objects.filter(pk=machine_id).update(open_workorder_count=F('open_workorder_count') + delta)
+
+
+def bump_last_maintenance(machine_id, finished_at):
+    """เลื่อน last_maintenance_at ไปข้างหน้าเท่านั้น (UPDATE แบบมีเงื่อนไข จึงไม่ชนกับ request อื่น)"""
+    Machine.objects.filter(
+        Q(last_maintenance_at__isnull=True) | Q(last_maintenance_at__lt=finished_at), pk=machine_id,
+    ).update(last_maintenance_at=finished_at)
+
+
+def _last_maintenance():
+    done = (
+        WorkOrderHistory.objects.filter(machine=OuterRef('pk'), status=WorkOrder.STATUS_DONE)
+        .order_by().values('machine').annotate(last=Max('finished_at')).values('last')
+    )
+    return Subquery(done)
+
+
+def refresh_last_maintenance(machine_id):
+    """คำนวณ last_maintenance_at ใหม่ เมื่อใบงานที่ DONE ถูกเปิดใหม่ ย้ายเครื่อง หรือถูกลบ"""
+    Machine.objects.filter(pk=machine_id).update(last_maintenance_at=_last_maintenance())
+
+
+def workorder_changed(old, new):
+    """
+    ปรับตัวนับของเครื่องจักรจากสถานะเดิม/ใหม่ของใบงาน (ผลของ workorder_state หรือ None)
+    old=None คือสร้างใหม่ new=None คือถูกลบ
+    """
+    old_machine, old_open, old_finished = old or (None, False, None)
+    new_machine, new_open, new_finished = new or (None, False, None)
+    if old_open and (not new_open or old_machine != new_machine):
+        add_open(old_machine, -1)
+    if new_open and (not old_open or old_machine != new_machine):
+        add_open(new_machine, 1)
+    if old_finished and (old_machine != new_machine or not new_finished or new_finished < old_finished):
+        refresh_last_maintenance(old_machine)
+    if new_finished and new_finished != old_finished:
+        bump_last_maintenance(new_machine, new_finished)
+
+
+def record_created(workorders):
+    """ปรับตัวนับของใบงานที่สร้างด้วย bulk_create: query ต่อเครื่องจักร ไม่ใช่ต่อใบงาน"""
+    opened = Counter()
+    finished = {}
+    for wo in workorders:
+        machine_id, is_open, finished_at = workorder_state(wo.__dict__)
+        opened[machine_id] += is_open
+        if finished_at and (machine_id not in finished or finished[machine_id] < finished_at):
+            finished[machine_id] = finished_at
+    for machine_id, delta in opened.items():
+        add_open(machine_id, delta)
+    for machine_id, finished_at in finished.items():
+        bump_last_maintenance(machine_id, finished_at)
+
+
+def add_tasks(workorder_id, total=0, done=0):
+    if total or done:
+        WorkOrder.objects.filter(pk=workorder_id).update(
+            task_total=F('task_total') + total, task_done=F('task_done') + done)
+
+
+def _task_count(**filters):
+    tasks = (
+        WorkOrderTask.objects.filter(workorder=OuterRef('pk'), **filters)
+        .order_by().values('workorder').annotate(n=Count('pk')).values('n')
+    )
+    return Coalesce(Subquery(tasks), 0)
+
+
+def refresh_tasks(workorders):
+    """นับงานย่อยของใบงานที่ระบุ (queryset) ใหม่ด้วย UPDATE เดียว"""
+    return workorders.update(task_total=_task_count(), task_done=_task_count(is_done=True))
+
+
+def rebuild():
+    """
+    คำนวณตัวนับทั้งหมดใหม่จากข้อมูลจริง คืนค่า (จำนวนเครื่องจักร, จำนวนใบงาน)
+    ใบงานถูกปรับเป็นช่วง id ละ REBUILD_BATCH แถว เพื่อไม่ให้ transaction เดียวล็อกทั้งตาราง
+    """
+    open_count = (
+        WorkOrder.objects.filter(machine=OuterRef('pk'), status__in=OPEN_STATUSES)
+        .order_by().values('machine').annotate(n=Count('pk')).values('n')
+    )
+    with transaction.atomic():
+        machines = Machine.objects.update(
+            open_workorder_count=Coalesce(Subquery(open_count), 0),
+            last_maintenance_at=_last_maintenance(),
+        )
+
+    workorders = 0
+    last_id = WorkOrder.objects.aggregate(last=Max('pk'))['last'] or 0
+    for start in range(0, last_id, REBUILD_BATCH):
+        with transaction.atomic():
+            workorders += refresh_tasks(WorkOrder.objects.filter(pk__gt=start, pk__lte=start + REBUILD_BATCH))
+    caching.invalidate('machine', 'workorder')
+    return machines, workorders
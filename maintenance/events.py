@@ -0,0 +1,169 @@
+"""
+ส่งเหตุการณ์ของ Work Order (สถานะ / ผู้รับผิดชอบ / งานย่อย) ไปยังหน้าเว็บแบบ real-time
+
+signals.py เรียก publish() หลัง transaction commit แล้ว broker ส่งต่อให้ทุก connection ของ
+Server-Sent Events (views.workorder_events) ที่เปิดอยู่ หน้าเว็บจึงไม่ต้อง refresh ซ้ำ ๆ
+
+- InProcessBroker: ส่งถึงผู้ฟังภายใน process เดียวกันเท่านั้น (เหมาะกับ dev / worker เดียว)
+- PostgresBroker: ใช้ LISTEN/NOTIFY ของ PostgreSQL ส่งข้าม worker / process ได้
+  (รวมถึงคำสั่ง management ที่รันแยก) โดยไม่ต้องมีบริการเพิ่ม
+เลือก broker เองได้ด้วย settings.MAINTENANCE_EVENT_BROKER (dotted path)
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+CHANNEL = 'maintenance_events'
+
+
+class Subscription:
+    """คิวเหตุการณ์ของผู้ฟังหนึ่งราย (หนึ่ง connection SSE) ผูกกับ event loop ที่สร้าง"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, event):
+        # ผู้ฟังที่ช้าจะเสียเหตุการณ์เก่าสุดแทนการทำให้หน่วยความจำโตไม่จำกัด
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """รอเหตุการณ์ถัดไป ถ้าเกิน timeout จะ raise asyncio.TimeoutError"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """broker ภายใน process: publish จาก thread ใดก็ได้ ส่งเข้า event loop ของผู้ฟังอย่างปลอดภัย"""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        self.deliver(event)
+
+    def deliver(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # event loop ของผู้ฟังปิดไปแล้ว
+                self.unsubscribe(subscription)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    publish ด้วย pg_notify บน connection ปกติของ Django
+    แต่ละ process มี thread ฟัง (LISTEN) หนึ่งตัวบน connection แยก เริ่มเมื่อมีผู้ฟังรายแรก
+    และเริ่มใหม่ในการ subscribe ครั้งถัดไปถ้า connection หลุด
+    """
+    poll_interval = 5
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self):
+        subscription = super().subscribe()
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='event-listener', daemon=True)
+                self._listener.start()
+        return subscription
+
+    def publish(self, event):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, json.dumps(event)])
+
+    def _listen(self):
+        conn = None
+        try:
+            # connection แยกที่ไม่ได้มาจาก pool เพราะถือไว้ตลอดอายุ process
+            conn = connection.Database.connect(**connection.get_connection_params())
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while True:
+                for notify in self._notifies(conn):
+                    self.deliver(json.loads(notify.payload))
+        except Exception:
+            logger.exception('Event listener stopped')
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _notifies(self, conn):
+        """การแจ้งเตือนที่เข้ามาภายใน poll_interval วินาที (รองรับทั้ง psycopg 3 และ psycopg2)"""
+        if not hasattr(conn, 'poll'):
+            return list(conn.notifies(timeout=self.poll_interval))
+        if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+            return []
+        conn.poll()
+        notifies, conn.notifies[:] = list(conn.notifies), []
+        return notifies
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, 'MAINTENANCE_EVENT_BROKER', None)
+            if path:
+                _broker = import_string(path)()
+            elif connection.vendor == 'postgresql':
+                _broker = PostgresBroker()
+            else:
+                _broker = InProcessBroker()
+        return _broker
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    global _broker
+    if setting == 'MAINTENANCE_EVENT_BROKER':
+        _broker = None
+
+
+def publish(event_type, **data):
+    try:
+        get_broker().publish({'type': event_type, **data})
+    except Exception:
+        # การแจ้งเตือนแบบ real-time ไม่ควรทำให้การบันทึกข้อมูลล้มเหลว
+        logger.exception('Cannot publish %s event', event_type)
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
@@ -0,0 +1,156 @@
+"""
+พยากรณ์รอบ PM ล่วงหน้าของทุกแผน แล้วเก็บเป็นตาราง PMCalendarEntry (ปฏิทิน PM)
+
+รอบที่ k ของแผนคำนวณจาก next_due_date + k * ความถี่ (ยึดวันเริ่มต้นเสมอ ไม่คำนวณต่อกันทีละรอบ
+จึงไม่เลื่อน เช่น ทุกวันที่ 31 ของเดือนจะกลับมาเป็นวันที่ 31 หลังผ่านเดือน ก.พ.)
+
+- PostgreSQL: คำนวณทั้งตารางในคำสั่ง INSERT ... SELECT เดียวด้วย generate_series
+  และ interval แบบเดือนของ PostgreSQL (ปัดวันสิ้นเดือนเหมือน add_months)
+- ฐานข้อมูลอื่น: คำนวณใน Python แบบเป็นชุดแล้ว bulk_create
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+from .models import Machine, MaintenancePlan, PMCalendarEntry, add_months
+
+DEFAULT_HORIZON_MONTHS = 12
+BATCH_SIZE = 2000
+
+FORECAST_SQL = """
+INSERT INTO {calendar} (plan_id, machine_id, due_date, occurrence)
+SELECT plan_id, machine_id, due_date, occurrence FROM (
+    SELECT p.id AS plan_id, p.machine_id, g.n AS occurrence,
+        CASE p.frequency_unit
+            WHEN 'DAYS' THEN p.next_due_date + g.n * p.frequency_value
+            WHEN 'WEEKS' THEN p.next_due_date + g.n * p.frequency_value * 7
+            ELSE (p.next_due_date + make_interval(months => g.n * p.frequency_value))::date
+        END AS due_date
+    FROM {plan} p
+    JOIN {machine} m ON m.id = p.machine_id AND m.is_active
+    CROSS JOIN LATERAL generate_series(0, CASE p.frequency_unit
+        WHEN 'DAYS' THEN (%(until)s::date - p.next_due_date) / p.frequency_value
+        WHEN 'WEEKS' THEN (%(until)s::date - p.next_due_date) / (p.frequency_value * 7)
+        ELSE ((EXTRACT(YEAR FROM %(until)s::date) - EXTRACT(YEAR FROM p.next_due_date)) * 12
+              + EXTRACT(MONTH FROM %(until)s::date) - EXTRACT(MONTH FROM p.next_due_date))::int
+             / p.frequency_value
+    END) AS g(n)
+    WHERE p.next_due_date IS NOT NULL AND p.next_due_date <= %(until)s AND p.frequency_value > 0
+      {plan_filter}
+) occurrences
+WHERE due_date <= %(until)s
+"""
+
+
+def horizon_end(months=None, today=None):
+    months = months or getattr(settings, 'MAINTENANCE_FORECAST_MONTHS', DEFAULT_HORIZON_MONTHS)
+    return add_months(today or date.today(), months)
+
+
+def occurrence_date(start, unit, value, n):
+    """วันครบกำหนดรอบที่ n ของแผน (n=0 คือ start)"""
+    if unit == MaintenancePlan.UNIT_DAYS:
+        return start + timedelta(days=n * value)
+    if unit == MaintenancePlan.UNIT_WEEKS:
+        return start + timedelta(weeks=n * value)
+    return add_months(start, n * value)
+
+
+def _plans(plan_ids=None):
+    qs = MaintenancePlan.objects.filter(next_due_date__isnull=False, frequency_value__gt=0, machine__is_active=True)
+    if plan_ids is not None:
+        qs = qs.filter(pk__in=plan_ids)
+    return qs
+
+
+def _insert_postgres(until, plan_ids=None):
+    params = {'until': until}
+    plan_filter = ''
+    if plan_ids is not None:
+        plan_filter = 'AND p.id = ANY(%(plan_ids)s)'
+        params['plan_ids'] = list(plan_ids)
+    sql = FORECAST_SQL.format(
+        calendar=PMCalendarEntry._meta.db_table,
+        plan=MaintenancePlan._meta.db_table,
+        machine=Machine._meta.db_table,
+        plan_filter=plan_filter,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _insert_python(until, plan_ids=None):
+    rows = (
+        _plans(plan_ids)
+        .filter(next_due_date__lte=until)
+        .values_list('pk', 'machine_id', 'next_due_date', 'frequency_unit', 'frequency_value')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch, total = [], 0
+    for plan_id, machine_id, start, unit, value in rows:
+        n = 0
+        due = start
+        while due <= until:
+            batch.append(PMCalendarEntry(plan_id=plan_id, machine_id=machine_id, due_date=due, occurrence=n))
+            n += 1
+            due = occurrence_date(start, unit, value, n)
+        if len(batch) >= BATCH_SIZE:
+            PMCalendarEntry.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    PMCalendarEntry.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+def rebuild(months=None, plan_ids=None):
+    """
+    สร้างปฏิทิน PM ใหม่ (ทั้งตาราง หรือเฉพาะ plan_ids) คืนค่าจำนวนรอบที่สร้าง
+    """
+    until = horizon_end(months)
+    with transaction.atomic():
+        existing = PMCalendarEntry.objects.all()
+        if plan_ids is not None:
+            plan_ids = list(plan_ids)
+            existing = existing.filter(plan_id__in=plan_ids)
+        existing.delete()
+        if connection.vendor == 'postgresql':
+            return _insert_postgres(until, plan_ids)
+        return _insert_python(until, plan_ids)
+
+
+def refresh_plans(plan_ids):
+    """คำนวณปฏิทินใหม่เฉพาะแผนที่เปลี่ยน (ใช้จาก signal และ scheduler)"""
+    plan_ids = list(plan_ids)
+    if plan_ids:
+        rebuild(plan_ids=plan_ids)
+
+
+def monthly_workload(start=None, months=None):
+    """
+    จำนวนรอบ PM ต่อเดือนแยกตามสถานที่ จากปฏิทิน PM (grouped query เดียว)
+    คืนค่า (รายการเดือน, [(ชื่อสถานที่, [จำนวนต่อเดือน...]), ...])
+    """
+    start = (start or date.today()).replace(day=1)
+    until = horizon_end(months, today=start)
+    periods = []
+    current = start
+    while current < until:
+        periods.append(current)
+        current = add_months(current, 1)
+    rows = (
+        PMCalendarEntry.objects
+        .filter(due_date__gte=start, due_date__lt=until)
+        .annotate(month=TruncMonth('due_date'))
+        .values('month', 'machine__location__name')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    table = {}
+    for row in rows:
+        counts = table.setdefault(row['machine__location__name'] or '-', [0] * len(periods))
+        counts[periods.index(row['month'])] += row['n']
+    return periods, sorted(table.items())
@@ -1,8 +1,60 @@
 from django import forms
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.forms import inlineformset_factory
-from .models import Machine, MaintenancePlan, WorkOrder, WorkOrderTask, Attachment
+from django.urls import reverse_lazy
+from .models import ArchivedWorkOrder, Machine, MaintenancePlan, WorkOrder, WorkOrderTask, Attachment
 from django.contrib.auth.forms import AuthenticationForm
 
+
+class AutocompleteSelect(forms.Select):
+    """
+    <select> ที่ render เฉพาะตัวเลือกที่ถูกเลือกอยู่ (หน้าเว็บจึงเล็กและเร็วคงที่ไม่ว่าข้อมูลจะมีกี่แถว)
+    ตัวเลือกอื่นค้นหาผ่าน autocomplete endpoint ด้วย static/maintenance/js/autocomplete.js
+    """
+
+    def __init__(self, kind, attrs=None):
+        attrs = {'class': 'form-select', **(attrs or {})}
+        super().__init__(attrs)
+        self.kind = kind
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = reverse_lazy('autocomplete', args=[self.kind])
+        return context
+
+    @staticmethod
+    def _valid_keys(model, key, values):
+        # ค่าที่ผู้ใช้ส่งมาผิดรูปแบบ (เช่น machine=abc) ข้ามไป ฟอร์มแสดง error ของฟิลด์เองอยู่แล้ว
+        model_field = model._meta.pk if key == 'pk' else model._meta.get_field(key)
+        valid = []
+        for value in values:
+            if value in (None, ''):
+                continue
+            try:
+                valid.append(model_field.to_python(value))
+            except ValidationError:
+                continue
+        return valid
+
+    def optgroups(self, name, value, attrs=None):
+        field = getattr(self.choices, 'field', None)
+        if field is None:
+            return super().optgroups(name, value, attrs)
+        # query เฉพาะแถวที่เลือกอยู่ แทนการวนทั้งตาราง
+        key = field.to_field_name or 'pk'
+        selected = self._valid_keys(field.queryset.model, key, value)
+        choices = [] if field.empty_label is None else [('', field.empty_label)]
+        if selected:
+            iterator = field.iterator(field)
+            choices += [iterator.choice(obj) for obj in field.queryset.filter(**{f'{key}__in': selected})]
+        original, self.choices = self.choices, choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = original
+
+
 class BootstrapAuthenticationForm(AuthenticationForm):
     """
     ฟอร์มสำหรับเข้าสู่ระบบ
@@ -39,6 +91,7 @@ class MaintenancePlanForm(forms.ModelForm):
     class Meta:
         model = MaintenancePlan
         fields = ['machine', 'title', 'description', 'frequency_value', 'frequency_unit', 'last_done_date']
+        widgets = {'machine': AutocompleteSelect('machine')}
 
 class WorkOrderForm(forms.ModelForm):
     """
@@ -48,8 +101,27 @@ class WorkOrderForm(forms.ModelForm):
     """
     class Meta:
         model = WorkOrder
-        fields = ['code', 'wo_type', 'priority', 'status', 'machine', 'plan',
+        fields = ['code', 'wo_type', 'priority', 'status', 'machine', 'plan', 'assigned_to',
                   'due_date', 'started_at', 'finished_at', 'summary', 'notes']
+        widgets = {
+            'machine': AutocompleteSelect('machine'),
+            'plan': AutocompleteSelect('plan'),
+            'assigned_to': AutocompleteSelect('user'),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # ตัวเลือกที่แสดงมีเพียงค่าที่เลือกอยู่ และโหลดพร้อมข้อมูลที่ __str__ ใช้ใน query เดียว
+        self.fields['machine'].queryset = Machine.objects.only('code', 'name')
+        self.fields['plan'].queryset = MaintenancePlan.objects.select_related('machine').only('title', 'machine__code')
+        self.fields['assigned_to'].queryset = get_user_model().objects.filter(is_active=True)
+
+    def clean_code(self):
+        # unique ของ WorkOrder ตรวจเฉพาะตารางหลัก รหัสของใบงานที่เก็บถาวรแล้วต้องตรวจเอง
+        code = self.cleaned_data['code']
+        if ArchivedWorkOrder.objects.filter(code=code).exists():
+            raise ValidationError('รหัสนี้ถูกใช้โดยใบสั่งงานที่เก็บถาวรแล้ว')
+        return code
 
 # Inline FormSet สำหรับการจัดการ Work Order Tasks
 # ใช้สำหรับเพิ่ม/ลบ/แก้ไขรายการงานย่อยใน Work Order แบบ dynamic
@@ -68,4 +140,88 @@ class AttachmentForm(forms.ModelForm):
     """
     class Meta:
         model = Attachment
-        fields = ['machine', 'workorder', 'file']
\ No newline at end of file
+        fields = ['machine', 'workorder', 'file']
+
+
+# ===== Bulk import =====
+class LookupField(forms.Field):
+    """
+    ฟิลด์อ้างอิง model ด้วยชื่อ/รหัส ผ่านตาราง lookup ในหน่วยความจำ (ดู importer.py)
+    ใช้แทน ModelChoiceField ตอนนำเข้าจำนวนมาก เพื่อไม่ต้อง query ทีละแถว
+    """
+
+    def __init__(self, lookup, **kwargs):
+        self.lookup = lookup
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        value = (value or '').strip()
+        if not value:
+            return None
+        obj = self.lookup.get(value)
+        if obj is None:
+            raise ValidationError(f'ไม่พบ "{value}"', code='invalid_choice')
+        return obj
+
+
+class MachineImportForm(MachineForm):
+    """
+    ตรวจสอบแถวของไฟล์นำเข้าเครื่องจักรด้วยกฎเดียวกับ MachineForm (ยกเว้นรูปภาพ)
+    ประเภทและสถานที่อ้างอิงด้วยชื่อ รหัสที่มีอยู่แล้วจะถูกอัปเดต (upsert)
+    """
+    class Meta(MachineForm.Meta):
+        fields = [f for f in MachineForm.Meta.fields if f != 'image']
+
+    def __init__(self, *args, lookups, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['category'] = LookupField(lookups['category'])
+        self.fields['location'] = LookupField(lookups['location'], required=False)
+
+    def _get_validation_exclusions(self):
+        # LookupField ตรวจประเภท/สถานที่แล้ว ชื่อใหม่ยังไม่ถูกบันทึกจนกว่าจะบันทึกชุด (importer.NameLookup)
+        return super()._get_validation_exclusions() | {'category', 'location'}
+
+    def validate_unique(self):
+        # upsert ตาม code จึงไม่ตรวจรหัสซ้ำกับฐานข้อมูล (รหัสซ้ำในไฟล์ตรวจใน importer)
+        pass
+
+
+class MaintenancePlanImportForm(MaintenancePlanForm):
+    """ตรวจสอบแถวของไฟล์นำเข้าแผนบำรุงรักษา เครื่องจักรอ้างอิงด้วยรหัสเครื่อง"""
+
+    def __init__(self, *args, lookups, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['machine'] = LookupField(lookups['machine'])
+
+
+class WorkOrderImportForm(WorkOrderForm):
+    """
+    ตรวจสอบแถวของไฟล์นำเข้าใบสั่งงาน เครื่องจักรอ้างอิงด้วยรหัสเครื่อง แผนอ้างอิงด้วย id
+    ผู้รับผิดชอบอ้างอิงด้วย username
+    นำเข้าเฉพาะใบงานใหม่ รหัสที่มีอยู่แล้วจะถูกรายงานเป็นข้อผิดพลาด
+    """
+
+    def __init__(self, *args, lookups, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['machine'] = LookupField(lookups['machine'])
+        self.fields['plan'] = LookupField(lookups['plan'], required=False)
+        self.fields['assigned_to'] = LookupField(lookups['assigned_to'], required=False)
+
+    def clean_code(self):
+        # รหัสซ้ำกับใบงานที่เก็บถาวรตรวจเป็นชุดใน importer (WorkOrderHistory) แทนการ query ทีละแถว
+        return self.cleaned_data['code']
+
+    def validate_unique(self):
+        # ตรวจรหัสซ้ำเป็นชุดใน importer แทนการ query ทีละแถว
+        pass
+
+
+class ImportForm(forms.Form):
+    """ฟอร์มอัปโหลดไฟล์ CSV สำหรับนำเข้าข้อมูลจำนวนมาก"""
+    KIND_CHOICES = [
+        ('machines', 'Machines'),
+        ('plans', 'Maintenance Plans'),
+        ('workorders', 'Work Orders'),
+    ]
+    kind = forms.ChoiceField(choices=KIND_CHOICES, widget=forms.Select(attrs={'class': 'form-select'}))
+    file = forms.FileField(widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'}))
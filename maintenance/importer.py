@@ -0,0 +1,253 @@
+"""
+นำเข้าเครื่องจักร แผนบำรุงรักษา และใบสั่งงานจากไฟล์ CSV จำนวนมาก
+
+- อ่านไฟล์ทีละแถว (csv.DictReader) และประมวลผลเป็นชุด (batch) จึงใช้หน่วยความจำคงที่
+- ตรวจสอบแต่ละแถวด้วยกฎเดียวกับฟอร์มหน้าเว็บ (ดู *ImportForm ใน forms.py)
+- ประเภท/สถานที่อ้างอิงด้วยชื่อผ่านตาราง lookup ในหน่วยความจำ (โหลดครั้งเดียว)
+  ชื่อใหม่บันทึกใน transaction ของชุด เฉพาะที่แถวซึ่งผ่านการตรวจอ้างถึง
+  เครื่องจักร/แผนอ้างอิงด้วยรหัส โหลดเฉพาะที่ชุดนั้นใช้ด้วย query เดียวต่อชุด
+- บันทึกด้วย bulk_create ชุดละหนึ่ง transaction เครื่องจักรเป็น upsert ตาม Machine.code
+- คืนรายงานข้อผิดพลาดรายแถว (เลขบรรทัด, ฟิลด์, ข้อความ)
+"""
+import csv
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import caching, counters, forecast, journal, metrics
+from .forms import MachineImportForm, MaintenancePlanImportForm, WorkOrderImportForm
+from .models import Location, Machine, MachineCategory, MaintenancePlan, WorkOrder, WorkOrderHistory
+
+BATCH_SIZE = 500
+
+
+class NameLookup:
+    """
+    ชื่อ -> instance ของตารางขนาดเล็ก (ประเภท/สถานที่) โหลดทั้งตารางครั้งเดียว
+    ถ้า create=True ชื่อที่ไม่พบจะได้ instance ใหม่ที่ยังไม่บันทึก (สำหรับการเริ่มใช้งานโรงงานใหม่)
+    บันทึกจริงใน save_new ตอนบันทึกชุด จึงไม่เหลือรายการจากแถวที่ไม่ผ่านการตรวจ
+    """
+
+    def __init__(self, model, field='name', create=True):
+        self.model = model
+        self.field = field
+        self.create = create
+        self.max_length = model._meta.get_field(field).max_length
+        self.cache = {getattr(obj, field): obj for obj in model.objects.all()}
+
+    def get(self, value):
+        obj = self.cache.get(value)
+        if obj is None and self.create and len(value) <= self.max_length:
+            obj = self.cache[value] = self.model(**{self.field: value})
+        return obj
+
+    def save_new(self, objs):
+        """บันทึกรายการใหม่ (ยังไม่มี pk) ที่ objs อ้างถึงด้วย bulk_create เดียว"""
+        new = {id(obj): obj for obj in objs if obj is not None and obj.pk is None}
+        if new:
+            self.model.objects.bulk_create(new.values())
+
+
+class KeyLookup:
+    """
+    รหัส -> instance ของตารางขนาดใหญ่ (เครื่องจักร/แผน)
+    โหลดเฉพาะคีย์ที่ชุดปัจจุบันอ้างถึงด้วย query เดียว (prefetch ก่อนตรวจสอบแต่ละชุด)
+    """
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.model_field = queryset.model._meta.get_field(field)
+        self.cache = {}
+
+    def prefetch(self, values):
+        keys = set()
+        for value in values:
+            try:
+                keys.add(self.model_field.to_python(value))
+            except ValidationError:
+                continue
+        keys.discard(None)
+        keys.discard('')
+        objs = self.queryset.filter(**{f'{self.field}__in': keys})
+        self.cache = {str(getattr(obj, self.field)): obj for obj in objs}
+
+    def get(self, value):
+        return self.cache.get(value)
+
+
+class Importer:
+    """
+    ขั้นตอนนำเข้าหนึ่งชนิดข้อมูล: subclass กำหนด form_class, get_lookups และ save_batch
+
+    key_field: ฟิลด์ที่ต้องไม่ซ้ำกันภายในไฟล์ (None = ไม่ตรวจ)
+    cache_labels: กลุ่ม cache ที่ต้องล้างหลังบันทึก (bulk_create ไม่ส่ง signal)
+    """
+    form_class = None
+    key_field = None
+    cache_labels = ()
+
+    def __init__(self, batch_size=BATCH_SIZE, user=None):
+        self.batch_size = batch_size
+        self.user = user
+        self.lookups = self.get_lookups()
+        self.seen = set()
+
+    def get_lookups(self):
+        return {}
+
+    def clean_row(self, row):
+        # ตัดช่องว่าง ข้ามคอลัมน์เกิน และใช้ค่า default ของ model กับช่องที่เว้นว่าง
+        data = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+        for field in self.form_class._meta.model._meta.concrete_fields:
+            if field.has_default() and not data.get(field.name):
+                data[field.name] = field.get_default()
+        return data
+
+    def run(self, reader):
+        result = {'rows': 0, 'created': 0, 'updated': 0, 'errors': []}
+        batch = []
+        for row in reader:
+            batch.append((reader.line_num, self.clean_row(row)))
+            if len(batch) >= self.batch_size:
+                self.process(batch, result)
+                batch = []
+        if batch:
+            self.process(batch, result)
+        return result
+
+    def process(self, batch, result):
+        for name, lookup in self.lookups.items():
+            if hasattr(lookup, 'prefetch'):
+                lookup.prefetch(row.get(name) for _, row in batch)
+
+        valid = []
+        for line, row in batch:
+            result['rows'] += 1
+            form = self.form_class(data=row, lookups=self.lookups)
+            if not form.is_valid():
+                result['errors'].extend(
+                    (line, field, message) for field, messages in form.errors.items() for message in messages
+                )
+                continue
+            if self.key_field:
+                key = form.cleaned_data[self.key_field]
+                if key in self.seen:
+                    result['errors'].append((line, self.key_field, f'"{key}" ซ้ำกับแถวก่อนหน้าในไฟล์'))
+                    continue
+                self.seen.add(key)
+            valid.append((line, form.save(commit=False)))
+
+        with transaction.atomic():
+            for name, lookup in self.lookups.items():
+                if hasattr(lookup, 'save_new'):
+                    lookup.save_new(getattr(obj, name) for _, obj in valid)
+            self.save_batch(valid, result)
+            caching.invalidate(*self.cache_labels)
+
+    def save_batch(self, rows, result):
+        raise NotImplementedError
+
+
+class MachineImporter(Importer):
+    """เครื่องจักร: upsert ตามรหัสเครื่อง (รหัสที่มีอยู่แล้วจะถูกอัปเดต)"""
+    form_class = MachineImportForm
+    key_field = 'code'
+    cache_labels = ('machine',)
+    update_fields = ['name', 'category', 'location', 'serial_no', 'purchase_date', 'is_active']
+
+    def get_lookups(self):
+        return {'category': NameLookup(MachineCategory), 'location': NameLookup(Location)}
+
+    def save_batch(self, rows, result):
+        machines = [machine for _, machine in rows]
+        if not machines:
+            return
+        existing = set(
+            Machine.objects.filter(code__in=[m.code for m in machines]).values_list('code', flat=True)
+        )
+        Machine.objects.bulk_create(
+            machines, update_conflicts=True, unique_fields=['code'], update_fields=self.update_fields,
+        )
+        result['created'] += len(machines) - len(existing)
+        result['updated'] += len(existing)
+        # bulk_create ไม่ส่ง post_save: คำนวณปฏิทิน PM ของเครื่องที่ถูกแก้ไขเอง (เช่น เลิกใช้งาน)
+        if existing:
+            forecast.refresh_plans(
+                MaintenancePlan.objects.filter(machine__code__in=existing).values_list('pk', flat=True)
+            )
+
+
+class PlanImporter(Importer):
+    """แผนบำรุงรักษา: สร้างใหม่ทุกแถว คำนวณวันครบกำหนดแบบเดียวกับ PlanCreateView"""
+    form_class = MaintenancePlanImportForm
+    cache_labels = ('plan',)
+
+    def get_lookups(self):
+        return {'machine': KeyLookup(Machine.objects.only('code'), 'code')}
+
+    def save_batch(self, rows, result):
+        plans = [plan for _, plan in rows]
+        for plan in plans:
+            plan.next_due_date = plan.compute_next_due()
+        MaintenancePlan.objects.bulk_create(plans)
+        result['created'] += len(plans)
+        forecast.refresh_plans([plan.pk for plan in plans])
+
+
+class WorkOrderImporter(Importer):
+    """ใบสั่งงาน: นำเข้าเฉพาะรหัสใหม่ รหัสที่มีอยู่แล้วรายงานเป็นข้อผิดพลาด"""
+    form_class = WorkOrderImportForm
+    key_field = 'code'
+    cache_labels = ('workorder',)
+
+    def get_lookups(self):
+        return {
+            'machine': KeyLookup(Machine.objects.only('code'), 'code'),
+            'plan': KeyLookup(MaintenancePlan.objects.only('id'), 'id'),
+            'assigned_to': NameLookup(get_user_model(), field='username', create=False),
+        }
+
+    def save_batch(self, rows, result):
+        # รหัสต้องไม่ซ้ำกับทั้งใบงานปัจจุบันและที่เก็บถาวรแล้ว
+        existing = set(
+            WorkOrderHistory.objects.filter(code__in=[wo.code for _, wo in rows]).values_list('code', flat=True)
+        )
+        workorders = []
+        for line, wo in rows:
+            if wo.code in existing:
+                result['errors'].append((line, 'code', f'"{wo.code}" มีอยู่แล้วในระบบ'))
+                continue
+            wo.reported_by = self.user
+            workorders.append(wo)
+        WorkOrder.objects.bulk_create(workorders)
+        result['created'] += len(workorders)
+        # bulk_create ไม่ส่ง post_save จึงต้องปรับตัวนับของ Dashboard และเครื่องจักรเอง
+        metrics.record_created(workorders)
+        counters.record_created(workorders)
+        journal.record_created(workorders, user_id=self.user.pk if self.user else None)
+
+
+IMPORTERS = {
+    'machines': MachineImporter,
+    'plans': PlanImporter,
+    'workorders': WorkOrderImporter,
+}
+
+
+def import_csv(kind, stream, batch_size=BATCH_SIZE, user=None):
+    """
+    นำเข้าไฟล์ CSV (text stream ที่มีหัวคอลัมน์ตรงกับชื่อฟิลด์ของฟอร์ม)
+    คืนค่า dict: rows, created, updated และ errors [(บรรทัด, ฟิลด์, ข้อความ), ...]
+    """
+    importer = IMPORTERS[kind](batch_size=batch_size, user=user)
+    result = importer.run(csv.DictReader(stream))
+    result['errors'].sort()
+    return result
+
+
+def write_error_report(errors, stream):
+    writer = csv.writer(stream)
+    writer.writerow(['line', 'field', 'error'])
+    writer.writerows(errors)
@@ -0,0 +1,284 @@
+"""
+วัดเวลาและจำนวน query ของแต่ละ request (InstrumentationMiddleware) สำหรับหาหน้าที่ช้าใน production
+
+- ทุก request: เวลารวม (wall time) และ status นับเป็น counter / histogram แยกตาม view
+- request ที่ถูกสุ่ม (settings.MAINTENANCE_METRICS_SAMPLE_RATE): จำนวนและเวลาของ query
+  ผ่าน connection.execute_wrapper, เวลา render template (TemplateResponse)
+  และ SQL ที่ช้าที่สุด N คำสั่ง การสุ่มทำให้ภาระที่เพิ่มขึ้นต่ำกว่า 1% ของเวลา request
+- request ที่ถูกสุ่ม และ request ที่ช้ากว่า MAINTENANCE_SLOW_REQUEST_MS เขียนลง log
+  'maintenance.requests' เป็น JSON บรรทัดละ request (ดู LOGGING ใน settings.py)
+- GET /metrics ส่งค่าทั้งหมดในรูปแบบ text ของ Prometheus
+
+แต่ละ worker process เก็บตัวเลขในหน่วยความจำ แล้วเขียนลงไฟล์ของตัวเอง (<pid>.json)
+ใน MAINTENANCE_METRICS_DIR ทุก MAINTENANCE_METRICS_FLUSH_SECONDS วินาที
+/metrics รวมไฟล์ของทุก worker จึงได้ตัวเลขครบไม่ว่า request จะไปตก worker ไหน
+"""
+import heapq
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from itertools import count
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger('maintenance.requests')
+
+DEFAULT_SAMPLE_RATE = 0.05
+DEFAULT_SLOW_REQUEST_MS = 1000
+DEFAULT_SLOW_QUERIES = 5
+DEFAULT_FLUSH_SECONDS = 10
+SQL_LOG_LENGTH = 1000
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# ชื่อ metric -> (ชนิด, คำอธิบาย)
+FAMILIES = {
+    'maintenance_http_requests_total': ('counter', 'Requests by view, method and status'),
+    'maintenance_http_request_duration_seconds': ('histogram', 'Request wall time by view'),
+    'maintenance_sampled_requests_total': ('counter', 'Requests with query/template instrumentation'),
+    'maintenance_db_queries_total': ('counter', 'DB queries of sampled requests'),
+    'maintenance_db_query_seconds_total': ('counter', 'DB time of sampled requests'),
+    'maintenance_template_render_seconds_total': ('counter', 'Template render time of sampled requests'),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _labels(**labels):
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for v in labels.values())
+    return ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped))
+
+
+class Registry:
+    """counter ของ process นี้: {(ชื่อ sample, labels): ค่า} (histogram เก็บเป็น _bucket/_sum/_count)"""
+
+    def __init__(self):
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._values[name, labels] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            for bound in DURATION_BUCKETS:
+                if value <= bound:
+                    self._values[f'{name}_bucket', f'{labels},le="{bound}"'] += 1
+            self._values[f'{name}_bucket', f'{labels},le="+Inf"'] += 1
+            self._values[f'{name}_sum', labels] += value
+            self._values[f'{name}_count', labels] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def flush(self, force=False):
+        """เขียนค่าปัจจุบันลงไฟล์ของ process นี้ (ไม่เกินทุก MAINTENANCE_METRICS_FLUSH_SECONDS วินาที)"""
+        now = time.monotonic()
+        if not force and now - self._flushed_at < _setting('MAINTENANCE_METRICS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS):
+            return
+        self._flushed_at = now
+        directory = metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        data = [[name, labels, value] for (name, labels), value in self.snapshot().items()]
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+
+
+registry = Registry()
+
+
+def metrics_dir():
+    return _setting('MAINTENANCE_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'factory_maintenance_metrics'))
+
+
+def collect():
+    """รวมค่าจากไฟล์ของทุก worker"""
+    registry.flush(force=True)
+    totals = defaultdict(float)
+    directory = metrics_dir()
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as fh:
+                rows = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        for sample, labels, value in rows:
+            totals[sample, labels] += value
+    return totals
+
+
+def render(values):
+    """ข้อความรูปแบบ Prometheus exposition format"""
+    lines = []
+    for family, (kind, help_text) in FAMILIES.items():
+        lines += [f'# HELP {family} {help_text}', f'# TYPE {family} {kind}']
+        names = (f'{family}_bucket', f'{family}_sum', f'{family}_count') if kind == 'histogram' else (family,)
+        for name in names:
+            # ลำดับตามที่บันทึก: bucket ของแต่ละ labels จึงเรียงตาม le เสมอ
+            for (sample, labels), value in values.items():
+                if sample == name:
+                    lines.append(f'{sample}{{{labels}}} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestSample:
+    """ตัวห่อการ execute SQL ของ request ที่ถูกสุ่ม: นับ query จับเวลา และเก็บคำสั่งที่ช้าที่สุด"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.slowest = []
+        self._order = count()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_seconds += elapsed
+            item = (elapsed, next(self._order), sql)
+            if len(self.slowest) < _setting('MAINTENANCE_SLOW_QUERIES', DEFAULT_SLOW_QUERIES):
+                heapq.heappush(self.slowest, item)
+            else:
+                heapq.heappushpop(self.slowest, item)
+
+    def slow_queries(self):
+        return [{'ms': round(elapsed * 1000, 2), 'sql': sql[:SQL_LOG_LENGTH]}
+                for elapsed, _, sql in sorted(self.slowest, reverse=True)]
+
+
+class InstrumentationMiddleware:
+    """
+    วางต่อจาก WhiteNoiseMiddleware (ไม่นับไฟล์ static) ใน settings.MIDDLEWARE
+    เวลา render วัดได้เฉพาะ TemplateResponse (CBV) ส่วน render() ในตัว view ถูกนับรวมในเวลาของ view
+    ทำงานได้ทั้ง WSGI และ ASGI (ไม่บังคับให้ async view ภายใต้ uvicorn ต้องย้ายไปทำงานใน thread)
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def start_sample(request):
+        sample = None
+        if random.random() < _setting('MAINTENANCE_METRICS_SAMPLE_RATE', DEFAULT_SAMPLE_RATE):
+            sample = RequestSample()
+        request._instrumentation = sample
+        return sample
+
+    @staticmethod
+    def wrap_queries(sample):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(sample))
+        return stack
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        sample = self.start_sample(request)
+        if sample:
+            with self.wrap_queries(sample):
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        record(request, response, time.perf_counter() - start, sample)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        sample = self.start_sample(request)
+        if sample:
+            # connection ผูกกับ thread: query ของ request แบบ async วิ่งใน thread เดียวของ sync_to_async
+            # (thread-sensitive ต่อ request) จึงติดตั้ง wrapper ใน thread นั้น
+            stack = await sync_to_async(self.wrap_queries)(sample)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        else:
+            response = await self.get_response(request)
+        record(request, response, time.perf_counter() - start, sample)
+        return response
+
+    def process_template_response(self, request, response):
+        sample = getattr(request, '_instrumentation', None)
+        if sample:
+            # ถูกเรียกก่อน render ทันที callback ทำงานหลัง render เสร็จ
+            start = time.perf_counter()
+
+            def rendered(response):
+                sample.template_seconds += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+def record(request, response, elapsed, sample):
+    match = request.resolver_match
+    view = match.view_name if match else 'unresolved'
+    registry.inc('maintenance_http_requests_total',
+                 _labels(view=view, method=request.method, status=response.status_code))
+    registry.observe('maintenance_http_request_duration_seconds', _labels(view=view), elapsed)
+
+    entry = None
+    slow = elapsed * 1000 >= _setting('MAINTENANCE_SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+    if sample or slow:
+        entry = {
+            'ts': round(time.time(), 3), 'method': request.method, 'path': request.path, 'view': view,
+            'status': response.status_code, 'ms': round(elapsed * 1000, 2), 'sampled': sample is not None,
+        }
+    if sample:
+        labels = _labels(view=view)
+        registry.inc('maintenance_sampled_requests_total', labels)
+        registry.inc('maintenance_db_queries_total', labels, sample.queries)
+        registry.inc('maintenance_db_query_seconds_total', labels, sample.db_seconds)
+        registry.inc('maintenance_template_render_seconds_total', labels, sample.template_seconds)
+        entry.update(queries=sample.queries, db_ms=round(sample.db_seconds * 1000, 2),
+                     template_ms=round(sample.template_seconds * 1000, 2), slow_queries=sample.slow_queries())
+    if slow:
+        logger.warning(json.dumps(entry))
+    elif entry:
+        logger.info(json.dumps(entry))
+    registry.flush()
+
+
+def metrics_view(request):
+    """
+    GET /metrics สำหรับ Prometheus
+    ถ้าตั้ง settings.MAINTENANCE_METRICS_TOKEN ต้องส่ง Authorization: Bearer <token>
+    ถ้าไม่ตั้ง ต้องล็อกอินเป็น staff
+    """
+    token = _setting('MAINTENANCE_METRICS_TOKEN', '')
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            raise PermissionDenied
+    elif not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
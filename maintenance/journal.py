@@ -0,0 +1,328 @@
+"""
+ประวัติการเปลี่ยนแปลงของใบงาน (WorkOrderEvent) แบบเพิ่มอย่างเดียว
+
+- signals.py / checklist.py / งานแบบ bulk เรียกฟังก์ชันในไฟล์นี้เมื่อสถานะ ผู้รับผิดชอบ ความสำคัญ
+  หรืองานย่อยเปลี่ยน เหตุการณ์จะถูกเก็บหลัง transaction commit เท่านั้น (rollback = ไม่มีประวัติ)
+- ระหว่าง request เหตุการณ์สะสมในหน่วยความจำ แล้ว JournalMiddleware เขียนทั้งหมดด้วย bulk_create
+  ครั้งเดียวตอนจบ request พร้อม user ที่ล็อกอิน นอก request (management command) เขียนทันทีหลัง commit
+- PostgreSQL: ตารางแบ่ง partition รายเดือนตามเขตเวลาของระบบ (ดู migration 0008)
+  ensure_partitions() สร้าง partition ล่วงหน้า และย้ายแถวที่ตกอยู่ใน partition default ไปยังเดือนของมัน
+  query ในไฟล์นี้ระบุช่วง occurred_at เสมอ PostgreSQL จึงอ่านเฉพาะ partition ที่เกี่ยวข้อง
+- ตาราง WorkOrder ไม่มีคอลัมน์เพิ่ม ประวัติทั้งหมดอยู่ในตารางนี้
+"""
+import logging
+from contextvars import ContextVar
+from datetime import date, datetime, time, timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import Lag
+from django.utils import timezone
+
+from . import caching
+from .metrics import month_start, shift_month
+from .models import WorkOrder, WorkOrderEvent
+from .reliability import Seconds
+
+logger = logging.getLogger('maintenance.journal')
+
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_LOOKBACK_DAYS = 180
+BATCH_SIZE = 1000
+TABLE = WorkOrderEvent._meta.db_table
+VALUE_LENGTH = WorkOrderEvent._meta.get_field('value_to').max_length
+STATE_KINDS = (WorkOrderEvent.KIND_CREATED, WorkOrderEvent.KIND_STATUS)
+# ฟิลด์ของใบงานที่เก็บประวัติ -> ชนิดเหตุการณ์
+TRACKED_FIELDS = {
+    'status': WorkOrderEvent.KIND_STATUS,
+    'assigned_to_id': WorkOrderEvent.KIND_ASSIGNEE,
+    'priority': WorkOrderEvent.KIND_PRIORITY,
+}
+
+# เหตุการณ์ที่รอเขียนของ request ปัจจุบัน (None = ไม่ได้อยู่ใน request)
+_pending = ContextVar('maintenance_journal_pending', default=None)
+
+
+def event(workorder_id, kind, value_from=None, value_to=None, task_id=None, occurred_at=None, user_id=None):
+    return WorkOrderEvent(
+        workorder_id=workorder_id, kind=kind, task_id=task_id, user_id=user_id,
+        value_from='' if value_from is None else str(value_from)[:VALUE_LENGTH],
+        value_to='' if value_to is None else str(value_to)[:VALUE_LENGTH],
+        occurred_at=occurred_at or timezone.now(),
+    )
+
+
+def record(*events):
+    """เก็บเหตุการณ์หลัง transaction commit (ใน request จะเขียนลงฐานข้อมูลตอนจบ request)"""
+    if events:
+        transaction.on_commit(lambda: _append(events))
+
+
+def _append(events):
+    pending = _pending.get()
+    if pending is None:
+        write(events)
+    else:
+        pending.extend(events)
+
+
+def write(events, user_id=None):
+    """บันทึกเหตุการณ์ด้วย bulk_create (เหตุการณ์ที่ไม่ระบุ user ใช้ user_id)"""
+    events = list(events)
+    for item in events:
+        if item.user_id is None:
+            item.user_id = user_id
+    WorkOrderEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+    caching.invalidate('journal')
+    return len(events)
+
+
+class JournalMiddleware:
+    """
+    วางต่อจาก AuthenticationMiddleware ใน settings.MIDDLEWARE
+    ถ้าเขียนประวัติไม่สำเร็จจะ log ไว้ ไม่ทำให้ request ที่ commit ข้อมูลไปแล้วกลายเป็น error
+    ทำงานได้ทั้ง WSGI และ ASGI: ภายใต้ ASGI เขียนประวัติผ่าน sync_to_async
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pending = []
+        token = _pending.set(pending)
+        try:
+            return self.get_response(request)
+        finally:
+            _pending.reset(token)
+            if pending:
+                self.write_pending(request, pending)
+
+    async def __acall__(self, request):
+        pending = []
+        token = _pending.set(pending)
+        try:
+            return await self.get_response(request)
+        finally:
+            _pending.reset(token)
+            if pending:
+                # request.user อาจเป็น lazy object ที่ต้อง query จึงอ่านใน thread เดียวกับการเขียน
+                await sync_to_async(self.write_pending)(request, pending)
+
+    @staticmethod
+    def write_pending(request, pending):
+        user = getattr(request, 'user', None)
+        try:
+            write(pending, user.pk if user is not None and user.is_authenticated else None)
+        except DatabaseError:
+            logger.exception('บันทึกประวัติใบงานไม่สำเร็จ (%d รายการ)', len(pending))
+
+
+def workorder_state(values):
+    """ค่าของฟิลด์ที่เก็บประวัติ จาก dict ของใบงาน (เช่น instance.__dict__ หรือ .values())"""
+    return {field: values.get(field) for field in TRACKED_FIELDS}
+
+
+def workorder_events(workorder, old):
+    """เหตุการณ์ของการบันทึกใบงาน old คือ workorder_state() ก่อนบันทึก (None = ใบงานใหม่)"""
+    new = workorder_state(workorder.__dict__)
+    if old is None:
+        events = [event(workorder.pk, WorkOrderEvent.KIND_CREATED, value_to=new['status'],
+                        occurred_at=workorder.reported_at)]
+        if new['assigned_to_id']:
+            events.append(event(workorder.pk, WorkOrderEvent.KIND_ASSIGNEE, value_to=new['assigned_to_id'],
+                                occurred_at=workorder.reported_at))
+        return events
+    return [event(workorder.pk, kind, old[field], new[field])
+            for field, kind in TRACKED_FIELDS.items() if old[field] != new[field]]
+
+
+def workorder_saved(workorder, old):
+    record(*workorder_events(workorder, old))
+
+
+def workorder_deleted(workorder):
+    record(event(workorder.pk, WorkOrderEvent.KIND_DELETED, value_from=workorder.status))
+
+
+def record_created(workorders, user_id=None):
+    """เหตุการณ์ของใบงานที่สร้างด้วย bulk_create (ซึ่งไม่ส่ง post_save signal)"""
+    events = [item for wo in workorders for item in workorder_events(wo, None)]
+    for item in events:
+        item.user_id = user_id
+    record(*events)
+
+
+def task_events(workorder_id, task_id, old, new):
+    """เหตุการณ์ของงานย่อย old / new คือ (title, is_done) ก่อนและหลัง (None = ไม่มีงานย่อยนี้)"""
+    if new is None:
+        return [event(workorder_id, WorkOrderEvent.KIND_TASK_REMOVED, value_from=old[0], task_id=task_id)]
+    events = []
+    if old is None:
+        events.append(event(workorder_id, WorkOrderEvent.KIND_TASK_ADDED, value_to=new[0], task_id=task_id))
+        old = (new[0], False)
+    if old[0] != new[0]:
+        events.append(event(workorder_id, WorkOrderEvent.KIND_TASK_RENAMED, old[0], new[0], task_id=task_id))
+    if old[1] != new[1]:
+        kind = WorkOrderEvent.KIND_TASK_DONE if new[1] else WorkOrderEvent.KIND_TASK_REOPENED
+        events.append(event(workorder_id, kind, task_id=task_id))
+    return events
+
+
+def task_changed(workorder_id, task_id, old, new):
+    record(*task_events(workorder_id, task_id, old, new))
+
+
+# --- partition (PostgreSQL) ---
+
+def _boundary(period):
+    """เวลาเริ่มต้นของเดือน period ตามเขตเวลาของระบบ"""
+    return timezone.make_aware(datetime.combine(period, time.min))
+
+
+def partition_name(period):
+    return f'{TABLE}_p{period:%Y%m}'
+
+
+def partitions():
+    """เดือนที่มี partition แล้ว (ไม่รวม partition default)"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass',
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = partition_name(date(2000, 1, 1))[:-6]
+    return {date(int(name[-6:-2]), int(name[-2:]), 1) for name in names if name.startswith(prefix)}
+
+
+def _create_partition(period, has_rows):
+    name = partition_name(period)
+    start, end = _boundary(period), _boundary(shift_month(period, 1))
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    with connection.cursor() as cursor:
+        if not has_rows:
+            cursor.execute(f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES {bounds}')
+            return
+        # PostgreSQL ไม่ยอมสร้าง partition ทับแถวที่อยู่ใน default จึงสร้างตารางแยก ย้ายแถว แล้วค่อย ATTACH
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {TABLE}_default WHERE occurred_at >= %s AND occurred_at < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            [start, end],
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}')
+
+
+def ensure_partitions(months_ahead=None):
+    """
+    สร้าง partition ของเดือนปัจจุบันและอีก months_ahead เดือนข้างหน้า
+    รวมถึงทุกเดือนที่มีแถวค้างอยู่ใน partition default คืนค่ารายการเดือนที่สร้าง
+    ควรรันเป็นระยะ (manage.py journal_partitions) ฐานข้อมูลอื่นนอกจาก PostgreSQL ไม่ต้องทำอะไร
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'MAINTENANCE_JOURNAL_MONTHS_AHEAD', DEFAULT_MONTHS_AHEAD)
+    current = month_start(timezone.localdate())
+    wanted = {shift_month(current, i) for i in range(months_ahead + 1)}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', occurred_at AT TIME ZONE %s)::date FROM {TABLE}_default",
+            [timezone.get_current_timezone_name()],
+        )
+        stranded = {row[0] for row in cursor.fetchall()}
+    created = []
+    for period in sorted((wanted | stranded) - partitions()):
+        with transaction.atomic():
+            _create_partition(period, period in stranded)
+        created.append(period)
+    return created
+
+
+# --- query ---
+
+def history(workorder):
+    """
+    ประวัติของใบงาน (เก่าไปใหม่) พร้อม display_from / display_to ที่อ่านได้
+    เหตุการณ์ทุกรายการเกิดหลังเวลาแจ้งของใบงาน จึงอ่านเฉพาะ partition ตั้งแต่เดือนนั้น
+    """
+    events = list(
+        WorkOrderEvent.objects
+        .filter(workorder_id=workorder.pk, occurred_at__gte=workorder.reported_at)
+        .select_related('user')
+        .order_by('occurred_at', 'pk')
+    )
+    user_ids = {
+        int(value) for item in events if item.kind == WorkOrderEvent.KIND_ASSIGNEE
+        for value in (item.value_from, item.value_to) if value.isdigit()
+    }
+    User = get_user_model()
+    usernames = dict(User.objects.filter(pk__in=user_ids).values_list('pk', User.USERNAME_FIELD)) if user_ids else {}
+    labels = {
+        WorkOrderEvent.KIND_CREATED: dict(WorkOrder.STATUS_CHOICES),
+        WorkOrderEvent.KIND_STATUS: dict(WorkOrder.STATUS_CHOICES),
+        WorkOrderEvent.KIND_DELETED: dict(WorkOrder.STATUS_CHOICES),
+        WorkOrderEvent.KIND_PRIORITY: dict(WorkOrder.PRIORITY_CHOICES),
+        WorkOrderEvent.KIND_ASSIGNEE: {str(pk): name for pk, name in usernames.items()},
+    }
+    for item in events:
+        mapping = labels.get(item.kind, {})
+        item.display_from = mapping.get(item.value_from, item.value_from)
+        item.display_to = mapping.get(item.value_to, item.value_to)
+    return events
+
+
+def audit(start, end, **filters):
+    """เหตุการณ์ในช่วงเวลา [start, end) กรองเพิ่มได้ เช่น user_id=..., kind__in=[...]"""
+    return WorkOrderEvent.objects.filter(occurred_at__gte=start, occurred_at__lt=end, **filters)
+
+
+def time_in_state(start, end, lookback_days=None):
+    """
+    เวลาที่ใบงานอยู่ในแต่ละสถานะ นับจากการเปลี่ยนสถานะที่เกิดตั้งแต่เดือน start ถึงเดือน end
+    ระยะเวลาของสถานะ = เวลาที่เปลี่ยนออก - เวลาที่เข้า (LAG บนเหตุการณ์ของใบงานเดียวกัน)
+    เวลาที่เข้าสถานะหาย้อนไปก่อน start ได้ไม่เกิน lookback_days วัน (สถานะที่นานกว่านั้นไม่ถูกนับ)
+    เพื่อให้อ่านเฉพาะ partition ของช่วงที่ต้องการ
+    คืนค่า list ของ dict: status, label, transitions, avg_hours, total_hours
+    """
+    if lookback_days is None:
+        lookback_days = getattr(settings, 'MAINTENANCE_JOURNAL_LOOKBACK_DAYS', DEFAULT_LOOKBACK_DAYS)
+    since, until = _boundary(start), _boundary(shift_month(end, 1))
+
+    def compute():
+        previous = Window(Lag('occurred_at'), partition_by=[F('workorder_id')],
+                          order_by=[F('occurred_at').asc(), F('pk').asc()])
+        changes = (
+            audit(since - timedelta(days=lookback_days), until, kind__in=STATE_KINDS)
+            .annotate(seconds=Seconds(F('occurred_at') - previous))
+            .values('kind', 'value_from', 'occurred_at', 'seconds')
+        )
+        sql, params = changes.query.sql_with_params()
+        # เหมือน reliability._failures: aggregate บน window function ต้องครอบด้วย GROUP BY อีกชั้น
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT value_from, COUNT(*), SUM(seconds) FROM ({sql}) changes '
+                f'WHERE kind = %s AND occurred_at >= %s AND seconds IS NOT NULL GROUP BY value_from',
+                (*params, WorkOrderEvent.KIND_STATUS, connection.ops.adapt_datetimefield_value(since)),
+            )
+            totals = {status: (count, seconds) for status, count, seconds in cursor.fetchall()}
+        rows = []
+        for status, label in WorkOrder.STATUS_CHOICES:
+            if status in totals:
+                count, seconds = totals[status]
+                rows.append({
+                    'status': status, 'label': label, 'transitions': count,
+                    'avg_hours': round(seconds / count / 3600, 2), 'total_hours': round(seconds / 3600, 1),
+                })
+        return rows
+
+    return caching.get_or_set('journal', ('journal',), ('time_in_state', start, end, lookback_days), compute)
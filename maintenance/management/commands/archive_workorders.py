@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from maintenance import archive
+
+
+class Command(BaseCommand):
+    """
+    ย้ายใบงานที่ปิดแล้วเกิน --days วัน (ค่าเริ่มต้น MAINTENANCE_ARCHIVE_AFTER_DAYS) พร้อมงานย่อย
+    และข้อมูลไฟล์แนบไปตารางเก็บถาวร ทีละ --batch-size ใบต่อ transaction
+    รันซ้ำได้ และควรตั้งเวลาให้รันเป็นระยะ (เช่น สัปดาห์ละครั้ง)
+    """
+    help = 'Move closed work orders older than the retention age into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive work orders closed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Number of work orders moved per transaction')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Stop after archiving this many work orders')
+
+    def handle(self, *args, **options):
+        def progress(totals):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  archived {totals.get('archivedworkorder', 0)} work orders")
+
+        totals = archive.archive(after_days=options['days'], batch_size=options['batch_size'],
+                                 limit=options['limit'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {totals.get('archivedworkorder', 0)} work orders, "
+            f"{totals.get('archivedworkordertask', 0)} tasks, "
+            f"{totals.get('archivedattachment', 0)} attachments"
+        ))
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from maintenance import benchmark
+
+
+class Command(BaseCommand):
+    """
+    วัด p50 / p95 และจำนวน query ของทุกหน้า (ดู maintenance/benchmark.py)
+    ตัวอย่าง: manage.py benchmark --output after.json --compare before.json
+    ถ้ามีหน้าที่ช้าลงหรือใช้ query มากขึ้นกว่า --compare จะจบด้วย error (ใช้ใน CI ได้)
+    """
+    help = 'Benchmark every page and admin changelist; store and compare results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=benchmark.DEFAULT_ITERATIONS)
+        parser.add_argument('--warmup', type=int, default=benchmark.DEFAULT_WARMUP)
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--only', nargs='*', help='Only benchmark pages whose name contains one of these words')
+        parser.add_argument('--connections', type=int, default=0, metavar='N',
+                            help='Also time N connect+query cycles: reconnecting vs the configured pool/CONN_MAX_AGE')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Baseline JSON file from an earlier run')
+        parser.add_argument('--threshold', type=float, default=benchmark.DEFAULT_THRESHOLD,
+                            help='Allowed p95 slowdown as a fraction of the baseline (default 0.2)')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as exc:
+                raise CommandError(exc)
+
+        def progress(name, result):
+            self.stdout.write(f"{name:<32} {result['status']:>3}  p50 {result['p50_ms']:>8.2f} ms  "
+                              f"p95 {result['p95_ms']:>8.2f} ms  {result['queries']:>3} queries")
+
+        report = benchmark.run(iterations=options['iterations'], warmup=options['warmup'],
+                               cold=options['cold'], only=options['only'], progress=progress)
+        if options['connections']:
+            overhead = report['connections'] = benchmark.connection_overhead(options['connections'])
+            for name in ('reconnect', 'configured'):
+                self.stdout.write(f"connection {name:<21} p50 {overhead[name]['p50_ms']:>8.3f} ms  "
+                                  f"p95 {overhead[name]['p95_ms']:>8.3f} ms")
+            self.stdout.write(f"connection mode {overhead['mode']}: {overhead['speedup']}x faster than reconnecting")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, indent=2)
+
+        if baseline is not None:
+            regressions = benchmark.compare(report, baseline, options['threshold'])
+            for name, message in regressions:
+                self.stderr.write(f'REGRESSION {name}: {message}')
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,106 @@
+import os
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from maintenance import bootstrap, forecast, journal, reliability
+
+
+class Command(BaseCommand):
+    """
+    เตรียมระบบตอน container start ใน Django process เดียว (แทนคำสั่ง manage.py หลายคำสั่งใน entrypoint.sh)
+    collectstatic -> system check -> migrate -> superuser (จาก DJANGO_SUPERUSER_USERNAME / _EMAIL / _PASSWORD)
+    -> fixtures -> journal partitions -> PM forecast -> reliability snapshot
+    ขั้นตอนที่ไม่มีอะไรเปลี่ยนจะถูกข้าม (ดู maintenance/bootstrap.py) และแสดงเวลาที่ใช้ของแต่ละขั้นตอน
+    PM forecast / reliability snapshot คำนวณใหม่เฉพาะเมื่อรอบนี้ apply migration หรือโหลด fixture (หรือ --force)
+    ตามปกติคำสั่ง forecast_pm / snapshot_reliability ที่รันเป็นระยะเป็นผู้ดูแล
+    """
+    help = 'Prepare static files, database, fixtures and superuser in one process, skipping unchanged steps'
+    # system check รันหลัง collectstatic เพราะ check ของ static ในโหมด production ต้องใช้ manifest
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Run collectstatic, reload fixtures and rebuild derived data even if nothing changed')
+        parser.add_argument('--skip-static', action='store_true', help='Do not run collectstatic')
+
+    def handle(self, *args, **options):
+        self.force = options['force']
+        # มี migration / fixture ใหม่ในรอบนี้ ข้อมูลที่คำนวณจากฐานข้อมูล (forecast / reliability) ต้องคำนวณใหม่
+        self.data_changed = self.force
+        self.inner_verbosity = max(options['verbosity'] - 1, 0)
+        steps = [
+            ('collectstatic', None if options['skip_static'] else self.collect_static),
+            ('check', self.run_checks),
+            ('migrate', self.migrate),
+            # ก่อน fixture: ใบงานใน initial_full.json อ้างถึงผู้ใช้ id 1
+            ('superuser', self.superuser),
+            ('fixtures', self.load_fixtures),
+            ('journal partitions', self.journal_partitions),
+            ('forecast', self.forecast),
+            ('reliability', self.reliability),
+        ]
+        started = time.perf_counter()
+        for name, step in steps:
+            step_started = time.perf_counter()
+            result = step() if step else 'skipped (--skip-static)'
+            self.stdout.write(f'{name:<20} {result:<45} {time.perf_counter() - step_started:7.2f}s')
+        self.stdout.write(self.style.SUCCESS(f'Bootstrap finished in {time.perf_counter() - started:.2f}s'))
+
+    def collect_static(self):
+        source_hash = bootstrap.static_source_hash()
+        if not self.force and bootstrap.static_is_current(source_hash):
+            return 'skipped (source unchanged)'
+        bootstrap.collect_static(source_hash, verbosity=self.inner_verbosity)
+        return 'collected'
+
+    def run_checks(self):
+        self.check(display_num_errors=False)
+        return 'ok'
+
+    def migrate(self):
+        plan = bootstrap.migration_plan()
+        if not plan:
+            return 'skipped (no pending migrations)'
+        call_command('migrate', interactive=False, verbosity=self.inner_verbosity)
+        self.data_changed = True
+        return f'applied {len(plan)} migrations'
+
+    def load_fixtures(self):
+        results = []
+        for name in bootstrap.fixtures():
+            if self.force:
+                bootstrap.BootstrapRecord.objects.filter(name=f'fixture:{name}').delete()
+            try:
+                status = bootstrap.load_fixture(name, verbosity=self.inner_verbosity)
+                self.data_changed |= status == 'loaded'
+                results.append(f'{name} {status}')
+            except Exception as e:
+                # ข้อมูลตั้งต้นโหลดไม่ได้ (เช่น ยังไม่มีผู้ใช้ที่อ้างถึง) ไม่ควรทำให้ระบบ start ไม่ได้ จะลองใหม่ครั้งหน้า
+                self.stderr.write(self.style.WARNING(f'Could not load fixture {name}: {e}'))
+                results.append(f'{name} failed')
+        return ', '.join(results) or 'none'
+
+    def journal_partitions(self):
+        return f'created {len(journal.ensure_partitions())}'
+
+    def forecast(self):
+        if not self.data_changed:
+            return 'skipped (no data changes)'
+        return f'{forecast.rebuild()} occurrences'
+
+    def reliability(self):
+        if not self.data_changed:
+            return 'skipped (no data changes)'
+        return f'{reliability.snapshot()} rows'
+
+    def superuser(self):
+        username = os.getenv('DJANGO_SUPERUSER_USERNAME')
+        password = os.getenv('DJANGO_SUPERUSER_PASSWORD')
+        email = os.getenv('DJANGO_SUPERUSER_EMAIL')
+        if not (username and password and email):
+            return 'skipped (not configured)'
+        if bootstrap.ensure_superuser(username, email, password):
+            return f'created {username}'
+        return f'{username} exists'
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from maintenance import thumbnails
+from maintenance.models import Attachment, Machine
+
+
+class Command(BaseCommand):
+    """
+    สร้างรูปย่อย้อนหลังให้รูปเครื่องจักรและไฟล์แนบที่มีอยู่แล้ว (ข้ามรูปที่มีรูปย่อครบแล้ว)
+    """
+    help = 'Generate missing WebP/JPEG thumbnails for machine images and attachments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate existing thumbnails')
+
+    def handle(self, *args, **options):
+        names = list(Machine.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True))
+        names += Attachment.objects.exclude(file='').exclude(file__isnull=True).values_list('file', flat=True)
+        created = 0
+        for name in names:
+            created += len(thumbnails.generate(name, force=options['force']))
+        self.stdout.write(self.style.SUCCESS(f'Created {created} thumbnails for {len(names)} images'))
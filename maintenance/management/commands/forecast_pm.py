@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from maintenance import forecast
+
+
+class Command(BaseCommand):
+    """
+    สร้างปฏิทิน PM (PMCalendarEntry) ใหม่ทั้งตาราง สำหรับช่วงเวลาที่กำหนด
+    ควรรันทุกคืนเพื่อให้ปฏิทินครอบคลุมช่วงล่วงหน้าเสมอ
+    """
+    help = 'Rebuild the materialized PM calendar for every plan over the forecast horizon'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None,
+                            help='Forecast horizon in months (default: MAINTENANCE_FORECAST_MONTHS or 12)')
+
+    def handle(self, *args, **options):
+        created = forecast.rebuild(months=options['months'])
+        self.stdout.write(self.style.SUCCESS(f'Forecast {created} PM occurrences'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from maintenance import synthetic
+
+
+class Command(BaseCommand):
+    """
+    สร้างข้อมูลโรงงานจำลองสำหรับทดสอบประสิทธิภาพ (ดู maintenance/synthetic.py)
+    ตัวอย่าง: manage.py generate_factory_data --machines 2000 --years 5
+    """
+    help = 'Bulk-create a reproducible synthetic factory dataset for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--locations', type=int, default=6)
+        parser.add_argument('--machines', type=int, default=200)
+        parser.add_argument('--plans-per-machine', type=int, default=2)
+        parser.add_argument('--years', type=float, default=3)
+        parser.add_argument('--workorders-per-machine-year', type=float, default=24)
+        parser.add_argument('--tasks-per-workorder', type=int, default=3, help='Average number of tasks')
+        parser.add_argument('--attachment-ratio', type=float, default=0.05,
+                            help='Fraction of work orders that get an attachment')
+        parser.add_argument('--users', type=int, default=10, help='Number of technician accounts')
+        parser.add_argument('--prefix', default='SYN', help='Prefix of generated codes (use a new one per run)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=synthetic.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        counts = synthetic.generate(
+            categories=options['categories'], locations=options['locations'], machines=options['machines'],
+            plans_per_machine=options['plans_per_machine'], years=options['years'],
+            workorders_per_machine_year=options['workorders_per_machine_year'],
+            tasks_per_workorder=options['tasks_per_workorder'], attachment_ratio=options['attachment_ratio'],
+            users=options['users'], prefix=options['prefix'], seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary}'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from maintenance import importer
+
+
+class Command(BaseCommand):
+    """
+    นำเข้าเครื่องจักร / แผนบำรุงรักษา / ใบสั่งงาน จากไฟล์ CSV แบบเป็นชุด
+    หัวคอลัมน์ใช้ชื่อฟิลด์ของฟอร์ม เช่น code,name,category,location,serial_no,purchase_date,is_active
+    """
+    help = 'Bulk import machines, maintenance plans or work orders from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(importer.IMPORTERS))
+        parser.add_argument('path', help='CSV file (UTF-8, header row required)')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE,
+                            help='Number of rows validated and saved per transaction')
+        parser.add_argument('--errors', default=None,
+                            help='Write the per-row error report to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+                result = importer.import_csv(options['kind'], stream, batch_size=options['batch_size'])
+        except OSError as exc:
+            raise CommandError(exc)
+
+        errors = result['errors']
+        if options['errors']:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as report:
+                importer.write_error_report(errors, report)
+        else:
+            for line, field, message in errors:
+                self.stderr.write(f'line {line}: {field}: {message}')
+
+        style = self.style.WARNING if errors else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Read {result['rows']} rows: {result['created']} created, {result['updated']} updated, "
+            f"{len(errors)} errors"
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from maintenance import journal
+
+
+class Command(BaseCommand):
+    """
+    สร้าง partition รายเดือนของตารางประวัติใบงาน (WorkOrderEvent) ล่วงหน้า
+    และย้ายแถวที่ตกอยู่ใน partition default ไปยังเดือนของมัน (PostgreSQL เท่านั้น)
+    ควรตั้งเวลาให้รันอย่างน้อยเดือนละครั้ง
+    """
+    help = 'Create upcoming monthly partitions of the work-order event journal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=None,
+                            help='Number of future months to create besides the current one')
+
+    def handle(self, *args, **options):
+        created = journal.ensure_partitions(months_ahead=options['months_ahead'])
+        names = ', '.join(f'{period:%Y-%m}' for period in created) or 'none'
+        self.stdout.write(self.style.SUCCESS(f'Created {len(created)} journal partitions: {names}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from maintenance import counters
+
+
+class Command(BaseCommand):
+    """
+    คำนวณตัวนับ denormalized ใหม่ทั้งหมด (จำนวนใบงานค้าง / วันที่บำรุงรักษาล่าสุดของเครื่องจักร
+    และจำนวนงานย่อยของใบงาน) ใช้เมื่อแก้ข้อมูลตรงในฐานข้อมูลหรือสงสัยว่าตัวเลขไม่ตรง
+    """
+    help = 'Rebuild denormalized machine and work-order counters'
+
+    def handle(self, *args, **options):
+        machines, workorders = counters.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {machines} machines and {workorders} work orders'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from maintenance import metrics
+
+
+class Command(BaseCommand):
+    """
+    คำนวณตารางสรุป WorkOrderStat ใหม่ทั้งหมดจากข้อมูล WorkOrder
+    ใช้เมื่อแก้ข้อมูลตรงในฐานข้อมูล (ไม่ผ่าน ORM) หรือ import ข้อมูลแบบ bulk
+    """
+    help = 'Rebuild dashboard work-order rollups from the WorkOrder table'
+
+    def handle(self, *args, **options):
+        buckets = metrics.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {buckets} work-order stat buckets'))
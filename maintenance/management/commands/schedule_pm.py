@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from maintenance import scheduler
+
+
+class Command(BaseCommand):
+    """
+    สร้าง PM Work Order จากแผนบำรุงรักษาที่ครบกำหนดแบบเป็นชุด
+    เหมาะสำหรับตั้งเป็น cron ทุกคืน รันซ้ำได้โดยไม่สร้างใบงานซ้ำ
+    """
+    help = 'Generate preventive-maintenance work orders for due plans in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', type=date.fromisoformat, default=None,
+                            help='Reference date (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--days-ahead', type=int, default=0,
+                            help='Also schedule plans due within this many days after the reference date')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of plans handled per transaction')
+
+    def handle(self, *args, **options):
+        result = scheduler.schedule_due_plans(
+            as_of=options['as_of'],
+            days_ahead=options['days_ahead'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Scheduled {result['workorders']} work orders with {result['tasks']} tasks "
+            f"from {result['plans']} due plans in {result['batches']} batches"
+        ))
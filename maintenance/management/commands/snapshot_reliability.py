@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from maintenance import reliability
+
+
+class Command(BaseCommand):
+    """
+    คำนวณตาราง ReliabilitySnapshot (MTTR / MTBF / PM compliance / backlog รายเดือน) ใหม่
+    ควรตั้งเวลาให้รันเป็นระยะ เช่น ทุกชั่วโมงด้วย --months 2 (เดือนนี้และเดือนก่อน)
+    """
+    help = 'Recompute monthly reliability snapshots from work-order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None,
+                            help='Number of recent months to recompute (0 = all history)')
+
+    def handle(self, *args, **options):
+        rows = reliability.snapshot(months=options['months'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {rows} reliability snapshot rows'))
@@ -0,0 +1,169 @@
+"""
+ให้บริการไฟล์ media (รูปเครื่องจักร / ไฟล์แนบ และรูปย่อ) แบบตรวจสิทธิ์
+
+Django ตรวจเพียงว่าผู้ใช้ล็อกอินและมีสิทธิ์ในไฟล์นั้น แล้วส่งงานอ่านไฟล์ต่อให้:
+- nginx ผ่าน X-Accel-Redirect เมื่อตั้ง settings.MAINTENANCE_MEDIA_ACCEL_PREFIX (env MEDIA_ACCEL_PREFIX)
+  ชี้ไปยัง location แบบ internal ของ nginx ค่านี้มาจาก settings เท่านั้น ไม่รับจาก header ของ request
+  (client ที่ต่อ uvicorn ตรง ๆ จะกำหนดปลายทางของ X-Accel-Redirect เองได้) nginx จัดการ Range / ETag / Last-Modified เอง และ worker ของ gunicorn ว่างทันที
+- FileResponse เมื่อไม่มี nginx พร้อม ETag / Last-Modified (ตอบ 304) และ Range request แบบช่วงเดียว (ตอบ 206)
+  ภายใต้ WSGI (gunicorn) ส่งไฟล์ด้วย os.sendfile (zero-copy) ผ่าน wsgi.file_wrapper
+  ภายใต้ ASGI (uvicorn) อ่านทีละ FILE_CHUNK_SIZE ผ่าน async iterator (streaming.py) ไม่อ่านทั้งไฟล์เข้าหน่วยความจำ
+"""
+import mimetypes
+import os
+import re
+from functools import partial
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import streaming, thumbnails
+from .models import ArchivedAttachment, Attachment, Machine
+
+CACHE_CONTROL = 'private, max-age=3600'
+FILE_CHUNK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_DERIVATIVE = re.compile(r'^(?P<base>.+)\.(?P<size>{})\.(?P<ext>{})$'.format(
+    '|'.join(thumbnails.SIZES), '|'.join(thumbnails.FORMATS)))
+
+
+def original_names(path):
+    """ชื่อไฟล์ต้นฉบับที่เป็นไปได้ของ path (ตัวมันเอง และไฟล์ต้นฉบับถ้า path เป็นรูปย่อ)"""
+    match = _DERIVATIVE.match(path)
+    return [path, match['base']] if match else [path]
+
+
+def _matches(name, path):
+    return name == path or path in thumbnails.derivative_names(name)
+
+
+def can_access(user, path):
+    """
+    ผู้ใช้เปิดไฟล์นี้ได้หรือไม่: ไฟล์ต้องเป็นของ Machine หรือ Attachment ที่มีอยู่จริง
+    - รูปเครื่องจักร และไฟล์แนบของเครื่องจักร: ผู้ใช้ที่ล็อกอินทุกคน
+    - ไฟล์แนบของใบสั่งงาน: staff ผู้แจ้ง หรือผู้รับผิดชอบใบงานนั้น
+    ไฟล์แนบของใบงานที่เก็บถาวรแล้ว (ArchivedAttachment) ใช้กฎเดียวกัน
+    """
+    names = original_names(path)
+    images = Machine.objects.filter(image__in=names).values_list('image', flat=True)
+    if any(_matches(image, path) for image in images):
+        return True
+
+    for model in (Attachment, ArchivedAttachment):
+        attachments = model.objects.filter(file__in=names).values_list(
+            'file', 'workorder_id', 'workorder__reported_by_id', 'workorder__assigned_to_id')
+        for file, workorder_id, reported_by, assigned_to in attachments:
+            if not _matches(file, path):
+                continue
+            if workorder_id is None or user.is_staff or user.pk in (reported_by, assigned_to):
+                return True
+    return False
+
+
+def accel_prefix():
+    return getattr(settings, 'MAINTENANCE_MEDIA_ACCEL_PREFIX', None)
+
+
+class _RangeFile:
+    """อ่านไฟล์เฉพาะช่วง [start, start+length) สำหรับคำตอบ 206"""
+
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fh.close()
+
+
+def parse_range(header, size):
+    """คืนค่า (start, end) แบบรวมปลาย หรือ None ถ้าไม่ใช่ range ช่วงเดียวที่ใช้ได้"""
+    match = _RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-N คือ N ไบต์สุดท้าย
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def file_response(request, full_path):
+    stat = os.stat(full_path)
+    etag = quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        fh = open(full_path, 'rb')
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if range_header and request.headers.get('If-Range', etag) in (etag, http_date(last_modified)):
+            byte_range = parse_range(range_header, stat.st_size)
+            if byte_range is None and _RANGE.match(range_header.strip()):
+                fh.close()
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                return response
+
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        body = fh
+        if byte_range is None:
+            response = FileResponse(fh, content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            # ช่วงที่ยาวถึงท้ายไฟล์ส่งไฟล์ตรง ๆ (ยังใช้ sendfile ได้) ช่วงกลางไฟล์ต้องจำกัดการอ่าน
+            body = _RangeFile(fh, start, length) if end < stat.st_size - 1 else fh
+            if body is fh:
+                fh.seek(start)
+            response = FileResponse(body, content_type=content_type, status=206)
+            response['Content-Length'] = length
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        if streaming.is_asgi(request):
+            # header (Content-Length ฯลฯ) ตั้งจากไฟล์แล้ว เปลี่ยนเฉพาะเนื้อหาเป็น async iterator (ไฟล์ยังถูกปิดตอนจบ)
+            response.streaming_content = streaming.aiterate(iter(partial(body.read, FILE_CHUNK_SIZE), b''), 1)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+@login_required
+def serve_media(request, path):
+    """แทนที่ django.views.static.serve สำหรับ MEDIA_URL"""
+    if not can_access(request.user, path):
+        raise Http404('File not found')
+    try:
+        full_path = default_storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+
+    prefix = accel_prefix()
+    if prefix:
+        response = HttpResponse(content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path.lstrip('/'))
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
+    return file_response(request, full_path)
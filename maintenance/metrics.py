@@ -0,0 +1,139 @@
+"""
+ตัวคำนวณตัวเลขสำหรับ Dashboard (metrics engine)
+
+ตัวเลขของ Work Order ถูกสรุปไว้ในตาราง WorkOrderStat แยกตาม
+(เดือนที่แจ้ง, ประเภท, ความสำคัญ, สถานะ, เดือนที่ทำเสร็จ) และปรับทีละ bucket จาก signal
+ของ WorkOrder ดังนั้นการเปิด Dashboard จะใช้จำนวน query คงที่
+ไม่ว่าจะมี Work Order อยู่กี่แสนรายการก็ตาม
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateformat import format as date_format
+
+from . import caching
+from .models import Machine, WorkOrder, WorkOrderHistory, WorkOrderStat
+
+BUCKET_FIELDS = ('wo_type', 'priority', 'status')
+
+
+def month_start(value):
+    """คืนวันที่ 1 ของเดือนของ date/datetime ที่ส่งเข้ามา (datetime จะถูกแปลงเป็นเวลาท้องถิ่นก่อน)"""
+    if hasattr(value, 'tzinfo') and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    if hasattr(value, 'date'):
+        value = value.date()
+    return value.replace(day=1)
+
+
+def shift_month(day, months):
+    """เลื่อนวันที่ 1 ของเดือนไปข้างหน้า/ย้อนหลังตามจำนวนเดือน"""
+    index = day.year * 12 + day.month - 1 + months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def bucket_key(values):
+    """สร้าง key ของ bucket จาก dict ที่มี reported_at, finished_at, wo_type, priority, status"""
+    key = {field: values[field] for field in BUCKET_FIELDS}
+    key['period'] = month_start(values['reported_at'])
+    key['finished_period'] = month_start(values['finished_at']) if values['finished_at'] else None
+    return key
+
+
+def apply_delta(key, delta):
+    """บวก/ลบจำนวนของ bucket เดียวแบบ atomic ด้วย F() expression"""
+    if not delta:
+        return
+    with transaction.atomic():
+        stat, _ = WorkOrderStat.objects.get_or_create(**key)
+        WorkOrderStat.objects.filter(pk=stat.pk).update(count=F('count') + delta)
+
+
+def record_created(workorders):
+    """
+    ปรับตัวนับสำหรับ Work Order ที่สร้างด้วย bulk_create (ซึ่งไม่ส่ง post_save signal)
+    รวมเป็น bucket ก่อน จึงใช้ query ตามจำนวน bucket ไม่ใช่จำนวน Work Order
+    """
+    deltas = Counter()
+    for wo in workorders:
+        deltas[tuple(sorted(bucket_key(wo.__dict__).items()))] += 1
+    for key, delta in deltas.items():
+        apply_delta(dict(key), delta)
+
+
+def rebuild():
+    """
+    คำนวณตาราง WorkOrderStat ใหม่ทั้งหมดด้วย grouped query เดียว
+    ใช้ตอน migrate ครั้งแรก หรือเมื่อสงสัยว่าตัวเลขไม่ตรง (manage.py rebuild_metrics)
+    นับรวมใบงานที่เก็บถาวรแล้ว (WorkOrderHistory) ตัวเลขจึงไม่ลดลงหลัง archive
+    """
+    rows = (
+        WorkOrderHistory.objects
+        .annotate(period=TruncMonth('reported_at', output_field=DateField()),
+                  finished_period=TruncMonth('finished_at', output_field=DateField()))
+        .values('period', 'finished_period', *BUCKET_FIELDS)
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    stats = [WorkOrderStat(**row) for row in rows]
+    with transaction.atomic():
+        WorkOrderStat.objects.all().delete()
+        WorkOrderStat.objects.bulk_create(stats, batch_size=1000)
+        caching.invalidate('workorder')
+    return len(stats)
+
+
+def dashboard_metrics(months=6):
+    """
+    รวมตัวเลขทั้งหมดที่ Dashboard ใช้ ด้วย query คงที่ 3 ครั้ง:
+    สรุปเครื่องจักร, สรุป Work Order ทั้งหมด และแนวโน้มรายเดือน
+    """
+    machines = Machine.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+    )
+
+    by_type = {code: 0 for code, _ in WorkOrder.TYPE_CHOICES}
+    by_status = {code: 0 for code, _ in WorkOrder.STATUS_CHOICES}
+    open_by_priority = {code: 0 for code, _ in WorkOrder.PRIORITY_CHOICES}
+    totals = WorkOrderStat.objects.values(*BUCKET_FIELDS).annotate(n=Sum('count')).order_by()
+    for row in totals:
+        by_type[row['wo_type']] += row['n']
+        by_status[row['status']] += row['n']
+        if row['status'] in (WorkOrder.STATUS_OPEN, WorkOrder.STATUS_INPROG):
+            open_by_priority[row['priority']] += row['n']
+
+    # แนวโน้มงานที่ทำเสร็จย้อนหลัง n เดือน (รวมเดือนปัจจุบัน) นับตามเดือนที่ทำเสร็จ ไม่ใช่เดือนที่แจ้ง
+    current = month_start(timezone.localdate())
+    periods = [shift_month(current, -i) for i in range(months - 1, -1, -1)]
+    trend = {code: [0] * months for code, _ in WorkOrder.TYPE_CHOICES}
+    done = (
+        WorkOrderStat.objects
+        .filter(finished_period__gte=periods[0], status=WorkOrder.STATUS_DONE)
+        .values('finished_period', 'wo_type')
+        .annotate(n=Sum('count'))
+        .order_by()
+    )
+    for row in done:
+        if row['finished_period'] in periods:
+            trend[row['wo_type']][periods.index(row['finished_period'])] += row['n']
+
+    # ประสิทธิภาพ = งานที่เสร็จ / งานทั้งหมดที่ไม่ถูกยกเลิก
+    considered = sum(by_status.values()) - by_status[WorkOrder.STATUS_CANCEL]
+    efficiency = round(100 * by_status[WorkOrder.STATUS_DONE] / considered) if considered else 0
+
+    return {
+        'machine_count': machines['total'],
+        'machine_active': machines['active'],
+        'machine_inactive': machines['total'] - machines['active'],
+        'wo_open': by_status[WorkOrder.STATUS_OPEN],
+        'by_type': by_type,
+        'by_status': by_status,
+        'open_by_priority': open_by_priority,
+        'trend_labels': [date_format(p, 'F') for p in periods],
+        'trend': trend,
+        'efficiency': efficiency,
+    }
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:04
+
+from django.db import migrations, models
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+
+def populate_stats(apps, schema_editor):
+    # สร้างตารางสรุปจาก Work Order ที่มีอยู่แล้ว
+    WorkOrder = apps.get_model('maintenance', 'WorkOrder')
+    WorkOrderStat = apps.get_model('maintenance', 'WorkOrderStat')
+    rows = (
+        WorkOrder.objects
+        .annotate(period=TruncMonth('reported_at', output_field=DateField()))
+        .values('period', 'wo_type', 'priority', 'status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    WorkOrderStat.objects.bulk_create([WorkOrderStat(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkOrderStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('wo_type', models.CharField(choices=[('PM', 'Preventive'), ('CM', 'Corrective'), ('INS', 'Inspection')], max_length=10)),
+                ('priority', models.CharField(choices=[('LOW', 'Low'), ('MED', 'Medium'), ('HIGH', 'High')], max_length=10)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('IN_PROGRESS', 'In progress'), ('DONE', 'Done'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'wo_type', 'priority', 'status'), name='uniq_workorderstat_bucket')],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
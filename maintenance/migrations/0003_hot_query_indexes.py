@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0002_workorderstat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='maintenanceplan',
+            index=models.Index(fields=['next_due_date'], name='plan_next_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(fields=['-reported_at'], name='wo_reported_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(fields=['status', '-reported_at'], name='wo_status_reported_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(fields=['machine', 'status'], name='wo_machine_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(condition=models.Q(('status__in', ['OPEN', 'IN_PROGRESS'])), fields=['due_date'], name='wo_open_due_idx'),
+        ),
+    ]
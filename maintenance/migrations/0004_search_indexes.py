@@ -0,0 +1,81 @@
+from django.db import migrations
+
+# คอลัมน์ที่ค้นหาได้ ต้องตรงกับ SEARCH_FIELDS ใน maintenance/search.py
+SEARCH_TABLES = {
+    'maintenance_machine': ('code', 'name', 'serial_no'),
+    'maintenance_workorder': ('code', 'summary', 'notes'),
+}
+
+
+def postgres_statements(table, columns):
+    for column in columns:
+        # UPPER(...) ให้ตรงกับ SQL ที่ Django สร้างสำหรับ icontains บน PostgreSQL
+        yield (
+            f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} '
+            f'USING gin (UPPER({column}) gin_trgm_ops)'
+        )
+
+
+def sqlite_statements(table, columns):
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    yield (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='{table}', content_rowid='id', tokenize='trigram')"
+    )
+    yield (
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END'
+    )
+    yield (
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END"
+    )
+    yield (
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END'
+    )
+    yield f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+
+
+def create_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        builder = postgres_statements
+    elif vendor == 'sqlite':
+        builder = sqlite_statements
+    else:
+        return
+    for table, columns in SEARCH_TABLES.items():
+        for sql in builder(table, columns):
+            schema_editor.execute(sql)
+
+
+def drop_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, columns in SEARCH_TABLES.items():
+        if vendor == 'postgresql':
+            for column in columns:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+        elif vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+
+
+class Migration(migrations.Migration):
+    """
+    โครงสร้างสำหรับค้นหา: GIN trigram index บน PostgreSQL หรือตาราง FTS5 + trigger บน SQLite
+    """
+
+    dependencies = [
+        ('maintenance', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_structures, drop_search_structures),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PMCalendarEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_date', models.DateField()),
+                ('occurrence', models.PositiveIntegerField()),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_entries', to='maintenance.machine')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_entries', to='maintenance.maintenanceplan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['due_date'], name='pmcal_due_idx'), models.Index(fields=['machine', 'due_date'], name='pmcal_machine_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('plan', 'occurrence'), name='uniq_pmcal_plan_occurrence')],
+            },
+        ),
+    ]
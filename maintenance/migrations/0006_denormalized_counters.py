@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:32
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    # คำนวณตัวนับจากข้อมูลที่มีอยู่แล้ว (เหมือน counters.rebuild)
+    Machine = apps.get_model('maintenance', 'Machine')
+    WorkOrder = apps.get_model('maintenance', 'WorkOrder')
+    WorkOrderTask = apps.get_model('maintenance', 'WorkOrderTask')
+
+    def count(queryset, field):
+        rows = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(rows), 0)
+
+    done = WorkOrder.objects.filter(status='DONE')
+    Machine.objects.update(
+        open_workorder_count=count(WorkOrder.objects.filter(status__in=['OPEN', 'IN_PROGRESS']), 'machine'),
+        last_maintenance_at=Subquery(
+            done.filter(machine=OuterRef('pk')).order_by().values('machine').annotate(last=Max('finished_at')).values('last')
+        ),
+    )
+    WorkOrder.objects.update(
+        task_total=count(WorkOrderTask.objects.all(), 'workorder'),
+        task_done=count(WorkOrderTask.objects.filter(is_done=True), 'workorder'),
+    )
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite สร้างตารางใหม่ตอนเพิ่มคอลัมน์ (table remake) ทำให้ trigger ของ FTS5 หายไป
+    if schema_editor.connection.vendor == 'sqlite':
+        import_module('maintenance.migrations.0004_search_indexes').create_search_structures(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0005_pmcalendarentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='machine',
+            name='last_maintenance_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='machine',
+            name='open_workorder_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='workorder',
+            name='task_done',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='workorder',
+            name='task_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['-open_workorder_count', 'code'], name='machine_open_wo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(fields=['last_maintenance_at', 'code'], name='machine_last_maint_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
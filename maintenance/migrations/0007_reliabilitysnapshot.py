@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0006_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReliabilitySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('failure_gaps', models.PositiveIntegerField(default=0)),
+                ('failure_gap_seconds', models.FloatField(default=0)),
+                ('repairs', models.PositiveIntegerField(default=0)),
+                ('repair_seconds', models.FloatField(default=0)),
+                ('pm_due', models.PositiveIntegerField(default=0)),
+                ('pm_on_time', models.PositiveIntegerField(default=0)),
+                ('backlog', models.PositiveIntegerField(default=0)),
+                ('backlog_age_seconds', models.FloatField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reliability_snapshots', to='maintenance.machine')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period'], name='relsnap_period_idx')],
+                'constraints': [models.UniqueConstraint(fields=('machine', 'period'), name='uniq_relsnap_machine_period')],
+            },
+        ),
+    ]
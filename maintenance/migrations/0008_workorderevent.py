@@ -0,0 +1,70 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+TABLE = 'maintenance_workorderevent'
+
+
+def create_journal_table(apps, schema_editor):
+    """
+    PostgreSQL: ตารางแม่แบ่ง partition ตามช่วง occurred_at + partition default + BRIN index
+    (partition รายเดือนสร้างด้วย manage.py journal_partitions ดู maintenance/journal.py)
+    primary key ต้องรวมคอลัมน์ที่ใช้แบ่ง partition จึงเป็น (id, occurred_at)
+    ฐานข้อมูลอื่น: ตารางธรรมดา + index บน occurred_at
+    """
+    model = apps.get_model('maintenance', 'WorkOrderEvent')
+    connection = schema_editor.connection
+    quote = schema_editor.quote_name
+    if connection.vendor != 'postgresql':
+        schema_editor.create_model(model)
+        schema_editor.execute(f'CREATE INDEX wo_event_time_idx ON {TABLE} (occurred_at)')
+        return
+    columns = ['id bigserial NOT NULL']
+    for field in model._meta.local_fields:
+        if not field.primary_key:
+            definition, _ = schema_editor.column_sql(model, field)
+            columns.append(f'{quote(field.column)} {definition}')
+    columns.append('PRIMARY KEY (id, occurred_at)')
+    schema_editor.execute(f'CREATE TABLE {TABLE} ({", ".join(columns)}) PARTITION BY RANGE (occurred_at)')
+    # แถวที่ยังไม่มี partition ของเดือนนั้นลงที่นี่ (insert จึงไม่ล้มเหลวแม้ลืมสร้าง partition ล่วงหน้า)
+    schema_editor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    # ข้อมูลเรียงตามเวลาที่เขียน BRIN จึงเล็กมากเมื่อเทียบกับ B-tree และพอสำหรับค้นช่วงเวลา
+    schema_editor.execute(f'CREATE INDEX wo_event_time_brin ON {TABLE} USING brin (occurred_at)')
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+def drop_journal_table(apps, schema_editor):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE} CASCADE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0007_reliabilitysnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='WorkOrderEvent',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('occurred_at', models.DateTimeField()),
+                        ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Created'), (2, 'Status'), (3, 'Assignee'), (4, 'Priority'), (5, 'Deleted'), (10, 'Task added'), (11, 'Task done'), (12, 'Task reopened'), (13, 'Task renamed'), (14, 'Task removed')])),
+                        ('task_id', models.BigIntegerField(blank=True, null=True)),
+                        ('value_from', models.CharField(blank=True, max_length=200)),
+                        ('value_to', models.CharField(blank=True, max_length=200)),
+                        ('user', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                        ('workorder', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='maintenance.workorder')),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['workorder', 'occurred_at'], name='wo_event_wo_time_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_journal_table, drop_journal_table),
+    ]
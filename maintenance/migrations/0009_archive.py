@@ -0,0 +1,105 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# คอลัมน์ของ view maintenance_workorderhistory ตามลำดับ ต้องตรงกับ models.WorkOrderHistory
+# ถ้าเพิ่มคอลัมน์ให้ WorkOrder / ArchivedWorkOrder ภายหลัง ต้องสร้าง view ใหม่ใน migration นั้นด้วย
+HISTORY_COLUMNS = (
+    'id', 'code', 'wo_type', 'priority', 'status', 'machine_id', 'plan_id', 'reported_by_id', 'assigned_to_id',
+    'reported_at', 'due_date', 'started_at', 'finished_at', 'summary', 'notes', 'task_total', 'task_done',
+)
+_columns = ', '.join(HISTORY_COLUMNS)
+CREATE_HISTORY_VIEW = (
+    f'CREATE VIEW maintenance_workorderhistory AS '
+    f'SELECT {_columns}, FALSE AS is_archived FROM maintenance_workorder '
+    f'UNION ALL '
+    f'SELECT {_columns}, TRUE AS is_archived FROM maintenance_archivedworkorder'
+)
+DROP_HISTORY_VIEW = 'DROP VIEW IF EXISTS maintenance_workorderhistory'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0008_workorderevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkOrderHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('code', models.CharField(max_length=20)),
+                ('wo_type', models.CharField(choices=[('PM', 'Preventive'), ('CM', 'Corrective'), ('INS', 'Inspection')], max_length=10)),
+                ('priority', models.CharField(choices=[('LOW', 'Low'), ('MED', 'Medium'), ('HIGH', 'High')], max_length=10)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('IN_PROGRESS', 'In progress'), ('DONE', 'Done'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('reported_at', models.DateTimeField()),
+                ('due_date', models.DateField(null=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('summary', models.CharField(max_length=255)),
+                ('notes', models.TextField()),
+                ('task_total', models.PositiveIntegerField()),
+                ('task_done', models.PositiveIntegerField()),
+                ('is_archived', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'maintenance_workorderhistory',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedWorkOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('wo_type', models.CharField(choices=[('PM', 'Preventive'), ('CM', 'Corrective'), ('INS', 'Inspection')], max_length=10)),
+                ('priority', models.CharField(choices=[('LOW', 'Low'), ('MED', 'Medium'), ('HIGH', 'High')], max_length=10)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('IN_PROGRESS', 'In progress'), ('DONE', 'Done'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('reported_at', models.DateTimeField()),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('summary', models.CharField(max_length=255)),
+                ('notes', models.TextField(blank=True)),
+                ('task_total', models.PositiveIntegerField(default=0)),
+                ('task_done', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_workorders', to='maintenance.machine')),
+                ('plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='maintenance.maintenanceplan')),
+                ('reported_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedAttachment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('file', models.ImageField(blank=True, null=True, upload_to='attachments/')),
+                ('uploaded_at', models.DateTimeField()),
+                ('machine', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='maintenance.machine')),
+                ('workorder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='maintenance.archivedworkorder')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedWorkOrderTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('is_done', models.BooleanField(default=False)),
+                ('workorder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='maintenance.archivedworkorder')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedworkorder',
+            index=models.Index(fields=['machine', 'reported_at'], name='arch_wo_machine_reported_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedworkorder',
+            index=models.Index(fields=['reported_at'], name='arch_wo_reported_idx'),
+        ),
+        migrations.RunSQL(CREATE_HISTORY_VIEW, DROP_HISTORY_VIEW),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0010_bootstraprecord'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='workorder',
+            name='wo_reported_idx',
+        ),
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(fields=['-reported_at', '-id'], name='wo_reported_id_idx'),
+        ),
+    ]
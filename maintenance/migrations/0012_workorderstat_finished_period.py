@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:27
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+
+
+def rebuild_stats(apps, schema_editor):
+    # แยก bucket เดิมตามเดือนที่ทำเสร็จ (รวมใบงานที่เก็บถาวรแล้ว เหมือน metrics.rebuild)
+    WorkOrderHistory = apps.get_model('maintenance', 'WorkOrderHistory')
+    WorkOrderStat = apps.get_model('maintenance', 'WorkOrderStat')
+    rows = (
+        WorkOrderHistory.objects
+        .annotate(period=TruncMonth('reported_at', output_field=DateField()),
+                  finished_period=TruncMonth('finished_at', output_field=DateField()))
+        .values('period', 'finished_period', 'wo_type', 'priority', 'status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    stats = [WorkOrderStat(**row) for row in rows]
+    WorkOrderStat.objects.all().delete()
+    WorkOrderStat.objects.bulk_create(stats, batch_size=1000)
+
+
+def merge_stats(apps, schema_editor):
+    # ย้อน migration: รวม bucket กลับเป็น (เดือนที่แจ้ง, ประเภท, ความสำคัญ, สถานะ)
+    WorkOrderStat = apps.get_model('maintenance', 'WorkOrderStat')
+    rows = WorkOrderStat.objects.values('period', 'wo_type', 'priority', 'status').annotate(count=Sum('count')).order_by()
+    stats = [WorkOrderStat(**row) for row in rows]
+    WorkOrderStat.objects.all().delete()
+    WorkOrderStat.objects.bulk_create(stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenance', '0011_workorder_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='workorderstat',
+            name='uniq_workorderstat_bucket',
+        ),
+        migrations.AddField(
+            model_name='workorderstat',
+            name='finished_period',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='workorderstat',
+            constraint=models.UniqueConstraint(condition=models.Q(('finished_period__isnull', False)), fields=('period', 'wo_type', 'priority', 'status', 'finished_period'), name='uniq_workorderstat_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='workorderstat',
+            constraint=models.UniqueConstraint(condition=models.Q(('finished_period__isnull', True)), fields=('period', 'wo_type', 'priority', 'status'), name='uniq_workorderstat_open_bucket'),
+        ),
+        migrations.RunPython(rebuild_stats, merge_stats),
+    ]
@@ -2,6 +2,19 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta, date
+import calendar
+
+
+def add_months(base, months):
+    """
+    บวกจำนวนเดือนแบบปฏิทินจริง ถ้าวันที่เกินจำนวนวันของเดือนปลายทางจะปัดเป็นวันสุดท้ายของเดือน
+    เช่น 31 ม.ค. + 1 เดือน = 28/29 ก.พ.
+    """
+    index = base.year * 12 + base.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    return base.replace(year=year, month=month, day=min(base.day, calendar.monthrange(year, month)[1]))
+
 
 class MachineCategory(models.Model):
     """
@@ -45,10 +58,46 @@ class Machine(models.Model):
     image = models.ImageField(upload_to='machines/', null=True, blank=True)  # ต้องมี Pillow
     is_active = models.BooleanField(default=True)
 
+    # ตัวนับ denormalized ปรับโดย counters.py (ไม่แก้ผ่านฟอร์ม)
+    open_workorder_count = models.PositiveIntegerField(default=0, editable=False)
+    last_maintenance_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # MachineListView เรียงตามจำนวนใบงานค้าง / วันที่บำรุงรักษาล่าสุด
+            models.Index(fields=['-open_workorder_count', 'code'], name='machine_open_wo_idx'),
+            models.Index(fields=['last_maintenance_at', 'code'], name='machine_last_maint_idx'),
+        ]
+
     def __str__(self):
         return f'{self.code} - {self.name}'
 
 
+class MaintenancePlanQuerySet(models.QuerySet):
+    """
+    QuerySet ของแผนบำรุงรักษา ที่ join เครื่องจักร/ประเภท/สถานที่มาในคิวรีเดียว
+    และโหลดเฉพาะคอลัมน์ที่หน้ารายการใช้ เพื่อไม่ให้เกิด N+1 query
+    """
+    LIST_FIELDS = (
+        'title', 'frequency_value', 'frequency_unit', 'last_done_date', 'next_due_date',
+        'machine__code', 'machine__name', 'machine__is_active',
+        'machine__category__name', 'machine__location__name',
+    )
+
+    def with_machine(self):
+        return self.select_related('machine__category', 'machine__location').only(*self.LIST_FIELDS)
+
+    def due_within(self, days=7):
+        today = date.today()
+        return self.with_machine().filter(next_due_date__lte=today + timedelta(days=days)).order_by('next_due_date')
+
+    def overdue(self):
+        return self.with_machine().filter(next_due_date__lt=date.today()).order_by('next_due_date')
+
+    def for_location(self, location):
+        return self.with_machine().filter(machine__location=location)
+
+
 class MaintenancePlan(models.Model):
     """
     แผนการบำรุงรักษาตามกำหนด (Preventive Maintenance Plan)
@@ -73,6 +122,14 @@ class MaintenancePlan(models.Model):
     last_done_date = models.DateField(null=True, blank=True)
     next_due_date = models.DateField(null=True, blank=True)
 
+    objects = MaintenancePlanQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # PlanListView เรียงตาม next_due_date และ due_within กรองช่วง next_due_date
+            models.Index(fields=['next_due_date'], name='plan_next_due_idx'),
+        ]
+
     def __str__(self):
         return f'{self.machine.code} - {self.title}'
 
@@ -82,8 +139,8 @@ class MaintenancePlan(models.Model):
             return base + timedelta(days=self.frequency_value)
         if self.frequency_unit == self.UNIT_WEEKS:
             return base + timedelta(weeks=self.frequency_value)
-        # MONTHS (แบบง่าย ๆ คิดเป็น 30 วันต่อเดือน)
-        return base + timedelta(days=30 * self.frequency_value)
+        # MONTHS คิดตามเดือนในปฏิทินจริง
+        return add_months(base, self.frequency_value)
 
     def save(self, *args, **kwargs):
         if not self.next_due_date:
@@ -92,8 +149,31 @@ class MaintenancePlan(models.Model):
 
     @classmethod
     def due_within(cls, days=7):
-        today = date.today()
-        return cls.objects.filter(next_due_date__lte=today + timedelta(days=days)).order_by('next_due_date')
+        return cls.objects.due_within(days=days)
+
+
+class PMCalendarEntry(models.Model):
+    """
+    ปฏิทิน PM ล่วงหน้า (materialized) แต่ละแถวคือรอบบำรุงรักษาหนึ่งรอบของแผน
+    ภายในช่วงที่พยากรณ์ไว้ (ค่าเริ่มต้น 12 เดือน) สร้างโดย maintenance/forecast.py
+    ใช้สำหรับหน้า Workload และ Dashboard แทนการคำนวณทีละแผน
+    """
+    plan = models.ForeignKey(MaintenancePlan, on_delete=models.CASCADE, related_name='calendar_entries')
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='calendar_entries')
+    due_date = models.DateField()
+    occurrence = models.PositiveIntegerField()  # 0 = next_due_date ของแผน
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['due_date'], name='pmcal_due_idx'),
+            models.Index(fields=['machine', 'due_date'], name='pmcal_machine_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['plan', 'occurrence'], name='uniq_pmcal_plan_occurrence'),
+        ]
+
+    def __str__(self):
+        return f'{self.plan_id} @ {self.due_date}'
 
 
 class WorkOrder(models.Model):
@@ -154,10 +234,138 @@ class WorkOrder(models.Model):
     summary = models.CharField(max_length=255)
     notes = models.TextField(blank=True)
 
+    # จำนวนงานย่อยทั้งหมด / ที่เสร็จแล้ว ปรับโดย counters.py
+    task_total = models.PositiveIntegerField(default=0, editable=False)
+    task_done = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # WorkOrderListView เรียงตาม reported_at ล่าสุดก่อน และแบ่งหน้าด้วย keyset (reported_at, id)
+            models.Index(fields=['-reported_at', '-id'], name='wo_reported_id_idx'),
+            # กรองตามสถานะ (Dashboard / งานค้าง) แล้วเรียงตามเวลาแจ้ง
+            models.Index(fields=['status', '-reported_at'], name='wo_status_reported_idx'),
+            # Work Order ของเครื่องจักรแต่ละเครื่องแยกตามสถานะ
+            models.Index(fields=['machine', 'status'], name='wo_machine_status_idx'),
+            # partial index เฉพาะงานที่ยังไม่ปิด ซึ่งเป็นส่วนน้อยของตาราง
+            models.Index(
+                fields=['due_date'], name='wo_open_due_idx',
+                condition=models.Q(status__in=['OPEN', 'IN_PROGRESS']),
+            ),
+        ]
+
     def __str__(self):
         return f'WO-{self.code} ({self.get_wo_type_display()})'
 
 
+class WorkOrderStat(models.Model):
+    """
+    ตารางสรุปจำนวน Work Order (rollup) แยกตามเดือนที่แจ้ง ประเภท ความสำคัญ สถานะ และเดือนที่ทำเสร็จ
+    อัปเดตแบบ incremental จาก signal ของ WorkOrder (ดู maintenance/metrics.py)
+    ทำให้ Dashboard อ่านตัวเลขได้จากตารางเล็ก ๆ นี้แทนการนับ WorkOrder ทั้งตาราง
+    """
+    period = models.DateField()  # วันที่ 1 ของเดือนที่แจ้ง (reported_at)
+    wo_type = models.CharField(max_length=10, choices=WorkOrder.TYPE_CHOICES)
+    priority = models.CharField(max_length=10, choices=WorkOrder.PRIORITY_CHOICES)
+    status = models.CharField(max_length=20, choices=WorkOrder.STATUS_CHOICES)
+    finished_period = models.DateField(null=True)  # วันที่ 1 ของเดือนที่ทำเสร็จ (finished_at) สำหรับกราฟแนวโน้ม
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        # NULL ไม่ซ้ำกันใน unique constraint ปกติ จึงแยก bucket ที่ยังไม่เสร็จเป็น partial constraint
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'wo_type', 'priority', 'status', 'finished_period'],
+                                    condition=models.Q(finished_period__isnull=False),
+                                    name='uniq_workorderstat_bucket'),
+            models.UniqueConstraint(fields=['period', 'wo_type', 'priority', 'status'],
+                                    condition=models.Q(finished_period__isnull=True),
+                                    name='uniq_workorderstat_open_bucket'),
+        ]
+
+    def __str__(self):
+        return f'{self.period:%Y-%m} {self.wo_type}/{self.priority}/{self.status}: {self.count}'
+
+
+class ReliabilitySnapshot(models.Model):
+    """
+    สรุปตัวชี้วัดความน่าเชื่อถือ (MTTR / MTBF / PM compliance / backlog) ของเครื่องจักรรายเดือน
+    คำนวณเป็นระยะจากประวัติ Work Order โดย maintenance/reliability.py (manage.py snapshot_reliability)
+    เก็บเป็นผลรวมและจำนวน จึงรวมเป็นระดับประเภท/สถานที่/ช่วงหลายปีได้ด้วย SUM บนตารางเล็กนี้
+    """
+    period = models.DateField()  # วันที่ 1 ของเดือน
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='reliability_snapshots')
+    failures = models.PositiveIntegerField(default=0)           # ใบงาน CM ที่แจ้งในเดือน
+    failure_gaps = models.PositiveIntegerField(default=0)       # จำนวนช่วงห่างจากการเสียครั้งก่อน
+    failure_gap_seconds = models.FloatField(default=0)
+    repairs = models.PositiveIntegerField(default=0)            # ใบงาน CM ที่ซ่อมเสร็จในเดือน
+    repair_seconds = models.FloatField(default=0)
+    pm_due = models.PositiveIntegerField(default=0)             # ใบงาน PM ที่ครบกำหนดในเดือน
+    pm_on_time = models.PositiveIntegerField(default=0)
+    backlog = models.PositiveIntegerField(default=0)            # ใบงานค้าง ณ สิ้นเดือน
+    backlog_age_seconds = models.FloatField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['period'], name='relsnap_period_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['machine', 'period'], name='uniq_relsnap_machine_period'),
+        ]
+
+    def __str__(self):
+        return f'{self.machine_id} @ {self.period:%Y-%m}'
+
+
+class WorkOrderEvent(models.Model):
+    """
+    บันทึกการเปลี่ยนแปลงของใบงานแบบเพิ่มอย่างเดียว (สถานะ / ผู้รับผิดชอบ / ความสำคัญ / งานย่อย)
+    หนึ่งแถวต่อหนึ่งการเปลี่ยนแปลง เขียนเป็นชุดตอนจบ request โดย maintenance/journal.py
+    บน PostgreSQL ตารางแบ่ง partition รายเดือนตาม occurred_at และมี BRIN index (ดู migration 0008)
+    ไม่มี foreign key constraint ประวัติจึงยังอยู่แม้ใบงานหรือผู้ใช้ถูกลบ
+    """
+    KIND_CREATED = 1
+    KIND_STATUS = 2
+    KIND_ASSIGNEE = 3
+    KIND_PRIORITY = 4
+    KIND_DELETED = 5
+    KIND_TASK_ADDED = 10
+    KIND_TASK_DONE = 11
+    KIND_TASK_REOPENED = 12
+    KIND_TASK_RENAMED = 13
+    KIND_TASK_REMOVED = 14
+    KIND_CHOICES = [
+        (KIND_CREATED, 'Created'),
+        (KIND_STATUS, 'Status'),
+        (KIND_ASSIGNEE, 'Assignee'),
+        (KIND_PRIORITY, 'Priority'),
+        (KIND_DELETED, 'Deleted'),
+        (KIND_TASK_ADDED, 'Task added'),
+        (KIND_TASK_DONE, 'Task done'),
+        (KIND_TASK_REOPENED, 'Task reopened'),
+        (KIND_TASK_RENAMED, 'Task renamed'),
+        (KIND_TASK_REMOVED, 'Task removed'),
+    ]
+
+    occurred_at = models.DateTimeField()
+    workorder = models.ForeignKey(WorkOrder, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                                  related_name='events')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False,
+                             db_index=False, null=True, blank=True, related_name='+')
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    task_id = models.BigIntegerField(null=True, blank=True)
+    # ค่าเดิม / ค่าใหม่: รหัสสถานะ, id ผู้ใช้, รหัสความสำคัญ หรือชื่องานย่อย
+    value_from = models.CharField(max_length=200, blank=True)
+    value_to = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['workorder', 'occurred_at'], name='wo_event_wo_time_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.workorder_id} {self.get_kind_display()} @ {self.occurred_at:%Y-%m-%d %H:%M}'
+
+
 class WorkOrderTask(models.Model):
     """
     รายการงานย่อยในใบสั่งงาน (Work Order Tasks)
@@ -188,3 +396,119 @@ class Attachment(models.Model):
     def __str__(self):
         target = self.machine or self.workorder
         return f'Attachment for {target}'
+
+
+class ArchivedWorkOrder(models.Model):
+    """
+    ใบงานที่ปิดแล้ว (DONE / CANCELLED) และเก่ากว่าที่กำหนด ย้ายออกจากตาราง WorkOrder โดย maintenance/archive.py
+    เก็บ id เดิมไว้ ประวัติใน WorkOrderEvent จึงยังอ้างถึงได้ อ่านรวมกับใบงานปัจจุบันผ่าน WorkOrderHistory
+    """
+    id = models.BigIntegerField(primary_key=True)
+    code = models.CharField(max_length=20, unique=True)
+    wo_type = models.CharField(max_length=10, choices=WorkOrder.TYPE_CHOICES)
+    priority = models.CharField(max_length=10, choices=WorkOrder.PRIORITY_CHOICES)
+    status = models.CharField(max_length=20, choices=WorkOrder.STATUS_CHOICES)
+
+    machine = models.ForeignKey(Machine, on_delete=models.PROTECT, related_name='archived_workorders')
+    plan = models.ForeignKey(MaintenancePlan, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reported_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+')
+    assigned_to = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='+')
+
+    reported_at = models.DateTimeField()
+    due_date = models.DateField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    summary = models.CharField(max_length=255)
+    notes = models.TextField(blank=True)
+    task_total = models.PositiveIntegerField(default=0)
+    task_done = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # ประวัติของเครื่องจักรและรายงานย้อนหลังอ่านตามเครื่องและช่วงเวลาแจ้ง
+            models.Index(fields=['machine', 'reported_at'], name='arch_wo_machine_reported_idx'),
+            models.Index(fields=['reported_at'], name='arch_wo_reported_idx'),
+        ]
+
+    def __str__(self):
+        return f'WO-{self.code} ({self.get_wo_type_display()}, archived)'
+
+
+class ArchivedWorkOrderTask(models.Model):
+    """งานย่อยของใบงานที่ถูกเก็บถาวร (id เดิมจาก WorkOrderTask)"""
+    id = models.BigIntegerField(primary_key=True)
+    workorder = models.ForeignKey(ArchivedWorkOrder, on_delete=models.CASCADE, related_name='tasks')
+    title = models.CharField(max_length=200)
+    is_done = models.BooleanField(default=False)
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedAttachment(models.Model):
+    """
+    ข้อมูลไฟล์แนบของใบงานที่ถูกเก็บถาวร (id เดิมจาก Attachment)
+    ย้ายเฉพาะแถวในฐานข้อมูล ตัวไฟล์และรูปย่อยังอยู่ที่เดิมใน storage
+    """
+    id = models.BigIntegerField(primary_key=True)
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    workorder = models.ForeignKey(ArchivedWorkOrder, on_delete=models.CASCADE, related_name='attachments')
+    file = models.ImageField(upload_to='attachments/', null=True, blank=True)
+    uploaded_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'Attachment for {self.workorder}'
+
+
+class WorkOrderHistory(models.Model):
+    """
+    ใบงานทั้งหมดทั้งปัจจุบันและที่เก็บถาวร (database view: UNION ALL ของสองตาราง ดู migration 0009)
+    ใช้กับรายงานและการคำนวณย้อนหลัง (reliability / metrics.rebuild / counters) ส่วนหน้าใช้งานประจำวัน
+    อ่านจาก WorkOrder ซึ่งมีเฉพาะข้อมูลที่ยังใช้งานอยู่ อ่านอย่างเดียว
+    """
+    id = models.BigIntegerField(primary_key=True)
+    code = models.CharField(max_length=20)
+    wo_type = models.CharField(max_length=10, choices=WorkOrder.TYPE_CHOICES)
+    priority = models.CharField(max_length=10, choices=WorkOrder.PRIORITY_CHOICES)
+    status = models.CharField(max_length=20, choices=WorkOrder.STATUS_CHOICES)
+
+    machine = models.ForeignKey(Machine, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    plan = models.ForeignKey(MaintenancePlan, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                             related_name='+')
+    reported_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False,
+                                    null=True, related_name='+')
+    assigned_to = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False,
+                                    null=True, related_name='+')
+
+    reported_at = models.DateTimeField()
+    due_date = models.DateField(null=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    summary = models.CharField(max_length=255)
+    notes = models.TextField()
+    task_total = models.PositiveIntegerField()
+    task_done = models.PositiveIntegerField()
+    is_archived = models.BooleanField()
+
+    class Meta:
+        managed = False
+        db_table = 'maintenance_workorderhistory'
+
+    def __str__(self):
+        return f'WO-{self.code} ({self.get_wo_type_display()})'
+
+
+class BootstrapRecord(models.Model):
+    """
+    checksum ของสิ่งที่ manage.py bootstrap ทำไปแล้ว (เช่น fixture ที่โหลด) เพื่อข้ามขั้นตอนเดิมตอน container start ครั้งถัดไป
+    """
+    name = models.CharField(max_length=200, unique=True)   # เช่น 'fixture:initial_full.json'
+    checksum = models.CharField(max_length=64)
+    applied_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
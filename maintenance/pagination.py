@@ -0,0 +1,171 @@
+"""
+Keyset (cursor) pagination สำหรับหน้ารายการที่ข้อมูลเยอะ
+
+แทนที่ OFFSET/LIMIT + COUNT(*) ของ Paginator ปกติ ด้วยการกรองจากค่าคีย์ของแถวสุดท้าย
+เช่น WHERE (reported_at, id) < (...) ORDER BY reported_at DESC, id DESC LIMIT n+1
+ทุกหน้าจึงเร็วเท่ากันไม่ว่าจะลึกแค่ไหน และไม่ต้องนับจำนวนแถวทั้งหมด
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F, Q
+
+
+def estimate_count(queryset):
+    """
+    จำนวนแถวโดยประมาณจากสถิติของ planner (EXPLAIN) บน PostgreSQL โดยไม่ต้อง COUNT(*)
+    ฐานข้อมูลอื่นใช้ count() ปกติ
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def encode_cursor(values, forward):
+    payload = {'d': 'n' if forward else 'p', 'k': [None if v is None else str(v) for v in values]}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """คืนค่า (values, forward) หรือ None ถ้า cursor ไม่ถูกต้อง"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values, direction = payload['k'], payload['d']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(values, list) or direction not in ('n', 'p'):
+        return None
+    return values, direction == 'n'
+
+
+class CursorPage:
+    """
+    หน้าผลลัพธ์แบบ cursor มี interface คล้าย django.core.paginator.Page
+    (has_next / has_previous / object_list) เพื่อให้ template เดิมใช้งานได้
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, estimated_total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_total = estimated_total
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginationMixin:
+    """
+    Mixin สำหรับ ListView ใช้ keyset pagination แทน OFFSET paginator
+
+    keyset_fields: ฟิลด์ที่ใช้เรียง (ใส่ '-' หน้าชื่อสำหรับเรียงจากมากไปน้อย)
+                   ฟิลด์สุดท้ายต้อง unique (เช่น id หรือ code) เพื่อให้ลำดับแน่นอน
+                   ฟิลด์ที่เป็น null ได้จะถูกเรียงไว้ท้ายสุดเสมอ
+    estimate_total: ถ้า True จะใส่จำนวนแถวโดยประมาณ (จากสถิติของ planner) ใน page_obj
+    """
+    keyset_fields = ('id',)
+    estimate_total = False
+    cursor_kwarg = 'cursor'
+
+    def get_keyset_fields(self):
+        # คืนค่า None เพื่อกลับไปใช้ Paginator ปกติ (เช่น ผลการค้นหาที่เรียงตาม rank)
+        return self.keyset_fields
+
+    def paginate_queryset(self, queryset, page_size):
+        keyset_fields = self.get_keyset_fields()
+        if not keyset_fields:
+            return super().paginate_queryset(queryset, page_size)
+
+        opts = queryset.model._meta
+        fields = []
+        for spec in keyset_fields:
+            name = spec.lstrip('-')
+            fields.append((name, spec.startswith('-'), opts.get_field(name)))
+
+        values, forward = None, True
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded and len(decoded[0]) == len(fields):
+            try:
+                values = [None if v is None else field.to_python(v) for (_, _, field), v in zip(fields, decoded[0])]
+                forward = decoded[1]
+            except (ValidationError, TypeError, ValueError):
+                # cursor ที่ถูกแก้ไขจนค่าแปลงไม่ได้ กลับไปหน้าแรก
+                values, forward = None, True
+
+        estimated = estimate_count(queryset) if self.estimate_total else None
+        qs = queryset.order_by(*self._ordering(fields, forward))
+        if values is not None:
+            qs = qs.filter(self._after(fields, values, forward))
+        rows = list(qs[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not forward:
+            rows.reverse()
+
+        def key(obj):
+            return [getattr(obj, name) for name, _, _ in fields]
+
+        next_cursor = previous_cursor = None
+        if rows:
+            # เดินหน้า: มีหน้าก่อนหน้าถ้ามาจาก cursor / ถอยหลัง: มีหน้าถัดไปเสมอ
+            if (more if forward else values is not None):
+                next_cursor = encode_cursor(key(rows[-1]), forward=True)
+            if (values is not None if forward else more):
+                previous_cursor = encode_cursor(key(rows[0]), forward=False)
+
+        page = CursorPage(rows, next_cursor, previous_cursor, estimated)
+        return None, page, rows, page.has_other_pages()
+
+    @staticmethod
+    def _ordering(fields, forward):
+        ordering = []
+        for name, descending, field in fields:
+            if not forward:
+                descending = not descending
+            # null อยู่ท้ายเสมอเมื่อเดินหน้า จึงอยู่หน้าสุดเมื่อเรียงกลับเพื่อถอยหลัง
+            nulls = ({'nulls_last': True} if forward else {'nulls_first': True}) if field.null else {}
+            ordering.append(F(name).desc(**nulls) if descending else F(name).asc(**nulls))
+        return ordering
+
+    @staticmethod
+    def _after(fields, values, forward):
+        """สร้างเงื่อนไข 'แถวที่อยู่ถัดจาก values' ตามทิศทางการเดิน"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending, field), value in zip(fields, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            if value is None:
+                # แถว null อยู่ท้ายสุด: เดินหน้าไม่มีอะไรถัดไป ถอยหลังคือทุกแถวที่ไม่ใช่ null
+                step = Q(pk__in=[]) if forward else Q(**{f'{name}__isnull': False})
+            else:
+                step = Q(**{f'{name}__{lookup}': value})
+                if forward and field.null:
+                    step |= Q(**{f'{name}__isnull': True})
+            condition |= equal & step
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        # ขอบเขตของฟิลด์แรกซ้ำไว้นอก OR ให้ planner อ่าน index เป็นช่วงได้ (มีแต่ OR บางฐานข้อมูลอ่านทั้งตาราง)
+        name, descending, field = fields[0]
+        if values[0] is not None and not field.null:
+            condition &= Q(**{f'{name}__{"lte" if descending == forward else "gte"}': values[0]})
+        return condition
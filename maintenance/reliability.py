@@ -0,0 +1,245 @@
+"""
+ตัวชี้วัดความน่าเชื่อถือของเครื่องจักรจากประวัติ Work Order
+
+- MTTR (mean time to repair): เวลาซ่อมเฉลี่ยของใบงาน CM ที่เสร็จแล้ว (started_at -> finished_at
+  ถ้าไม่มี started_at นับจาก reported_at)
+- MTBF (mean time between failures): ระยะห่างเฉลี่ยระหว่างการแจ้งเสีย (CM) ครั้งติดกันของเครื่องเดียวกัน
+  คำนวณด้วย window function LAG() ... OVER (PARTITION BY machine) ในฐานข้อมูล
+- PM compliance: สัดส่วนใบงาน PM ที่ครบกำหนดในเดือนและเสร็จภายในวันครบกำหนด
+- Backlog: จำนวนและอายุเฉลี่ยของใบงานที่ค้าง ณ สิ้นเดือน
+
+ประวัติอ่านจาก WorkOrderHistory (ใบงานปัจจุบัน + ที่เก็บถาวรโดย archive.py) ใบงานเก่าที่ถูกย้ายจึงยังนับครบ
+snapshot() รวมผลเป็นรายเดือนต่อเครื่องลงตาราง ReliabilitySnapshot ด้วย grouped query
+(ไม่วนทีละใบงานใน Python) report() / trend() อ่านจากตาราง snapshot อย่างเดียว
+รายงานย้อนหลังหลายปีจึงเป็นเพียง SUM บนตารางขนาด เครื่องจักร x เดือน
+
+ควรรัน manage.py snapshot_reliability เป็นระยะ (เช่น ทุกชั่วโมงด้วย --months 2 และทั้งหมดวันละครั้ง)
+"""
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (
+    Count, DateField, DateTimeField, F, FloatField, Func, IntegerField, Max, Min, Q, Sum, Value, Window,
+)
+from django.db.models.functions import Coalesce, Lag, TruncMonth
+from django.utils import timezone
+
+from . import caching
+from .metrics import month_start, shift_month
+from .models import ReliabilitySnapshot, WorkOrder, WorkOrderHistory
+
+DEFAULT_MONTHS = 24
+OPEN_STATUSES = (WorkOrder.STATUS_OPEN, WorkOrder.STATUS_INPROG)
+
+# group -> (ฟิลด์ของ snapshot ที่ใช้จัดกลุ่ม, ฟิลด์ที่ใช้แสดงชื่อ)
+GROUPS = {
+    'machine': (('machine_id', 'machine__code', 'machine__name'), 'machine__code'),
+    'category': (('machine__category_id', 'machine__category__name'), 'machine__category__name'),
+    'location': (('machine__location_id', 'machine__location__name'), 'machine__location__name'),
+    'all': ((), None),
+}
+SUM_FIELDS = (
+    'failures', 'failure_gaps', 'failure_gap_seconds', 'repairs', 'repair_seconds', 'pm_due', 'pm_on_time',
+)
+
+
+class Seconds(Func):
+    """แปลงผลต่างของ datetime (DurationField) เป็นจำนวนวินาที"""
+    output_field = FloatField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='EXTRACT(EPOCH FROM %(expressions)s)', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # django_timestamp_diff ของ SQLite คืนค่าเป็นไมโครวินาที
+        return self.as_sql(compiler, connection, template='(%(expressions)s) / 1000000.0', **extra_context)
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _month_boundary(period):
+    """เวลาเริ่มต้นของเดือน period ตามเขตเวลาของระบบ"""
+    return timezone.make_aware(datetime.combine(period, time.min))
+
+
+def _failures(start):
+    """
+    (machine_id, เดือน) -> (จำนวนการเสีย, จำนวนช่วงห่าง, ผลรวมช่วงห่างเป็นวินาที)
+    LAG คำนวณบนประวัติทั้งหมดของเครื่อง การเสียครั้งแรกของเดือนจึงนับช่วงห่างจากเดือนก่อนได้ถูกต้อง
+    Django aggregate บน window function ตรง ๆ ไม่ได้ จึงครอบ query ที่ ORM สร้างด้วย GROUP BY อีกชั้น
+    """
+    previous = Window(Lag('reported_at'), partition_by=[F('machine_id')], order_by=F('reported_at').asc())
+    failures = (
+        WorkOrderHistory.objects.filter(wo_type=WorkOrder.TYPE_CM)
+        .annotate(period=TruncMonth('reported_at', output_field=DateField()),
+                  gap=Seconds(F('reported_at') - previous))
+        .values('machine_id', 'period', 'gap')
+    )
+    sql, params = failures.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT machine_id, period, COUNT(*), COUNT(gap), COALESCE(SUM(gap), 0) '
+            f'FROM ({sql}) failures WHERE period >= %s GROUP BY machine_id, period',
+            (*params, start),
+        )
+        return {(machine_id, _as_date(period)): row for machine_id, period, *row in cursor.fetchall()}
+
+
+def _repairs(start):
+    rows = (
+        WorkOrderHistory.objects
+        .filter(wo_type=WorkOrder.TYPE_CM, status=WorkOrder.STATUS_DONE,
+                finished_at__gte=_month_boundary(start))
+        .annotate(period=TruncMonth('finished_at', output_field=DateField()))
+        .values('machine_id', 'period')
+        .annotate(repairs=Count('pk'),
+                  repair_seconds=Sum(Seconds(F('finished_at') - Coalesce('started_at', 'reported_at'))))
+        .order_by()
+    )
+    return {(row['machine_id'], row['period']): row for row in rows}
+
+
+def _pm_compliance(start):
+    rows = (
+        WorkOrderHistory.objects
+        .filter(wo_type=WorkOrder.TYPE_PM, due_date__gte=start)
+        .exclude(status=WorkOrder.STATUS_CANCEL)
+        .annotate(period=TruncMonth('due_date'))
+        .values('machine_id', 'period')
+        .annotate(pm_due=Count('pk'),
+                  pm_on_time=Count('pk', filter=Q(status=WorkOrder.STATUS_DONE,
+                                                  finished_at__date__lte=F('due_date'))))
+        .order_by()
+    )
+    return {(row['machine_id'], row['period']): row for row in rows}
+
+
+def _backlog(period, until):
+    """ใบงานที่ยังค้าง ณ เวลา until: แจ้งก่อนหน้านั้น และยังไม่ปิดหรือปิดหลังจากนั้น (ไม่นับที่ยกเลิก)"""
+    rows = (
+        WorkOrderHistory.objects
+        .filter(Q(status__in=OPEN_STATUSES) | Q(status=WorkOrder.STATUS_DONE, finished_at__gte=until),
+                reported_at__lt=until)
+        .values('machine_id')
+        .annotate(backlog=Count('pk'),
+                  backlog_age_seconds=Sum(Seconds(Value(until, DateTimeField()) - F('reported_at'))))
+        .order_by()
+    )
+    return {(row['machine_id'], period): row for row in rows}
+
+
+def snapshot(months=None):
+    """
+    คำนวณ snapshot ของ months เดือนล่าสุด (รวมเดือนปัจจุบัน) ใหม่ทั้งหมด คืนค่าจำนวนแถวที่บันทึก
+    months=0 คำนวณตั้งแต่ใบงานแรกในระบบ
+    """
+    months = getattr(settings, 'MAINTENANCE_RELIABILITY_MONTHS', DEFAULT_MONTHS) if months is None else months
+    current = month_start(timezone.localdate())
+    if months:
+        start = shift_month(current, 1 - months)
+    else:
+        first = WorkOrderHistory.objects.aggregate(first=Min('reported_at'))['first']
+        start = month_start(first) if first else current
+
+    periods = []
+    period = start
+    while period <= current:
+        periods.append(period)
+        period = shift_month(period, 1)
+
+    failures = _failures(start)
+    repairs = _repairs(start)
+    pm = _pm_compliance(start)
+    backlog = {}
+    now = timezone.now()
+    for period in periods:
+        # backlog ของเดือนปัจจุบันนับ ณ ตอนนี้ เดือนก่อน ๆ นับ ณ สิ้นเดือน
+        until = min(_month_boundary(shift_month(period, 1)), now)
+        backlog.update(_backlog(period, until))
+
+    snapshots = {}
+    for key in {*failures, *repairs, *pm, *backlog}:
+        machine_id, period = key
+        snap = snapshots[key] = ReliabilitySnapshot(machine_id=machine_id, period=period)
+        if key in failures:
+            snap.failures, snap.failure_gaps, snap.failure_gap_seconds = failures[key]
+        for source in (repairs, pm, backlog):
+            for field, value in source.get(key, {}).items():
+                if field not in ('machine_id', 'period'):
+                    setattr(snap, field, value or 0)
+
+    with transaction.atomic():
+        ReliabilitySnapshot.objects.filter(period__gte=start).delete()
+        ReliabilitySnapshot.objects.bulk_create(snapshots.values(), batch_size=1000)
+        caching.invalidate('reliability')
+    return len(snapshots)
+
+
+def _derive(row):
+    """แปลงผลรวมเป็นตัวชี้วัด (ชั่วโมง / เปอร์เซ็นต์ / วัน)"""
+    row['mttr_hours'] = round(row['repair_seconds'] / row['repairs'] / 3600, 2) if row['repairs'] else None
+    row['mtbf_hours'] = round(row['failure_gap_seconds'] / row['failure_gaps'] / 3600, 2) if row['failure_gaps'] else None
+    row['pm_compliance'] = round(100 * row['pm_on_time'] / row['pm_due'], 1) if row['pm_due'] else None
+    row['backlog_age_days'] = round(row['backlog_age_seconds'] / row['backlog'] / 86400, 1) if row['backlog'] else None
+    return row
+
+
+def _range(months):
+    last = ReliabilitySnapshot.objects.aggregate(last=Max('period'))['last']
+    if last is None:
+        return None, None
+    return shift_month(last, 1 - months), last
+
+
+def report(group='machine', months=12):
+    """
+    ตัวชี้วัดของ months เดือนล่าสุดที่มี snapshot แยกตาม group (machine / category / location / all)
+    backlog คือค่า ณ เดือนล่าสุดของช่วง (เป็นยอดคงค้าง ไม่ใช่ผลรวมรายเดือน)
+    คืนค่า dict: start, end, rows
+    """
+    fields, label = GROUPS[group]
+    start, end = _range(months)
+    if start is None:
+        return {'start': None, 'end': None, 'rows': []}
+
+    def compute():
+        snapshots = ReliabilitySnapshot.objects.filter(period__gte=start, period__lte=end)
+        sums = {
+            **{name: Sum(name) for name in SUM_FIELDS},
+            'backlog': Coalesce(Sum('backlog', filter=Q(period=end)), 0, output_field=IntegerField()),
+            'backlog_age_seconds': Coalesce(Sum('backlog_age_seconds', filter=Q(period=end)), 0.0,
+                                            output_field=FloatField()),
+        }
+        if not fields:
+            return [_derive(snapshots.aggregate(**sums))] if snapshots.exists() else []
+        rows = []
+        for row in snapshots.values(*fields).annotate(**sums).order_by(label):
+            row['label'] = row[label] or '-'
+            rows.append(_derive(row))
+        return rows
+
+    rows = caching.get_or_set('reliability', ('reliability', 'machine'), (group, months, start, end), compute)
+    return {'start': start, 'end': end, 'rows': rows}
+
+
+def trend(months=12, **filters):
+    """ตัวชี้วัดรายเดือนของทุกเครื่อง (หรือเฉพาะที่กรองด้วย filters เช่น machine__category_id=...)"""
+    start, end = _range(months)
+    if start is None:
+        return []
+    rows = (
+        ReliabilitySnapshot.objects
+        .filter(period__gte=start, period__lte=end, **filters)
+        .values('period')
+        .annotate(**{name: Sum(name) for name in SUM_FIELDS},
+                  backlog=Sum('backlog'), backlog_age_seconds=Sum('backlog_age_seconds'))
+        .order_by('period')
+    )
+    return [_derive(row) for row in rows]
@@ -0,0 +1,125 @@
+"""
+ตัวสร้าง Work Order แบบ PM จากแผนบำรุงรักษาที่ถึงกำหนด (bulk PM scheduler)
+
+ทำงานเป็นชุด (batch) ทีละ batch_size แผน ภายใน transaction เดียวต่อชุด:
+1. ล็อกแผนที่ถึงกำหนดในชุดนั้น (select_for_update) กันการรันซ้อนกัน
+2. bulk_create Work Order แบบ PM และ checklist (WorkOrderTask) ของแต่ละใบ
+3. bulk_update เลื่อน next_due_date ของแผนไปยังรอบถัดไป
+
+รันซ้ำได้อย่างปลอดภัย (idempotent): ถ้ามี PM Work Order ของแผนและวันครบกำหนดนั้นอยู่แล้ว
+จะไม่สร้างซ้ำ เพียงเลื่อนวันครบกำหนดของแผนไปข้างหน้า
+"""
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from . import caching, counters, forecast, journal, metrics
+from .models import MaintenancePlan, WorkOrder, WorkOrderHistory, WorkOrderTask
+
+
+def workorder_code(plan_id, due_date):
+    """รหัสใบงาน PM ที่คงที่ต่อ (แผน, วันครบกำหนด) เช่น PM-261018-42"""
+    return f'PM-{due_date:%y%m%d}-{plan_id}'
+
+
+def checklist_titles(plan):
+    """
+    รายการงานย่อยเริ่มต้นของแผน: แต่ละบรรทัดใน description คือหนึ่งงานย่อย
+    ถ้าไม่มี description จะใช้ชื่อแผนเป็นงานย่อยเดียว
+    """
+    lines = [line.strip(' -*\t') for line in plan.description.splitlines()]
+    titles = [line[:200] for line in lines if line]
+    return titles or [plan.title]
+
+
+def due_plans(as_of):
+    """แผนของเครื่องจักรที่ใช้งานอยู่ ซึ่งครบกำหนดภายในวันที่ as_of"""
+    return MaintenancePlan.objects.filter(next_due_date__lte=as_of, machine__is_active=True)
+
+
+def schedule_batch(plan_ids, as_of):
+    """สร้าง PM Work Order สำหรับแผนชุดหนึ่งใน transaction เดียว คืนค่า (จำนวนใบงาน, จำนวนงานย่อย)"""
+    with transaction.atomic():
+        plans = list(
+            due_plans(as_of)
+            .filter(pk__in=plan_ids)
+            .select_for_update(of=('self',))
+            .only('machine', 'title', 'description', 'frequency_value', 'frequency_unit',
+                  'last_done_date', 'next_due_date')
+        )
+        if not plans:
+            return 0, 0
+
+        existing = set(
+            WorkOrder.objects
+            .filter(plan_id__in=[p.pk for p in plans], wo_type=WorkOrder.TYPE_PM,
+                    due_date__in={p.next_due_date for p in plans})
+            .values_list('plan_id', 'due_date')
+        )
+        # รหัสต้องไม่ซ้ำกับใบงานที่เก็บถาวรแล้วด้วย
+        existing_codes = set(
+            WorkOrderHistory.objects
+            .filter(code__in=[workorder_code(p.pk, p.next_due_date) for p in plans])
+            .values_list('code', flat=True)
+        )
+
+        workorders, checklists = [], []
+        for plan in plans:
+            due = plan.next_due_date
+            code = workorder_code(plan.pk, due)
+            if (plan.pk, due) not in existing and code not in existing_codes:
+                titles = checklist_titles(plan)
+                workorders.append(WorkOrder(
+                    code=code,
+                    wo_type=WorkOrder.TYPE_PM,
+                    machine_id=plan.machine_id,
+                    plan_id=plan.pk,
+                    due_date=due,
+                    summary=plan.title,
+                    task_total=len(titles),
+                ))
+                checklists.append(titles)
+            # เลื่อนไปยังรอบถัดไปที่เลย as_of (แผนที่ค้างหลายรอบจะได้ใบงานเดียว)
+            next_due = plan.compute_next_due(from_date=due)
+            while due < next_due <= as_of:
+                next_due = plan.compute_next_due(from_date=next_due)
+            plan.next_due_date = next_due
+
+        WorkOrder.objects.bulk_create(workorders)
+        tasks = [
+            WorkOrderTask(workorder=wo, title=title)
+            for wo, titles in zip(workorders, checklists)
+            for title in titles
+        ]
+        WorkOrderTask.objects.bulk_create(tasks)
+        MaintenancePlan.objects.bulk_update(plans, ['next_due_date'])
+        forecast.refresh_plans([plan.pk for plan in plans])
+        # bulk_create ไม่ส่ง post_save จึงต้องปรับตัวนับของ Dashboard และเครื่องจักรเอง
+        metrics.record_created(workorders)
+        counters.record_created(workorders)
+        journal.record_created(workorders)
+        caching.invalidate('plan', 'workorder')
+        return len(workorders), len(tasks)
+
+
+def schedule_due_plans(as_of=None, days_ahead=0, batch_size=500):
+    """
+    สร้าง PM Work Order ให้ทุกแผนที่ครบกำหนดภายใน as_of + days_ahead วัน
+    คืนค่า dict สรุปจำนวนแผน ใบงาน และงานย่อยที่สร้าง
+    """
+    as_of = (as_of or date.today()) + timedelta(days=days_ahead)
+    result = {'plans': 0, 'workorders': 0, 'tasks': 0, 'batches': 0}
+    last_id = 0
+    while True:
+        # keyset ตาม id เพื่อไม่ต้อง OFFSET และไม่วนกลับมาเจอแผนเดิม
+        plan_ids = list(
+            due_plans(as_of).filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not plan_ids:
+            return result
+        last_id = plan_ids[-1]
+        created, tasks = schedule_batch(plan_ids, as_of)
+        result['plans'] += len(plan_ids)
+        result['workorders'] += created
+        result['tasks'] += tasks
+        result['batches'] += 1
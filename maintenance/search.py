@@ -0,0 +1,94 @@
+"""
+ระบบค้นหาเครื่องจักรและ Work Order แบบเลือก backend ได้ (pluggable search)
+
+- PostgreSQL: ใช้ GIN index แบบ pg_trgm บน UPPER(คอลัมน์) ซึ่งตรงกับ SQL ที่ Django
+  สร้างให้ icontains จึงใช้ index ได้ และจัดอันดับผลลัพธ์ด้วย word_similarity()
+- SQLite: ใช้ตาราง FTS5 (tokenizer แบบ trigram) ที่ trigger ในฐานข้อมูลอัปเดตให้ทุกครั้ง
+  ที่ insert/update/delete และจัดอันดับด้วย bm25()
+- backend อื่น ๆ: icontains ธรรมดา
+
+index / ตาราง FTS ถูกสร้างใน migration 0004_search_indexes
+เลือก backend เองได้ด้วย settings.MAINTENANCE_SEARCH_BACKEND (dotted path)
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Machine, WorkOrder
+
+# คอลัมน์ที่ค้นหาได้ของแต่ละ model (ต้องตรงกับ index ใน migration)
+SEARCH_FIELDS = {
+    Machine: ('code', 'name', 'serial_no'),
+    WorkOrder: ('code', 'summary', 'notes'),
+}
+
+# tokenizer แบบ trigram ต้องการคำค้นอย่างน้อย 3 ตัวอักษร
+MIN_TRIGRAM_LENGTH = 3
+
+
+class BasicSearchBackend:
+    """ค้นหาด้วย icontains ทุกคอลัมน์ ใช้ได้กับทุกฐานข้อมูลแต่ไม่ใช้ index"""
+
+    def search(self, queryset, q):
+        fields = SEARCH_FIELDS[queryset.model]
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': q})
+        return queryset.filter(condition).annotate(search_rank=Value(0.0))
+
+
+class TrigramSearchBackend(BasicSearchBackend):
+    """PostgreSQL + pg_trgm: กรองด้วย icontains (ใช้ GIN index) แล้วจัดอันดับด้วย word_similarity"""
+
+    def search(self, queryset, q):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models.functions import Greatest
+
+        fields = SEARCH_FIELDS[queryset.model]
+        rank = Greatest(*[TrigramWordSimilarity(q, field) for field in fields])
+        return super().search(queryset, q).annotate(search_rank=rank)
+
+
+class FTS5SearchBackend(BasicSearchBackend):
+    """SQLite FTS5 (trigram tokenizer) สำหรับทดสอบบนเครื่อง"""
+
+    def search(self, queryset, q):
+        if len(q) < MIN_TRIGRAM_LENGTH:
+            return super().search(queryset, q)
+        table = queryset.model._meta.db_table
+        fts_table = f'{table}_fts'
+        # ครอบคำค้นเป็น phrase เพื่อไม่ให้ตัวอักษรพิเศษถูกตีความเป็น syntax ของ FTS5
+        phrase = '"%s"' % q.replace('"', '""')
+        matches = RawSQL(f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', (phrase,))
+        rank = RawSQL(
+            f'SELECT -bm25({fts_table}) FROM {fts_table} '
+            f'WHERE {fts_table} MATCH %s AND {fts_table}.rowid = {table}.id',
+            (phrase,),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+DEFAULT_BACKENDS = {
+    'postgresql': TrigramSearchBackend,
+    'sqlite': FTS5SearchBackend,
+}
+
+
+def get_backend():
+    path = getattr(settings, 'MAINTENANCE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return DEFAULT_BACKENDS.get(connection.vendor, BasicSearchBackend)()
+
+
+def search(queryset, q):
+    """
+    ค้นหา queryset ของ Machine หรือ WorkOrder ด้วยคำค้น q
+    คืนค่า queryset ที่มี annotation search_rank (ยิ่งมากยิ่งเกี่ยวข้อง) ไว้ใช้ order_by
+    """
+    q = (q or '').strip()
+    if not q:
+        return queryset
+    return get_backend().search(queryset, q)
@@ -0,0 +1,207 @@
+"""
+Signal handlers ของแอป maintenance
+เชื่อมต่อใน MaintenanceConfig.ready()
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, checklist, counters, events, forecast, journal, metrics, thumbnails
+from .models import (
+    Attachment, Location, Machine, MachineCategory, MaintenancePlan, WorkOrder, WorkOrderTask,
+)
+
+
+@receiver(pre_save, sender=WorkOrder)
+def remember_workorder_state(sender, instance, **kwargs):
+    # เก็บค่าเดิมไว้ก่อนบันทึก เพื่อย้ายตัวนับเมื่อสถานะ/ประเภท/ความสำคัญ/เครื่องจักรเปลี่ยน
+    # และเพื่อบันทึกประวัติการเปลี่ยนสถานะ/ผู้รับผิดชอบ/ความสำคัญ
+    instance._stat_bucket = instance._counter_state = instance._journal_state = None
+    if instance.pk:
+        old = sender.objects.filter(pk=instance.pk).values(
+            'reported_at', 'machine_id', 'finished_at', 'assigned_to_id', *metrics.BUCKET_FIELDS).first()
+        if old:
+            instance._stat_bucket = metrics.bucket_key(old)
+            instance._counter_state = counters.workorder_state(old)
+            instance._journal_state = journal.workorder_state(old)
+
+
+@receiver(post_save, sender=WorkOrder)
+def update_workorder_stats(sender, instance, **kwargs):
+    new = metrics.bucket_key(instance.__dict__)
+    old = getattr(instance, '_stat_bucket', None)
+    if old == new:
+        return
+    if old:
+        metrics.apply_delta(old, -1)
+    metrics.apply_delta(new, 1)
+
+
+@receiver(post_delete, sender=WorkOrder)
+def remove_workorder_stats(sender, instance, **kwargs):
+    metrics.apply_delta(metrics.bucket_key(instance.__dict__), -1)
+
+
+@receiver(post_save, sender=WorkOrder)
+def update_machine_counters(sender, instance, **kwargs):
+    counters.workorder_changed(getattr(instance, '_counter_state', None), counters.workorder_state(instance.__dict__))
+
+
+@receiver(post_delete, sender=WorkOrder)
+def remove_machine_counters(sender, instance, **kwargs):
+    counters.workorder_changed(counters.workorder_state(instance.__dict__), None)
+
+
+@receiver(post_save, sender=WorkOrder)
+def journal_workorder_changes(sender, instance, created, **kwargs):
+    old = getattr(instance, '_journal_state', None)
+    if created or old:
+        journal.workorder_saved(instance, old)
+
+
+@receiver(post_delete, sender=WorkOrder)
+def journal_workorder_delete(sender, instance, **kwargs):
+    journal.workorder_deleted(instance)
+
+
+@receiver(pre_save, sender=WorkOrderTask)
+def remember_task_state(sender, instance, **kwargs):
+    # (workorder_id, is_done, title) ก่อนบันทึก ใช้ทั้งตัวนับและประวัติ
+    instance._counter_state = None
+    if instance.pk:
+        instance._counter_state = (
+            sender.objects.filter(pk=instance.pk).values_list('workorder_id', 'is_done', 'title').first()
+        )
+
+
+@receiver(post_save, sender=WorkOrderTask)
+def update_task_counters(sender, instance, **kwargs):
+    old = getattr(instance, '_counter_state', None)
+    if old and old[0] == instance.workorder_id:
+        counters.add_tasks(instance.workorder_id, done=int(instance.is_done) - old[1])
+        return
+    if old:
+        counters.add_tasks(old[0], total=-1, done=-old[1])
+    counters.add_tasks(instance.workorder_id, total=1, done=int(instance.is_done))
+
+
+def _deleted_with_workorder(origin):
+    """งานย่อยถูกลบตามใบงาน (cascade จาก wo.delete() หรือ queryset ของ WorkOrder)"""
+    return isinstance(origin, WorkOrder) or getattr(origin, 'model', None) is WorkOrder
+
+
+@receiver(post_delete, sender=WorkOrderTask)
+def remove_task_counters(sender, instance, origin=None, **kwargs):
+    # งานย่อยที่ถูกลบตามใบงาน (cascade) ไม่ต้องปรับตัวนับของใบงานที่กำลังถูกลบ
+    if _deleted_with_workorder(origin):
+        return
+    counters.add_tasks(instance.workorder_id, total=-1, done=-int(instance.is_done))
+
+
+@receiver(post_save, sender=WorkOrderTask)
+def journal_task_changes(sender, instance, **kwargs):
+    old = getattr(instance, '_counter_state', None)
+    new = (instance.title, instance.is_done)
+    if old and old[0] != instance.workorder_id:
+        # ย้ายไปใบงานอื่น: เป็นการลบจากใบงานเดิมและเพิ่มในใบงานใหม่
+        journal.task_changed(old[0], instance.pk, (old[2], old[1]), None)
+        old = None
+    journal.task_changed(instance.workorder_id, instance.pk, old and (old[2], old[1]), new)
+
+
+@receiver(post_delete, sender=WorkOrderTask)
+def journal_task_delete(sender, instance, origin=None, **kwargs):
+    # งานย่อยที่ถูกลบตามใบงานมีเหตุการณ์ลบใบงานแทนแล้ว
+    if _deleted_with_workorder(origin):
+        return
+    journal.task_changed(instance.workorder_id, instance.pk, (instance.title, instance.is_done), None)
+
+
+@receiver(post_save, sender=MaintenancePlan)
+def refresh_plan_calendar(sender, instance, **kwargs):
+    forecast.refresh_plans([instance.pk])
+
+
+@receiver(post_save, sender=Machine)
+def refresh_machine_calendar(sender, instance, created, **kwargs):
+    # เครื่องที่เลิกใช้งานจะไม่มีรอบ PM ในปฏิทิน
+    if not created:
+        forecast.refresh_plans(instance.plans.values_list('pk', flat=True))
+
+
+def _schedule_thumbnails(file, created, update_fields):
+    if file and (created or update_fields is None or file.field.name in update_fields):
+        # สร้างรูปย่อหลัง commit ใน worker pool ไม่ให้ request ต้องรอ
+        name = file.name
+        transaction.on_commit(lambda: thumbnails.schedule(name))
+
+
+@receiver(post_save, sender=Machine)
+def create_machine_thumbnails(sender, instance, created, update_fields, **kwargs):
+    _schedule_thumbnails(instance.image, created, update_fields)
+
+
+@receiver(post_save, sender=Attachment)
+def create_attachment_thumbnails(sender, instance, created, update_fields, **kwargs):
+    _schedule_thumbnails(instance.file, created, update_fields)
+
+
+@receiver(post_save, sender=WorkOrder)
+def publish_workorder_event(sender, instance, **kwargs):
+    event = {
+        'id': instance.pk,
+        'code': instance.code,
+        'status': instance.status,
+        'status_display': instance.get_status_display(),
+        'priority': instance.priority,
+        'assigned_to_id': instance.assigned_to_id,
+        'assigned_to': '',
+    }
+    # ไม่โหลดผู้ใช้ระหว่างบันทึก: ใช้ชื่อที่โหลดไว้แล้ว หรืออ่านเฉพาะ username หลัง commit ด้วย query เดียว
+    resolve = False
+    if instance.assigned_to_id:
+        if WorkOrder.assigned_to.is_cached(instance):
+            event['assigned_to'] = instance.assigned_to.get_username()
+        else:
+            resolve = True
+
+    def publish():
+        if resolve:
+            User = get_user_model()
+            event['assigned_to'] = User.objects.filter(pk=event['assigned_to_id']).values_list(
+                User.USERNAME_FIELD, flat=True).first() or ''
+        events.publish('workorder', **event)
+
+    transaction.on_commit(publish)
+
+
+@receiver(post_save, sender=WorkOrderTask)
+@receiver(post_delete, sender=WorkOrderTask)
+def publish_task_event(sender, instance, origin=None, **kwargs):
+    # ใบงานที่ถูกลบไม่มีความคืบหน้าให้แจ้ง (การลบใบงานแจ้งผ่าน workorder event อยู่แล้ว)
+    if _deleted_with_workorder(origin):
+        return
+    checklist.publish_progress(instance.workorder_id)
+
+
+# กลุ่ม cache ที่ต้องล้างเมื่อ model แต่ละตัวเปลี่ยน (ดู caching.py)
+CACHE_DEPENDENCIES = {
+    MachineCategory: ('machine',),
+    Location: ('machine',),
+    Machine: ('machine',),
+    MaintenancePlan: ('plan',),
+    WorkOrder: ('workorder',),
+    WorkOrderTask: ('workorder',),
+    Attachment: ('attachment',),
+    get_user_model(): ('user',),
+}
+
+
+def invalidate_cache(sender, **kwargs):
+    caching.invalidate(*CACHE_DEPENDENCIES[sender])
+
+
+for model in CACHE_DEPENDENCIES:
+    post_save.connect(invalidate_cache, sender=model, dispatch_uid=f'invalidate_cache_{model.__name__}_save')
+    post_delete.connect(invalidate_cache, sender=model, dispatch_uid=f'invalidate_cache_{model.__name__}_delete')
@@ -0,0 +1,41 @@
+"""
+WhiteNoiseMiddleware ที่ทำงานได้ทั้งแบบ sync (WSGI) และ async (ASGI)
+
+WhiteNoise 6.9 เป็น middleware แบบ sync อย่างเดียว ภายใต้ uvicorn Django จึงต้องย้ายทุก request
+(รวมถึง async view) ไปทำงานใน thread ตั้งแต่ middleware ตัวนี้ลงไป
+คลาสนี้ใช้ไฟล์ / header ชุดเดิมของ WhiteNoise แต่ภายใต้ ASGI หาไฟล์และเปิดไฟล์ผ่าน sync_to_async
+แล้วส่งเนื้อไฟล์เป็น async iterator (streaming.py) request ที่ไม่ใช่ static ส่งต่อแบบ async
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from . import streaming
+
+# FileResponse อ่านทีละ 4 KB: ส่งต่อครั้งละ 16 ก้อน (64 KB) ต่อการสลับ thread
+FILE_BATCH_SIZE = 16
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # autorefresh ตรวจไฟล์บนดิสก์ทุก request
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        response = await sync_to_async(self.serve)(static_file, request)
+        response.streaming_content = streaming.aiterate(response.streaming_content, FILE_BATCH_SIZE)
+        return response
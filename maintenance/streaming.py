@@ -0,0 +1,44 @@
+"""
+เนื้อหา StreamingHttpResponse ที่ส่งได้ทีละส่วนทั้งภายใต้ WSGI และ ASGI
+
+ภายใต้ ASGI ถ้า streaming content เป็น iterator แบบ sync Django จะอ่านทั้งหมดด้วย sync_to_async(list)
+ก่อนส่ง byte แรก (ไฟล์ export หลักล้านแถว หรือไฟล์ media ทั้งไฟล์จะอยู่ในหน่วยความจำ)
+for_request() จึงห่อ iterator เป็น async generator ที่ดึงทีละชุดผ่าน sync_to_async เมื่อ request มาทาง ASGI
+ส่วน WSGI ใช้ iterator เดิม (FileResponse ยังได้ wsgi.file_wrapper / sendfile)
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+BATCH_SIZE = 500
+
+
+def _take(iterator, size):
+    return list(islice(iterator, size))
+
+
+async def aiterate(iterable, batch_size=BATCH_SIZE):
+    """
+    อ่าน iterator แบบ sync ทีละ batch_size ชิ้นใน thread ของ sync_to_async (connection ฐานข้อมูลเดิม)
+    แล้วส่งต่อเป็นก้อนเดียวต่อชุด (ชิ้นทั้งหมดเป็น str หรือ bytes)
+    """
+    iterator = iter(iterable)
+    try:
+        while batch := await sync_to_async(_take)(iterator, batch_size):
+            yield batch[0][:0].join(batch)
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            await sync_to_async(close)()
+
+
+def is_asgi(request):
+    return isinstance(request, ASGIRequest)
+
+
+def for_request(request, iterable, batch_size=BATCH_SIZE):
+    """เนื้อหาสำหรับ StreamingHttpResponse: async generator ภายใต้ ASGI หรือ iterable เดิมภายใต้ WSGI"""
+    if is_asgi(request):
+        return aiterate(iterable, batch_size)
+    return iterable
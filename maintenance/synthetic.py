@@ -0,0 +1,239 @@
+"""
+สร้างข้อมูลโรงงานจำลองจำนวนมากสำหรับทดสอบประสิทธิภาพ (manage.py generate_factory_data)
+
+ประเภท / สถานที่ / เครื่องจักร / แผน PM / ใบงานย้อนหลังหลายปีพร้อมงานย่อย ไฟล์แนบ และประวัติสถานะ
+สุ่มด้วย seed คงที่จึงได้ข้อมูลชุดเดิมทุกครั้ง บันทึกด้วย bulk_create เป็นชุด
+แล้วคำนวณตารางสรุป (WorkOrderStat / ตัวนับ / ปฏิทิน PM / reliability) ใหม่ครั้งเดียวตอนท้าย
+และแยกประวัติที่ตกอยู่ใน partition default ไปยัง partition รายเดือน (journal.ensure_partitions)
+รหัสทุกตัวขึ้นต้นด้วย prefix จึงรันซ้ำบนฐานข้อมูลจริงได้โดยไม่ชนกับข้อมูลเดิม (ใช้ prefix ต่างกัน)
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching, counters, forecast, journal, metrics, reliability
+from .models import (
+    Attachment, Location, Machine, MachineCategory, MaintenancePlan, WorkOrder, WorkOrderEvent, WorkOrderTask,
+)
+
+BATCH_SIZE = 2000
+PLACEHOLDER = 'attachments/synthetic.gif'
+# GIF ขนาด 1x1 พิกเซล ใช้เป็นไฟล์แนบร่วมกันทุกรายการ
+PLACEHOLDER_BYTES = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+CATEGORY_NAMES = [
+    'CNC Lathe', 'Milling', 'Press', 'Injection Molding', 'Conveyor', 'Compressor', 'Robot Arm',
+    'Oven', 'Grinder', 'Pump', 'Chiller', 'Packaging',
+]
+PLAN_TITLES = [
+    'Lubrication', 'Filter replacement', 'Belt inspection', 'Calibration', 'Coolant change',
+    'Safety check', 'Electrical inspection', 'Bearing check',
+]
+FAULTS = [
+    'Abnormal noise', 'Overheating', 'Oil leak', 'Sensor fault', 'Motor trip', 'Air leak',
+    'Vibration', 'Jammed feeder', 'Alarm on HMI', 'Low pressure',
+]
+TASK_TITLES = [
+    'Lock out / tag out', 'Inspect', 'Clean', 'Replace part', 'Tighten bolts', 'Test run',
+    'Record readings', 'Update logbook',
+]
+FREQUENCIES = [
+    (MaintenancePlan.UNIT_DAYS, 7), (MaintenancePlan.UNIT_DAYS, 14), (MaintenancePlan.UNIT_DAYS, 30),
+    (MaintenancePlan.UNIT_WEEKS, 2), (MaintenancePlan.UNIT_MONTHS, 1), (MaintenancePlan.UNIT_MONTHS, 3),
+    (MaintenancePlan.UNIT_MONTHS, 6),
+]
+TYPE_WEIGHTS = {WorkOrder.TYPE_PM: 55, WorkOrder.TYPE_CM: 35, WorkOrder.TYPE_INS: 10}
+PRIORITY_WEIGHTS = {WorkOrder.PRIORITY_LOW: 30, WorkOrder.PRIORITY_MED: 50, WorkOrder.PRIORITY_HIGH: 20}
+
+
+@contextmanager
+def _keep_reported_at():
+    """ปิด auto_now_add ของ WorkOrder.reported_at ชั่วคราว เพื่อใส่วันที่แจ้งย้อนหลังได้"""
+    field = WorkOrder._meta.get_field('reported_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _names(base, count, suffix):
+    return [base[i % len(base)] + (f' {suffix}{i // len(base) + 1}' if i >= len(base) else '') for i in range(count)]
+
+
+class Generator:
+    """สุ่มข้อมูลทีละชนิดตามลำดับ foreign key ผลลัพธ์สะสมใน self.counts"""
+
+    def __init__(self, prefix='SYN', seed=0, batch_size=BATCH_SIZE):
+        self.prefix = prefix
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.counts = {}
+
+    def _create(self, model, objs):
+        created = model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.counts[model._meta.model_name] = self.counts.get(model._meta.model_name, 0) + len(created)
+        return created
+
+    def create_lookups(self, categories, locations):
+        cats = [MachineCategory(name=name) for name in _names(CATEGORY_NAMES, categories, 'Type ')]
+        locs = [Location(name=f'{self.prefix} Line {chr(65 + i % 26)}{i // 26 or ""}') for i in range(locations)]
+        MachineCategory.objects.bulk_create(cats, ignore_conflicts=True)
+        Location.objects.bulk_create(locs, ignore_conflicts=True)
+        self.categories = list(MachineCategory.objects.filter(name__in=[c.name for c in cats]))
+        self.locations = list(Location.objects.filter(name__in=[loc.name for loc in locs]))
+
+    def create_users(self, count):
+        User = get_user_model()
+        names = [f'{self.prefix.lower()}-tech{i + 1}' for i in range(count)]
+        password = make_password(None)
+        User.objects.bulk_create([User(username=name, password=password) for name in names], ignore_conflicts=True)
+        self.users = list(User.objects.filter(username__in=names))
+
+    def create_machines(self, count):
+        rnd = self.random
+        machines = [
+            Machine(
+                code=f'{self.prefix}-M{i + 1:05d}',
+                name=f'{rnd.choice(self.categories).name} #{i + 1}',
+                category=rnd.choice(self.categories),
+                location=rnd.choice(self.locations) if rnd.random() > 0.1 else None,
+                serial_no=f'SN{rnd.randrange(10 ** 8):08d}',
+                purchase_date=(self.now - timedelta(days=rnd.randrange(365 * 10))).date(),
+                is_active=rnd.random() > 0.05,
+            )
+            for i in range(count)
+        ]
+        self.machines = self._create(Machine, machines)
+
+    def create_plans(self, per_machine):
+        rnd = self.random
+        plans = []
+        for machine in self.machines:
+            for title in rnd.sample(PLAN_TITLES, min(per_machine, len(PLAN_TITLES))):
+                unit, value = rnd.choice(FREQUENCIES)
+                plan = MaintenancePlan(machine=machine, title=title, frequency_unit=unit, frequency_value=value,
+                                       last_done_date=(self.now - timedelta(days=rnd.randrange(60))).date())
+                plan.next_due_date = plan.compute_next_due()
+                plans.append(plan)
+        self.plans = {}
+        for plan in self._create(MaintenancePlan, plans):
+            self.plans.setdefault(plan.machine_id, []).append(plan)
+
+    def workorder(self, number, machine, reported_at):
+        rnd = self.random
+        wo_type = rnd.choices(list(TYPE_WEIGHTS), list(TYPE_WEIGHTS.values()))[0]
+        age = (self.now - reported_at).days
+        if age > 30:
+            status = rnd.choices([WorkOrder.STATUS_DONE, WorkOrder.STATUS_CANCEL, WorkOrder.STATUS_OPEN],
+                                 [90, 5, 5])[0]
+        else:
+            status = rnd.choice([WorkOrder.STATUS_OPEN, WorkOrder.STATUS_INPROG, WorkOrder.STATUS_DONE])
+        started = finished = None
+        if status in (WorkOrder.STATUS_INPROG, WorkOrder.STATUS_DONE):
+            started = min(reported_at + timedelta(hours=rnd.uniform(0.2, 48)), self.now)
+        if status == WorkOrder.STATUS_DONE:
+            finished = min(started + timedelta(hours=rnd.uniform(0.5, 8)), self.now)
+        plan = None
+        if wo_type == WorkOrder.TYPE_PM and self.plans.get(machine.pk):
+            plan = rnd.choice(self.plans[machine.pk])
+        return WorkOrder(
+            code=f'{self.prefix}-W{number:07d}', wo_type=wo_type, status=status, machine=machine, plan=plan,
+            priority=rnd.choices(list(PRIORITY_WEIGHTS), list(PRIORITY_WEIGHTS.values()))[0],
+            reported_by=rnd.choice(self.users) if self.users else None,
+            assigned_to=rnd.choice(self.users) if self.users and rnd.random() > 0.2 else None,
+            reported_at=reported_at, started_at=started, finished_at=finished,
+            due_date=(reported_at + timedelta(days=rnd.randrange(1, 8))).date() if wo_type != WorkOrder.TYPE_CM else None,
+            summary=plan.title if plan else rnd.choice(FAULTS),
+        )
+
+    def create_workorders(self, years, per_machine_year, tasks, attachment_ratio):
+        rnd = self.random
+        span = timedelta(days=365 * years).total_seconds()
+        per_machine = max(1, round(per_machine_year * years))
+        if attachment_ratio and not default_storage.exists(PLACEHOLDER):
+            default_storage.save(PLACEHOLDER, ContentFile(PLACEHOLDER_BYTES))
+
+        number, batch = 0, []
+        for machine in self.machines:
+            for _ in range(per_machine):
+                number += 1
+                batch.append(self.workorder(number, machine, self.now - timedelta(seconds=rnd.uniform(0, span))))
+                if len(batch) >= self.batch_size:
+                    self._save_workorders(batch, tasks, attachment_ratio)
+                    batch = []
+        if batch:
+            self._save_workorders(batch, tasks, attachment_ratio)
+
+    def _save_workorders(self, batch, tasks, attachment_ratio):
+        rnd = self.random
+        with _keep_reported_at():
+            workorders = self._create(WorkOrder, batch)
+        task_objs, attachments = [], []
+        for wo in workorders:
+            count = rnd.randint(0, tasks * 2)
+            done = wo.status == WorkOrder.STATUS_DONE
+            for title in rnd.sample(TASK_TITLES, min(count, len(TASK_TITLES))):
+                task_objs.append(WorkOrderTask(workorder=wo, title=title, is_done=done or rnd.random() < 0.3))
+            if rnd.random() < attachment_ratio:
+                attachments.append(Attachment(workorder=wo, file=PLACEHOLDER))
+        self._create(WorkOrderTask, task_objs)
+        self._create(Attachment, attachments)
+        self._create(WorkOrderEvent, [item for wo in workorders for item in self.history(wo)])
+
+    def history(self, wo):
+        """ประวัติสถานะที่สอดคล้องกับเวลาในใบงาน: แจ้ง -> เริ่มงาน -> เสร็จ (หรือยกเลิกหลังแจ้ง 1 วัน)"""
+        events = [
+            journal.event(wo.pk, WorkOrderEvent.KIND_CREATED, value_to=WorkOrder.STATUS_OPEN,
+                          occurred_at=wo.reported_at, user_id=wo.reported_by_id),
+        ]
+        if wo.assigned_to_id:
+            events.append(journal.event(wo.pk, WorkOrderEvent.KIND_ASSIGNEE, value_to=wo.assigned_to_id,
+                                        occurred_at=wo.reported_at, user_id=wo.reported_by_id))
+        if wo.started_at:
+            events.append(journal.event(wo.pk, WorkOrderEvent.KIND_STATUS, WorkOrder.STATUS_OPEN,
+                                        WorkOrder.STATUS_INPROG, occurred_at=wo.started_at,
+                                        user_id=wo.assigned_to_id))
+        if wo.finished_at:
+            events.append(journal.event(wo.pk, WorkOrderEvent.KIND_STATUS, WorkOrder.STATUS_INPROG,
+                                        WorkOrder.STATUS_DONE, occurred_at=wo.finished_at,
+                                        user_id=wo.assigned_to_id))
+        elif wo.status == WorkOrder.STATUS_CANCEL:
+            cancelled_at = min(wo.reported_at + timedelta(days=1), self.now)
+            events.append(journal.event(wo.pk, WorkOrderEvent.KIND_STATUS, WorkOrder.STATUS_OPEN,
+                                        WorkOrder.STATUS_CANCEL, occurred_at=cancelled_at, user_id=wo.reported_by_id))
+        return events
+
+
+def generate(categories=8, locations=6, machines=200, plans_per_machine=2, years=3, workorders_per_machine_year=24,
+             tasks_per_workorder=3, attachment_ratio=0.05, users=10, prefix='SYN', seed=0, batch_size=BATCH_SIZE):
+    """
+    สร้างข้อมูลจำลองแล้วคำนวณตารางสรุปทั้งหมดใหม่ คืนค่า dict ชื่อ model -> จำนวนแถวที่สร้าง
+    """
+    gen = Generator(prefix=prefix, seed=seed, batch_size=batch_size)
+    with transaction.atomic():
+        gen.create_lookups(categories, locations)
+        gen.create_users(users)
+        gen.create_machines(machines)
+        gen.create_plans(plans_per_machine)
+        gen.create_workorders(years, workorders_per_machine_year, tasks_per_workorder, attachment_ratio)
+
+    # bulk_create ไม่ส่ง signal: คำนวณตัวนับ / สรุป / ปฏิทินจากข้อมูลจริงครั้งเดียว
+    metrics.rebuild()
+    counters.rebuild()
+    forecast.rebuild()
+    reliability.snapshot(months=0)
+    journal.ensure_partitions()
+    caching.invalidate('machine', 'plan', 'workorder', 'user', 'attachment', 'journal')
+    return gen.counts
@@ -0,0 +1,33 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from maintenance import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(file, size='md', ext='webp'):
+    """{% thumbnail_url machine.image 'sm' %} -> URL ของรูปย่อ (หรือไฟล์ต้นฉบับถ้ายังไม่มี)"""
+    return thumbnails.url_for(file, size, ext)
+
+
+@register.simple_tag
+def picture(file, size='md', css_class='', alt=''):
+    """
+    {% picture object.image 'lg' css_class='img-fluid' %}
+    สร้าง <picture> ที่ใช้ WebP เมื่อ browser รองรับ และ JPEG เป็นค่าสำรอง
+    ถ้ารูปย่อยังสร้างไม่เสร็จจะแสดงไฟล์ต้นฉบับ
+    """
+    if not file:
+        return ''
+    webp = thumbnails.derivative_name(file.name, size, 'webp')
+    jpg = thumbnails.derivative_name(file.name, size, 'jpg')
+    if not default_storage.exists(webp) or not default_storage.exists(jpg):
+        return format_html('<img src="{}" class="{}" alt="{}" loading="lazy">', file.url, css_class, alt)
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp">'
+        '<img src="{}" class="{}" alt="{}" loading="lazy"></picture>',
+        default_storage.url(webp), default_storage.url(jpg), css_class, alt,
+    )
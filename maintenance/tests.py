@@ -1,3 +1,1636 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, time, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import F, Min, Sum
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from PIL import Image
+
+from . import (
+    archive, benchmark, caching, checklist, checks, counters, events, forecast, importer, instrumentation, journal, media,
+    metrics, reliability, scheduler, search, synthetic, thumbnails,
+)
+from .forms import WorkOrderForm
+from .pagination import KeysetPaginationMixin
+from .models import (
+    ArchivedAttachment, ArchivedWorkOrder, ArchivedWorkOrderTask, Attachment, BootstrapRecord, Location, Machine, MachineCategory, MaintenancePlan, PMCalendarEntry, WorkOrder, WorkOrderEvent,
+    WorkOrderHistory, WorkOrderStat, WorkOrderTask, add_months,
+)
+
+
+# ทดสอบโดยไม่ใช้ cache (ยกเว้น CachingTest) เพื่อไม่ให้ผลจากการทดสอบหนึ่งค้างไปอีกการทดสอบ
+_no_cache = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+
+
+def setUpModule():
+    _no_cache.enable()
+
+
+def tearDownModule():
+    _no_cache.disable()
+
+
+class MaintenancePlanQueryCountTest(TestCase):
+    """
+    หน้า Dashboard และรายการแผน PM ต้องใช้จำนวน query คงที่ ไม่ขึ้นกับจำนวนแผน
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tech', password='pass')
+        cls.category = MachineCategory.objects.create(name='CNC')
+        cls.location = Location.objects.create(name='Plant A')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_plans(self, count):
+        start = Machine.objects.count()
+        machines = Machine.objects.bulk_create([
+            Machine(code=f'M-{start + i:04d}', name=f'Machine {i}', category=self.category, location=self.location)
+            for i in range(count)
+        ])
+        MaintenancePlan.objects.bulk_create([
+            MaintenancePlan(machine=m, title='Monthly PM', next_due_date=date.today() + timedelta(days=i % 5))
+            for i, m in enumerate(machines)
+        ])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_dashboard_query_count_is_constant(self):
+        self.add_plans(3)
+        few = self.count_queries(reverse('dashboard'))
+        self.add_plans(30)
+        self.assertEqual(self.count_queries(reverse('dashboard')), few)
+
+    def test_plan_list_query_count_is_constant(self):
+        self.add_plans(3)
+        few = self.count_queries(reverse('plan_list'))
+        self.add_plans(30)
+        self.assertEqual(self.count_queries(reverse('plan_list')), few)
+
+    def test_queryset_methods_include_machine_joins(self):
+        self.add_plans(5)
+        MaintenancePlan.objects.update(next_due_date=date.today() - timedelta(days=1))
+        with self.assertNumQueries(1):
+            labels = [str(p) for p in MaintenancePlan.objects.overdue()]
+        self.assertEqual(len(labels), 5)
+        with self.assertNumQueries(1):
+            names = {p.machine.location.name for p in MaintenancePlan.objects.for_location(self.location)}
+        self.assertEqual(names, {'Plant A'})
+
+
+class DashboardMetricsTest(TestCase):
+    """
+    กราฟแนวโน้มนับงานที่ทำเสร็จตามเดือนที่ทำเสร็จ และกราฟสถานะเครื่องจักรแบ่งเครื่องทั้งหมดเป็นสามส่วนไม่ซ้อนกัน
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tech', password='pass')
+        category = MachineCategory.objects.create(name='Pump')
+        cls.machines = Machine.objects.bulk_create([
+            Machine(code=f'DP-{i}', name=f'Pump {i}', category=category, is_active=i != 3) for i in range(4)
+        ])
+        today = date.today()
+        MaintenancePlan.objects.bulk_create([
+            MaintenancePlan(machine=cls.machines[0], title='Seal check', next_due_date=today),
+            MaintenancePlan(machine=cls.machines[0], title='Oil change', next_due_date=today + timedelta(days=3)),
+            MaintenancePlan(machine=cls.machines[1], title='Seal check', next_due_date=today + timedelta(days=30)),
+            MaintenancePlan(machine=cls.machines[3], title='Seal check', next_due_date=today),
+        ])
+
+    def test_trend_counts_done_workorders_by_finished_month(self):
+        reported = timezone.now() - timedelta(days=95)
+        with synthetic._keep_reported_at():
+            wo = WorkOrder.objects.create(code='DM-1', wo_type=WorkOrder.TYPE_PM, machine=self.machines[0],
+                                          summary='Seal check', reported_at=reported)
+        wo.status = WorkOrder.STATUS_DONE
+        wo.finished_at = timezone.now()
+        wo.save()
+
+        expected = [0, 0, 0, 0, 0, 1]
+        self.assertEqual(metrics.dashboard_metrics(months=6)['trend'][WorkOrder.TYPE_PM], expected)
+        metrics.rebuild()
+        self.assertEqual(metrics.dashboard_metrics(months=6)['trend'][WorkOrder.TYPE_PM], expected)
+
+    def test_machine_status_slices_do_not_overlap(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dashboard'))
+        # DP-0 มี PM ใกล้ครบกำหนดสองแผนนับเป็นเครื่องเดียว DP-3 หยุดใช้งานอยู่แล้ว
+        self.assertEqual(response.context['chart_data']['machine_status'], [2, 1, 1])
+
+
+class HotQueryPlanTest(TestCase):
+    """
+    ตรวจ query plan ของคิวรีที่ใช้บ่อย ต้องใช้ index ที่ออกแบบไว้ ไม่ตกไปเป็นการอ่านทั้งตาราง
+    ใช้ข้อมูลจำลองที่มีสัดส่วนใกล้ของจริง (synthetic.py) กับค่า planner ปกติหลัง ANALYZE
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(categories=4, locations=3, machines=400, plans_per_machine=5, years=2,
+                           workorders_per_machine_year=24, tasks_per_workorder=0, attachment_ratio=0, users=5)
+        # แผนของโรงงานจริงครบกำหนดกระจายตลอดรอบปี ไม่ได้ค้างพร้อมกันครึ่งหนึ่ง
+        today = date.today()
+        plans = list(MaintenancePlan.objects.only('pk'))
+        for plan in plans:
+            plan.next_due_date = today + timedelta(days=plan.pk % 365 - 5)
+        MaintenancePlan.objects.bulk_update(plans, ['next_due_date'])
+        cls.analyze()
+
+    @staticmethod
+    def analyze():
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # autovacuum ย้าย pending list ของ GIN index เข้า index หลัก แต่ VACUUM รันใน transaction ของเทสต์ไม่ได้
+                cursor.execute("SELECT gin_clean_pending_list(indexrelid) FROM pg_index "
+                               "JOIN pg_class ON pg_class.oid = indexrelid WHERE relname LIKE '%%_trgm'")
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, table, *index_names):
+        plan = queryset.explain()
+        full_scan = rf'Seq Scan on {table}\b' if connection.vendor == 'postgresql' else rf'SCAN {table}\b(?! USING)'
+        self.assertNotRegex(plan, full_scan)
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def test_workorder_list_keyset(self):
+        qs = WorkOrder.objects.select_related('machine', 'plan').order_by('-reported_at', '-id')
+        self.assertUsesIndex(qs[:11], 'maintenance_workorder', 'wo_reported_id_idx')
+        last = qs[500]
+        fields = [(name, True, WorkOrder._meta.get_field(name)) for name in ('reported_at', 'id')]
+        after = qs.filter(KeysetPaginationMixin._after(fields, [last.reported_at, last.pk], forward=True))
+        self.assertUsesIndex(after[:11], 'maintenance_workorder', 'wo_reported_id_idx')
+
+    def test_workorder_status_filter(self):
+        qs = WorkOrder.objects.filter(status=WorkOrder.STATUS_OPEN).order_by('-reported_at')[:10]
+        self.assertUsesIndex(qs, 'maintenance_workorder', 'wo_status_reported_idx', 'wo_open_due_idx')
+
+    def test_workorder_machine_status_filter(self):
+        machine = Machine.objects.first()
+        qs = WorkOrder.objects.filter(machine=machine, status=WorkOrder.STATUS_OPEN)
+        self.assertUsesIndex(qs, 'maintenance_workorder', 'wo_machine_status_idx')
+
+    def test_open_workorders_past_due(self):
+        qs = WorkOrder.objects.filter(
+            status__in=[WorkOrder.STATUS_OPEN, WorkOrder.STATUS_INPROG], due_date__lt=date.today(),
+        )
+        # SQLite ใช้ partial index ไม่ได้กับ status IN (...) จึงใช้ index ของ status แทน (ยังไม่อ่านทั้งตาราง)
+        self.assertUsesIndex(qs, 'maintenance_workorder', 'wo_open_due_idx', 'wo_status_reported_idx')
+
+    def test_plan_list_ordering(self):
+        qs = MaintenancePlan.objects.with_machine().order_by('next_due_date')[:10]
+        self.assertUsesIndex(qs, 'maintenance_maintenanceplan', 'plan_next_due_idx')
+
+    def test_plans_due_within(self):
+        qs = MaintenancePlan.objects.due_within(days=7).filter(machine__is_active=True)
+        self.assertUsesIndex(qs, 'maintenance_maintenanceplan', 'plan_next_due_idx')
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram indexes exist on PostgreSQL only')
+    def test_machine_search(self):
+        # ทะเบียนเครื่องจักร 400 เครื่องเล็กพอที่การอ่านทั้งตารางถูกกว่า ตรวจกับทะเบียนขนาดโรงงานใหญ่
+        category = MachineCategory.objects.first()
+        Machine.objects.bulk_create([
+            Machine(code=f'BIG-{i:05d}', name=f'{category.name} line {i}', category=category, serial_no=f'SB{i:08d}')
+            for i in range(5000)
+        ])
+        self.analyze()
+        qs = search.search(Machine.objects.all(), 'BIG-01234')
+        self.assertUsesIndex(qs, 'maintenance_machine', 'maintenance_machine_code_trgm')
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram indexes exist on PostgreSQL only')
+    def test_workorder_search(self):
+        qs = search.search(WorkOrder.objects.all(), 'W0001234')
+        self.assertUsesIndex(qs, 'maintenance_workorder', 'maintenance_workorder_code_trgm')
+
+
+class SearchTest(TestCase):
+    """
+    ค้นหาเครื่องจักรและ Work Order ผ่าน backend ของฐานข้อมูลที่ใช้อยู่ (pg_trgm หรือ FTS5)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = MachineCategory.objects.create(name='Lathe')
+        cls.lathe = Machine.objects.create(code='LT-100', name='CNC Lathe', category=category, serial_no='SN-778')
+        cls.press = Machine.objects.create(code='PR-200', name='Hydraulic Press', category=category)
+        WorkOrder.objects.create(code='WO-1', machine=cls.lathe, summary='Spindle vibration', notes='bearing noise')
+        WorkOrder.objects.create(code='WO-2', machine=cls.press, summary='Oil leak')
+
+    def test_machine_search_matches_code_name_and_serial(self):
+        self.assertEqual(list(search.search(Machine.objects.all(), 'lathe')), [self.lathe])
+        self.assertEqual(list(search.search(Machine.objects.all(), 'pr-2')), [self.press])
+        self.assertEqual(list(search.search(Machine.objects.all(), 'sn-778')), [self.lathe])
+
+    def test_search_is_kept_current_on_save(self):
+        self.press.name = 'Stamping Press'
+        self.press.save()
+        self.assertEqual(list(search.search(Machine.objects.all(), 'stamping')), [self.press])
+        self.assertEqual(list(search.search(Machine.objects.all(), 'hydraulic')), [])
+
+    def test_workorder_search_covers_notes(self):
+        codes = [wo.code for wo in search.search(WorkOrder.objects.all(), 'bearing')]
+        self.assertEqual(codes, ['WO-1'])
+
+    def test_results_are_ranked(self):
+        Machine.objects.create(code='LT-101', name='Lathe', category=self.lathe.category)
+        ranked = search.search(Machine.objects.all(), 'lathe').order_by('-search_rank', 'code')
+        self.assertEqual(len(ranked), 2)
+        self.assertTrue(all(m.search_rank is not None for m in ranked))
+
+
+class KeysetPaginationTest(TestCase):
+    """
+    เดินหน้า/ถอยหลังด้วย cursor ต้องได้ทุกแถวครบ ไม่ซ้ำ และไม่มี COUNT(*)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tech', password='pass')
+        category = MachineCategory.objects.create(name='Mill')
+        machines = Machine.objects.bulk_create([
+            Machine(code=f'ML-{i:03d}', name=f'Mill {i}', category=category) for i in range(25)
+        ])
+        # วันครบกำหนดซ้ำกันและบางแผนไม่มีวันครบกำหนด เพื่อทดสอบ tie-break และ null
+        MaintenancePlan.objects.bulk_create([
+            MaintenancePlan(machine=m, title=f'PM {i}', next_due_date=None if i % 7 == 0 else date.today() + timedelta(days=i % 4))
+            for i, m in enumerate(machines)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk(self, url):
+        pages, cursor = [], None
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+            page = response.context['page_obj']
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_plan_list_walks_all_rows_in_order(self):
+        pages = self.walk(reverse('plan_list'))
+        seen = [p.pk for page in pages for p in page]
+        expected = list(
+            MaintenancePlan.objects.order_by(F('next_due_date').asc(nulls_last=True), 'id').values_list('pk', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+
+    def test_previous_cursor_returns_previous_page(self):
+        pages = self.walk(reverse('plan_list'))
+        response = self.client.get(reverse('plan_list'), {'cursor': pages[-1].previous_cursor})
+        self.assertEqual([p.pk for p in response.context['page_obj']], [p.pk for p in pages[-2]])
+
+    def test_machine_list_walks_by_code(self):
+        pages = self.walk(reverse('machine_list'))
+        codes = [m.code for page in pages for m in page]
+        self.assertEqual(codes, sorted(codes))
+        self.assertEqual(len(codes), 25)
+
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.client.get(reverse('machine_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'][0].code, 'ML-000')
+
+    def test_tampered_cursor_shows_first_page(self):
+        def cursor(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+        for url, payload in [
+            (reverse('plan_list'), {'d': 'n', 'k': ['notadate', '1']}),
+            (reverse('workorder_list'), {'d': 'n', 'k': ['notadate', '1']}),
+            (reverse('workorder_list'), {'d': 'n', 'k': 5}),
+            (reverse('machine_list'), {'d': 'n', 'k': 5}),
+            (reverse('machine_list'), {'d': 'x', 'k': ['ML-010', '1']}),
+        ]:
+            with self.subTest(url=url, payload=payload):
+                response = self.client.get(url, {'cursor': cursor(payload)})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context['page_obj'].has_previous())
+
+
+class PMSchedulerTest(TestCase):
+    """
+    scheduler ต้องสร้าง PM Work Order + checklist เป็นชุด และรันซ้ำแล้วไม่สร้างซ้ำ
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = MachineCategory.objects.create(name='Compressor')
+        machines = Machine.objects.bulk_create([
+            Machine(code=f'CP-{i:02d}', name=f'Compressor {i}', category=category, is_active=i != 4)
+            for i in range(5)
+        ])
+        today = date.today()
+        MaintenancePlan.objects.bulk_create([
+            MaintenancePlan(machine=m, title='Weekly check', description='- Drain tank\n- Check belt\n',
+                            frequency_value=1, frequency_unit=MaintenancePlan.UNIT_WEEKS,
+                            next_due_date=today - timedelta(days=15) if i == 0 else today)
+            for i, m in enumerate(machines)
+        ])
+        # แผนที่ยังไม่ถึงกำหนด
+        MaintenancePlan.objects.create(machine=machines[0], title='Later', next_due_date=today + timedelta(days=10))
+
+    def test_schedules_due_plans_in_batches(self):
+        result = scheduler.schedule_due_plans(batch_size=2)
+        self.assertEqual(result['workorders'], 4)  # เครื่องที่ไม่ใช้งาน (CP-04) ไม่ถูกสร้าง
+        self.assertEqual(result['batches'], 2)
+        self.assertEqual(WorkOrderTask.objects.count(), 8)
+        self.assertEqual(
+            set(WorkOrderTask.objects.values_list('title', flat=True)), {'Drain tank', 'Check belt'},
+        )
+        self.assertFalse(scheduler.due_plans(date.today()).exists())
+        overdue = MaintenancePlan.objects.get(machine__code='CP-00', title='Weekly check')
+        self.assertGreater(overdue.next_due_date, date.today())
+        self.assertEqual(metrics.dashboard_metrics()['by_type'][WorkOrder.TYPE_PM], 4)
+
+    def test_rerun_is_idempotent(self):
+        scheduler.schedule_due_plans()
+        MaintenancePlan.objects.filter(title='Weekly check').update(next_due_date=date.today())
+        scheduler.schedule_due_plans()
+        self.assertEqual(WorkOrder.objects.count(), 5)  # เฉพาะ CP-00 ที่วันครบกำหนดเปลี่ยนจริง
+        self.assertEqual(
+            WorkOrder.objects.values('plan_id', 'due_date').distinct().count(), WorkOrder.objects.count(),
+        )
+
+
+class ForecastTest(TestCase):
+    """
+    วันครบกำหนดแบบเดือนต้องเป็นเดือนตามปฏิทิน และปฏิทิน PM ต้องตรงกับการคำนวณทีละแผน
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = MachineCategory.objects.create(name='Boiler')
+        cls.machine = Machine.objects.create(code='BL-01', name='Boiler', category=category)
+        cls.idle = Machine.objects.create(code='BL-02', name='Old boiler', category=category, is_active=False)
+
+    def test_add_months_clamps_to_month_end(self):
+        self.assertEqual(add_months(date(2024, 1, 31), 1), date(2024, 2, 29))
+        self.assertEqual(add_months(date(2025, 1, 31), 1), date(2025, 2, 28))
+        self.assertEqual(add_months(date(2025, 11, 15), 3), date(2026, 2, 15))
+        plan = MaintenancePlan(frequency_value=1, frequency_unit=MaintenancePlan.UNIT_MONTHS)
+        self.assertEqual(plan.compute_next_due(from_date=date(2025, 3, 31)), date(2025, 4, 30))
+
+    def test_calendar_matches_per_plan_computation(self):
+        today = date.today()
+        specs = [
+            (MaintenancePlan.UNIT_DAYS, 10, today),
+            (MaintenancePlan.UNIT_WEEKS, 2, today - timedelta(days=20)),
+            (MaintenancePlan.UNIT_MONTHS, 1, today.replace(day=1) - timedelta(days=1)),  # สิ้นเดือน
+            (MaintenancePlan.UNIT_MONTHS, 5, today + timedelta(days=40)),
+        ]
+        for unit, value, start in specs:
+            MaintenancePlan.objects.create(machine=self.machine, title=f'{value} {unit}',
+                                           frequency_unit=unit, frequency_value=value, next_due_date=start)
+        MaintenancePlan.objects.create(machine=self.idle, title='idle', next_due_date=today)
+
+        forecast.rebuild(months=12)
+        until = forecast.horizon_end(12)
+        for plan in MaintenancePlan.objects.filter(machine=self.machine):
+            expected, n = [], 0
+            due = plan.next_due_date
+            while due <= until:
+                expected.append(due)
+                n += 1
+                due = forecast.occurrence_date(plan.next_due_date, plan.frequency_unit, plan.frequency_value, n)
+            actual = list(plan.calendar_entries.order_by('occurrence').values_list('due_date', flat=True))
+            self.assertEqual(actual, expected, plan.title)
+        self.assertFalse(PMCalendarEntry.objects.filter(machine=self.idle).exists())
+
+    def test_saving_plan_refreshes_its_calendar(self):
+        plan = MaintenancePlan.objects.create(machine=self.machine, title='Weekly', frequency_value=1,
+                                              frequency_unit=MaintenancePlan.UNIT_WEEKS, next_due_date=date.today())
+        before = plan.calendar_entries.count()
+        plan.frequency_unit = MaintenancePlan.UNIT_MONTHS
+        plan.save()
+        self.assertLess(plan.calendar_entries.count(), before)
+        periods, rows = forecast.monthly_workload()
+        self.assertEqual(sum(sum(counts) for _, counts in rows), plan.calendar_entries.filter(
+            due_date__gte=periods[0], due_date__lt=add_months(periods[-1], 1)).count())
+
+
+class ExportTest(TestCase):
+    """
+    ส่งออก CSV / XLSX แบบ streaming ต้องใช้ตัวกรองเดียวกับหน้ารายการ
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('auditor', password='pass')
+        category = MachineCategory.objects.create(name='Pump')
+        pump = Machine.objects.create(code='PU-1', name='Water Pump', category=category)
+        fan = Machine.objects.create(code='FA-1', name='Cooling Fan', category=category)
+        wo = WorkOrder.objects.create(code='WO-10', machine=pump, summary='Seal leak', assigned_to=cls.user)
+        WorkOrderTask.objects.create(workorder=wo, title='Drain', is_done=True)
+        WorkOrderTask.objects.create(workorder=wo, title='Replace seal')
+        WorkOrder.objects.create(code='WO-11', machine=fan, summary='Blade noise')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def rows(self, response):
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_workorder_csv_includes_task_ratio_and_respects_search(self):
+        rows = self.rows(self.client.get(reverse('workorder_export'), {'q': 'seal'}))
+        header, data = rows[0], rows[1:]
+        self.assertEqual(len(data), 1)
+        row = dict(zip(header, data[0]))
+        self.assertEqual(row['code'], 'WO-10')
+        self.assertEqual(row['machine_code'], 'PU-1')
+        self.assertEqual(row['assigned_to'], 'auditor')
+        self.assertEqual((row['tasks_done'], row['tasks_total'], row['task_ratio']), ('1', '2', '0.5'))
+
+    def test_machine_and_plan_csv(self):
+        MaintenancePlan.objects.create(machine=Machine.objects.get(code='PU-1'), title='Lubricate')
+        machines = self.rows(self.client.get(reverse('machine_export')))
+        self.assertEqual([r[0] for r in machines[1:]], ['FA-1', 'PU-1'])
+        plans = self.rows(self.client.get(reverse('plan_export')))
+        self.assertEqual(plans[1][plans[0].index('title')], 'Lubricate')
+
+    def test_xlsx_is_a_valid_workbook(self):
+        response = self.client.get(reverse('workorder_export'), {'format': 'xlsx'})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('Seal leak', sheet)
+
+    def test_formula_like_text_is_exported_as_text(self):
+        WorkOrder.objects.filter(code='WO-11').update(summary='=HYPERLINK("http://evil","x")')
+        Machine.objects.filter(code='FA-1').update(name='@SUM(1+1)')
+        rows = self.rows(self.client.get(reverse('workorder_export')))
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual((row['summary'], row['machine_name']), ('\'=HYPERLINK("http://evil","x")', "'@SUM(1+1)"))
+        self.assertEqual(row['tasks_total'], '0')
+
+        response = self.client.get(reverse('workorder_export'), {'format': 'xlsx'})
+        sheet = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))).read('xl/worksheets/sheet1.xml')
+        self.assertIn(b'<c t="inlineStr"><is><t xml:space="preserve">=HYPERLINK(', sheet)
+        self.assertNotIn(b'<f>', sheet)
+
+    async def test_asgi_streams_with_async_iterator(self):
+        # iterator แบบ sync ภายใต้ ASGI จะถูกอ่านทั้งหมดก่อนส่ง
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get(reverse('workorder_export'))
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8-sig')
+        self.assertEqual([row[0] for row in csv.reader(io.StringIO(content))][1:], ['WO-11', 'WO-10'])
+
+
+class ImportTest(TestCase):
+    """
+    นำเข้า CSV เป็นชุด: ตรวจสอบด้วยกฎของฟอร์ม upsert เครื่องจักรตามรหัส และรายงานข้อผิดพลาดรายแถว
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = MachineCategory.objects.create(name='Press')
+        Machine.objects.create(code='PR-1', name='Old name', category=cls.category)
+
+    def run_import(self, kind, text, **kwargs):
+        return importer.import_csv(kind, io.StringIO(text), **kwargs)
+
+    def test_machines_upsert_and_report_errors(self):
+        result = self.run_import('machines', (
+            'code,name,category,location,purchase_date\n'
+            'PR-1,Hydraulic Press,Press,Line 1,\n'
+            'PR-2,Stamping Press,Press,Line 1,2024-02-30\n'
+            'CV-1,Conveyor,Conveyor,,\n'
+            'CV-1,Conveyor again,Conveyor,,\n'
+            ',No code,Press,,\n'
+        ), batch_size=2)
+        self.assertEqual((result['rows'], result['created'], result['updated']), (5, 1, 1))
+        self.assertEqual([(line, field) for line, field, _ in result['errors']],
+                         [(3, 'purchase_date'), (5, 'code'), (6, 'code')])
+        self.assertEqual(Machine.objects.get(code='PR-1').name, 'Hydraulic Press')
+        self.assertEqual(Machine.objects.get(code='PR-1').location.name, 'Line 1')
+        self.assertTrue(Machine.objects.get(code='CV-1').is_active)
+        self.assertEqual(Location.objects.filter(name='Line 1').count(), 1)
+
+    def test_new_names_saved_only_for_valid_rows(self):
+        result = self.run_import('machines', (
+            'code,name,category,location,purchase_date\n'
+            'BL-1,Boiler,Boiler,Boiler room,\n'
+            'BL-2,Boiler 2,Boiler,Boiler room,\n'
+            'XX-1,Typo row,Presss,Line 9,2024-02-30\n'
+        ))
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([(line, field) for line, field, _ in result['errors']], [(4, 'purchase_date')])
+        self.assertEqual(MachineCategory.objects.filter(name='Boiler').count(), 1)
+        self.assertEqual(Machine.objects.get(code='BL-2').location.name, 'Boiler room')
+        self.assertFalse(MachineCategory.objects.filter(name='Presss').exists())
+        self.assertFalse(Location.objects.filter(name='Line 9').exists())
+
+    def test_plans_and_workorders_resolve_machines_by_code(self):
+        result = self.run_import('plans', (
+            'machine,title,frequency_value,frequency_unit,last_done_date\n'
+            'PR-1,Lubricate,1,MONTHS,2025-01-31\n'
+            'XX-9,Unknown machine,1,MONTHS,\n'
+        ))
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(result['errors'][0][:2], (3, 'machine'))
+        self.assertEqual(MaintenancePlan.objects.get(title='Lubricate').next_due_date, date(2025, 2, 28))
+
+        result = self.run_import('workorders', 'code,machine,summary,status\nWO-9,PR-1,Noise,DONE\n')
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(WorkOrder.objects.get(code='WO-9').wo_type, WorkOrder.TYPE_PM)
+        self.assertEqual(metrics.dashboard_metrics()['by_status'][WorkOrder.STATUS_DONE], 1)
+        result = self.run_import('workorders', 'code,machine,summary\nWO-9,PR-1,Again\n')
+        self.assertEqual((result['created'], len(result['errors'])), (0, 1))
+
+    def test_workorder_codes_checked_against_archive_in_bulk(self):
+        WorkOrder.objects.create(code='OLD-1', machine=Machine.objects.get(code='PR-1'), summary='Old',
+                                 status=WorkOrder.STATUS_DONE, finished_at=timezone.now() - timedelta(days=400))
+        WorkOrder.objects.filter(code='OLD-1').update(reported_at=timezone.now() - timedelta(days=400))
+        archive.archive(after_days=365)
+        text = 'code,machine,summary\nOLD-1,PR-1,Reuse\n' + ''.join(f'NEW-{i},PR-1,New\n' for i in range(5))
+        with CaptureQueriesContext(connection) as ctx:
+            result = self.run_import('workorders', text)
+        self.assertEqual((result['created'], result['errors'][0][:2]), (5, (2, 'code')))
+        self.assertFalse(any('maintenance_archivedworkorder' in q['sql'] for q in ctx.captured_queries))
+
+    def test_upload_view(self):
+        user = get_user_model().objects.create_user('importer', password='pass')
+        self.client.force_login(user)
+        upload = io.BytesIO('code,name,category\nMX-1,Mixer,Press\n'.encode('utf-8-sig'))
+        upload.name = 'machines.csv'
+        response = self.client.post(reverse('import'), {'kind': 'machines', 'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result']['created'], 1)
+        self.assertTrue(Machine.objects.filter(code='MX-1').exists())
+
+
+class ThumbnailTest(TestCase):
+    """
+    รูปย่อถูกสร้างหลัง commit ทุกขนาดทั้ง WebP/JPEG หมุนตาม EXIF และไม่มี EXIF ติดไป
+    """
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media, MAINTENANCE_THUMBNAIL_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.category = MachineCategory.objects.create(name='Robot')
+
+    def photo(self):
+        # รูปแนวนอน 2000x1000 ที่มี EXIF orientation=6 (ต้องหมุนเป็นแนวตั้ง) และข้อมูลกล้อง
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'PhoneMaker'
+        buffer = io.BytesIO()
+        Image.new('RGB', (2000, 1000), 'red').save(buffer, 'JPEG', exif=exif)
+        return ContentFile(buffer.getvalue(), name='robot.jpg')
+
+    def test_machine_image_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            machine = Machine.objects.create(code='RB-1', name='Robot arm', category=self.category, image=self.photo())
+        for size, edge in thumbnails.SIZES.items():
+            for ext in thumbnails.FORMATS:
+                name = thumbnails.derivative_name(machine.image.name, size, ext)
+                with default_storage.open(name) as fh, Image.open(fh) as image:
+                    self.assertEqual(image.size, (edge // 2, edge))
+                    self.assertFalse(image.getexif())
+
+    def test_picture_tag_falls_back_to_original(self):
+        machine = Machine(code='RB-2', name='Robot', category=self.category)
+        machine.image.save('robot.jpg', self.photo(), save=False)
+        template = Template("{% load thumbnails %}{% picture image 'sm' %}")
+        html = template.render(Context({'image': machine.image}))
+        self.assertIn(machine.image.url, html)
+        self.assertNotIn('<picture>', html)
+        thumbnails.generate(machine.image.name)
+        html = template.render(Context({'image': machine.image}))
+        self.assertIn('<picture>', html)
+        self.assertIn('.sm.webp', html)
+
+
+class StaticAssetCheckTest(TestCase):
+    """
+    โหมด production: template ต้องอ้าง static ผ่าน {% static %} และทุกไฟล์ต้องมีใน manifest
+    """
+
+    def setUp(self):
+        self.templates = tempfile.mkdtemp()
+        self.static_root = tempfile.mkdtemp()
+        for path in (self.templates, self.static_root):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+
+    def run_check(self, template, manifest=None, production=True):
+        with open(f'{self.templates}/page.html', 'w') as fh:
+            fh.write(template)
+        if manifest is not None:
+            with open(f'{self.static_root}/staticfiles.json', 'w') as fh:
+                json.dump({'paths': manifest, 'version': '1.1'}, fh)
+        with override_settings(
+            MAINTENANCE_STATIC_PRODUCTION=production,
+            STATIC_ROOT=self.static_root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+            },
+            TEMPLATES=[{'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                        'DIRS': [self.templates], 'APP_DIRS': False}],
+        ):
+            return [error.id for error in checks.check_static_references()]
+
+    def test_hashed_references_pass(self):
+        page = "{% load static %}<link href=\"{% static 'maintenance/css/styles.css' %}\">"
+        manifest = {'maintenance/css/styles.css': 'maintenance/css/styles.0123456789ab.css'}
+        self.assertEqual(self.run_check(page, manifest), [])
+        self.assertEqual(self.run_check(page, {}), ['maintenance.E002'])
+        self.assertEqual(self.run_check(page, {'other.css': 'other.0123456789ab.css'}), ['maintenance.E002'])
+
+    def test_unhashed_references_fail(self):
+        page = '<script src="/static/maintenance/js/live.js"></script><img src="{{ STATIC_URL }}logo.png">'
+        self.assertEqual(self.run_check(page, {}), ['maintenance.E001', 'maintenance.E001'])
+        self.assertEqual(self.run_check(page, production=False), [])
+
+
+class ProtectedMediaTest(TestCase):
+    """
+    /media/ ต้องล็อกอินและมีสิทธิ์ในไฟล์ รองรับ X-Accel-Redirect, 304 และ Range
+    """
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media, MAINTENANCE_THUMBNAIL_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        User = get_user_model()
+        self.tech = User.objects.create_user('tech', password='pass')
+        self.other = User.objects.create_user('other', password='pass')
+        category = MachineCategory.objects.create(name='Boiler')
+        self.machine = Machine.objects.create(code='BL-1', name='Boiler', category=category)
+        wo = WorkOrder.objects.create(code='WO-1', machine=self.machine, summary='Leak', assigned_to=self.tech)
+        self.attachment = Attachment(workorder=wo)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.attachment.file.save('leak.png', ContentFile(self.png()), save=True)
+        self.url = self.attachment.file.url
+
+    @staticmethod
+    def png():
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), 'blue').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_requires_login_and_ownership(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.tech)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.png())
+        thumb = thumbnails.url_for(self.attachment.file, 'sm')
+        self.assertTrue(thumb.endswith('.sm.webp'))
+        self.assertEqual(self.client.get(thumb).status_code, 200)
+        self.assertEqual(self.client.get('/media/unreferenced.png').status_code, 404)
+
+    def test_same_stem_different_extension_keeps_own_thumbnails(self):
+        wo = WorkOrder.objects.create(code='WO-2', machine=self.machine, summary='Crack', assigned_to=self.other)
+        jpeg = io.BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(jpeg, 'JPEG')
+        other = Attachment(workorder=wo)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.file.save(self.attachment.file.name.rsplit('/', 1)[1].replace('.png', '.jpg'),
+                            ContentFile(jpeg.getvalue()), save=True)
+        self.assertNotEqual(thumbnails.url_for(other.file, 'sm'), thumbnails.url_for(self.attachment.file, 'sm'))
+        with default_storage.open(thumbnails.derivative_name(other.file.name, 'sm', 'jpg')) as fh, \
+                Image.open(fh) as image:
+            self.assertGreater(image.getpixel((0, 0))[0], 200)
+        thumb = thumbnails.derivative_name(other.file.name, 'sm', 'webp')
+        self.assertTrue(media.can_access(self.other, thumb))
+        self.assertFalse(media.can_access(self.tech, thumb))
+        self.assertFalse(media.can_access(self.other, thumbnails.derivative_name(self.attachment.file.name, 'sm', 'webp')))
+
+    def test_conditional_and_range_requests(self):
+        self.client.force_login(self.tech)
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{len(self.png())}')
+        self.assertEqual(b''.join(response.streaming_content), self.png()[:10])
+        response = self.client.get(self.url, headers={'Range': 'bytes=-5'})
+        self.assertEqual(b''.join(response.streaming_content), self.png()[-5:])
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=99999-'}).status_code, 416)
+
+    async def test_asgi_streams_file_in_chunks(self):
+        client = AsyncClient()
+        await client.aforce_login(self.tech)
+        response = await client.get(self.url)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.png())
+        response = await client.get(self.url, headers={'Range': 'bytes=2-9'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.png()[2:10])
+
+    def test_hands_transfer_to_nginx(self):
+        self.client.force_login(self.tech)
+        with override_settings(MAINTENANCE_MEDIA_ACCEL_PREFIX='/protected-media/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.attachment.file.name)
+        self.assertEqual(response.content, b'')
+
+    def test_accel_prefix_is_not_taken_from_request_headers(self):
+        self.client.force_login(self.tech)
+        with override_settings(MAINTENANCE_MEDIA_ACCEL_PREFIX=''):
+            response = self.client.get(self.url, headers={'X-Accel-Media-Prefix': '/internal/'})
+        self.assertFalse(response.has_header('X-Accel-Redirect'))
+        self.assertEqual(b''.join(response.streaming_content), self.png())
+
+
+@override_settings(MAINTENANCE_EVENT_BROKER='maintenance.events.InProcessBroker')
+class LiveEventsTest(TestCase):
+    """
+    การบันทึก Work Order / งานย่อย ส่งเหตุการณ์หลัง commit และ SSE ส่งต่อให้ผู้ฟังที่เชื่อมต่ออยู่
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tech', password='pass')
+        category = MachineCategory.objects.create(name='Crane')
+        cls.wo = WorkOrder.objects.create(
+            code='WO-1', machine=Machine.objects.create(code='CR-1', name='Crane', category=category), summary='Hook')
+
+    def test_signals_publish_after_commit(self):
+        published = []
+        with mock.patch.object(events.get_broker(), 'publish', published.append), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.wo.status = WorkOrder.STATUS_INPROG
+            self.wo.assigned_to = self.user
+            self.wo.save()
+            WorkOrderTask.objects.create(workorder=self.wo, title='Inspect', is_done=True)
+        self.assertEqual(
+            [(e['type'], e.get('status'), e.get('assigned_to'), e.get('task_done')) for e in published],
+            [('workorder', 'IN_PROGRESS', 'tech', None), ('task', None, None, 1)],
+        )
+
+    def test_workorder_save_does_not_load_assignee(self):
+        WorkOrder.objects.filter(pk=self.wo.pk).update(assigned_to=self.user)
+        wo = WorkOrder.objects.get(pk=self.wo.pk)
+        published = []
+        with mock.patch.object(events.get_broker(), 'publish', published.append), \
+                CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks() as callbacks:
+                wo.status = WorkOrder.STATUS_DONE
+                wo.save()
+            saved = len(ctx)
+            for callback in callbacks:
+                callback()
+        user_table = get_user_model()._meta.db_table
+        self.assertFalse(any(user_table in q['sql'] for q in ctx.captured_queries[:saved]))
+        event = next(e for e in published if e['type'] == 'workorder')
+        self.assertEqual((event['assigned_to_id'], event['assigned_to']), (self.user.pk, 'tech'))
+
+    def test_deleting_workorder_with_tasks_publishes_no_task_progress(self):
+        WorkOrderTask.objects.create(workorder=self.wo, title='Inspect')
+        published = []
+        with mock.patch.object(events.get_broker(), 'publish', published.append), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.wo.delete()
+        self.assertEqual([e['type'] for e in published], [])
+        self.assertIsNone(checklist.progress(self.wo.pk))
+
+    async def test_event_stream(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get(reverse('workorder_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        events.publish('workorder', id=self.wo.pk, code='WO-1', status='DONE')
+        chunk = await anext(stream)
+        self.assertTrue(chunk.startswith(b'event: workorder\ndata: '))
+        self.assertIn(b'"status": "DONE"', chunk)
+        await stream.aclose()
+
+    def test_wsgi_falls_back_to_reconnect(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('workorder_events'))
+        self.assertEqual(response.content, b'retry: 30000\n\n')
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('workorder_events')).status_code, 401)
+
+    async def test_dashboard_is_async(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get(reverse('dashboard'))).status_code, 302)
+        await client.aforce_login(self.user)
+        response = await client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'live-feed')
+
+    async def test_list_pages_and_middleware_are_async(self):
+        # middleware แบบ sync อย่างเดียวตัวเดียวทำให้ทุก request ภายใต้ ASGI ถูกย้ายไปทำงานใน thread
+        for path in settings.MIDDLEWARE:
+            with self.subTest(middleware=path):
+                self.assertTrue(getattr(import_string(path), 'async_capable', False))
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        for name in ('workorder_list', 'machine_list', 'plan_list'):
+            with self.subTest(view=name):
+                self.assertTrue(resolve(reverse(name)).func.view_class.view_is_async)
+                self.assertEqual((await client.get(reverse(name))).status_code, 200)
+        response = await client.get(reverse('workorder_export'), {'format': 'csv'})
+        self.assertIn(b'code,type,', b''.join([chunk async for chunk in response.streaming_content]))
+
+    async def test_static_files_served_asynchronously(self):
+        response = await AsyncClient().get(settings.STATIC_URL + 'maintenance/css/bootstrap-grid.min.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertTrue(b''.join([chunk async for chunk in response.streaming_content]))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CachingTest(TestCase):
+    """
+    หน้าแดชบอร์ด/รายการ/รายละเอียดเครื่องจักรถูก cache และถูกล้างทันทีเมื่อข้อมูลเปลี่ยน
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('viewer', password='pass')
+        category = MachineCategory.objects.create(name='Lathe')
+        cls.machine = Machine.objects.create(code='LT-1', name='Lathe', category=category)
+        cls.plan = MaintenancePlan.objects.create(machine=cls.machine, title='Oil change',
+                                                  next_due_date=date.today() + timedelta(days=2))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertCachedThenInvalidated(self, url, change, before, after):
+        self.assertContains(self.client.get(url), before)
+        self.assertContains(self.client.get(url), before)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(url)
+        self.assertContains(response, after)
+        self.assertNotContains(response, before)
+
+    def rename_plan(self):
+        self.plan.title = 'Belt check'
+        self.plan.save()
+
+    def test_plan_list_page_is_cached(self):
+        url = reverse('plan_list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertFalse(any('maintenance_maintenanceplan' in q['sql'] for q in ctx.captured_queries))
+        self.assertCachedThenInvalidated(url, self.rename_plan, 'Oil change', 'Belt check')
+
+    def test_dashboard_and_machine_detail_invalidate_on_save(self):
+        self.assertCachedThenInvalidated(reverse('dashboard'), self.rename_plan, 'Oil change', 'Belt check')
+        self.plan.title = 'Oil change'
+        self.plan.save()
+        url = reverse('machine_detail', args=[self.machine.pk])
+        self.assertCachedThenInvalidated(url, self.rename_plan, 'Oil change', 'Belt check')
+
+    def test_delete_invalidates_machine_list(self):
+        other = Machine.objects.create(code='LT-2', name='Second lathe', category=self.machine.category)
+        url = reverse('machine_list')
+        self.assertContains(self.client.get(url), 'LT-2')
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertNotContains(self.client.get(url), 'LT-2')
+
+    def test_versions_survive_eviction(self):
+        token = caching.version_token('machine')
+        cache.clear()
+        self.assertNotEqual(caching.version_token('machine'), token)
+
+
+class WorkOrderFormRenderingTest(TestCase):
+    """
+    ฟอร์ม Work Order render ด้วยจำนวน query คงที่ และค้นหาตัวเลือกผ่าน autocomplete
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('planner', password='pass')
+        category = MachineCategory.objects.create(name='Oven')
+        machines = Machine.objects.bulk_create([
+            Machine(code=f'OV-{i:03d}', name=f'Oven {i}', category=category) for i in range(30)
+        ])
+        MaintenancePlan.objects.bulk_create([
+            MaintenancePlan(machine=m, title=f'Clean {j}', next_due_date=date.today()) for m in machines for j in range(3)
+        ])
+        cls.machine = machines[0]
+        cls.plan = MaintenancePlan.objects.filter(machine=cls.machine).first()
+        cls.wo = WorkOrder.objects.create(code='WO-1', machine=cls.machine, plan=cls.plan, summary='Heat',
+                                          assigned_to=cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_forms_render_only_selected_choices(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('workorder_create'))
+        create_queries = len(ctx.captured_queries)
+        self.assertNotContains(response, 'OV-001')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('workorder_edit', args=[self.wo.pk]))
+        # หน้าแก้ไขเพิ่มเพียง query ของใบงาน งานย่อย ประวัติ และค่าที่เลือกของแต่ละช่อง
+        self.assertLessEqual(len(ctx.captured_queries), create_queries + 6)
+        self.assertContains(response, f'<option value="{self.plan.pk}" selected>OV-000 - Clean 0</option>', html=True)
+        self.assertNotContains(response, 'OV-001')
+        self.assertContains(response, 'data-autocomplete-url="/autocomplete/plan/"')
+
+    def test_autocomplete(self):
+        results = self.client.get(reverse('autocomplete', args=['machine']), {'q': 'ov-02'}).json()['results']
+        self.assertEqual(results[0]['text'], 'OV-020 - Oven 20')
+        results = self.client.get(reverse('autocomplete', args=['plan']), {'machine': self.machine.pk}).json()['results']
+        self.assertEqual([r['text'] for r in results], ['OV-000 - Clean 0', 'OV-000 - Clean 1', 'OV-000 - Clean 2'])
+        results = self.client.get(reverse('autocomplete', args=['user']), {'q': 'plan'}).json()['results']
+        self.assertEqual(results, [{'id': self.user.pk, 'text': 'planner'}])
+        self.assertEqual(self.client.get('/autocomplete/nothing/').status_code, 404)
+
+    def test_submit_with_assignee(self):
+        response = self.client.post(reverse('workorder_create'), {
+            'code': 'WO-2', 'wo_type': 'CM', 'priority': 'HIGH', 'status': 'OPEN',
+            'machine': self.machine.pk, 'plan': '', 'assigned_to': self.user.pk, 'summary': 'Door',
+            'tasks-TOTAL_FORMS': 0, 'tasks-INITIAL_FORMS': 0,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(WorkOrder.objects.get(code='WO-2').assigned_to, self.user)
+
+    def test_malformed_choices_rerender_with_field_errors(self):
+        response = self.client.post(reverse('workorder_create'), {
+            'code': 'WO-3', 'wo_type': 'CM', 'priority': 'HIGH', 'status': 'OPEN',
+            'machine': 'abc', 'plan': 'zz', 'assigned_to': 'q', 'summary': 'Door',
+            'tasks-TOTAL_FORMS': 0, 'tasks-INITIAL_FORMS': 0,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.context['form'].errors), {'machine', 'plan', 'assigned_to'})
+
+
+class ChecklistTest(TestCase):
+    """
+    งานย่อยของใบงานบันทึกเป็นชุด: จำนวน query คงที่ไม่ว่า checklist จะยาวเท่าไร
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('tech', password='pass')
+        category = MachineCategory.objects.create(name='Press')
+        machine = Machine.objects.create(code='PR-1', name='Press', category=category)
+        cls.wo = WorkOrder.objects.create(code='WO-1', machine=machine, summary='PM')
+        cls.tasks = WorkOrderTask.objects.bulk_create([
+            WorkOrderTask(workorder=cls.wo, title=f'Step {i}') for i in range(60)
+        ])
+        counters.refresh_tasks(WorkOrder.objects.filter(pk=cls.wo.pk))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post_json(self, name, payload):
+        return self.client.post(reverse(name, args=[self.wo.pk]), payload, content_type='application/json')
+
+    def test_formset_saves_in_bulk(self):
+        data = {
+            'code': 'WO-1', 'wo_type': 'PM', 'priority': 'MED', 'status': 'OPEN',
+            'machine': self.wo.machine_id, 'summary': 'PM',
+            'tasks-TOTAL_FORMS': 61, 'tasks-INITIAL_FORMS': 60,
+            'tasks-60-title': 'Sign off',
+        }
+        for i, task in enumerate(self.tasks):
+            data.update({f'tasks-{i}-id': task.pk, f'tasks-{i}-workorder': self.wo.pk, f'tasks-{i}-title': task.title})
+            if i % 2 == 0:
+                data[f'tasks-{i}-is_done'] = 'on'
+            if i >= 50:
+                data[f'tasks-{i}-DELETE'] = 'on'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('workorder_edit', args=[self.wo.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        writes = [q['sql'] for q in ctx.captured_queries
+                  if q['sql'].startswith(('INSERT INTO "maintenance_workordertask"', 'UPDATE "maintenance_workordertask"',
+                                          'DELETE FROM "maintenance_workordertask"'))]
+        self.assertEqual(len(writes), 3)
+        self.assertEqual(checklist.progress(self.wo.pk), {'task_total': 51, 'task_done': 25, 'ratio': 0.4902})
+
+    def test_json_changes(self):
+        response = self.post_json('workorder_tasks', {
+            'create': [{'title': 'Grease', 'is_done': True}],
+            'update': [{'id': self.tasks[0].pk, 'title': 'Step zero', 'is_done': True}],
+            'delete': [task.pk for task in self.tasks[1:30]],
+        })
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body['created']), 1)
+        self.assertEqual(body['progress'], {'task_total': 32, 'task_done': 2, 'ratio': 0.0625})
+        tasks = self.client.get(reverse('workorder_tasks', args=[self.wo.pk])).json()['tasks']
+        self.assertEqual(tasks[0], {'id': self.tasks[0].pk, 'title': 'Step zero', 'is_done': True})
+
+        other = WorkOrder.objects.create(code='WO-2', machine=self.wo.machine, summary='Other')
+        foreign = WorkOrderTask.objects.create(workorder=other, title='Not mine')
+        response = self.post_json('workorder_tasks', {'update': [{'id': foreign.pk, 'is_done': True}],
+                                                      'create': [{'title': ''}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'update.0', 'create.0'})
+        self.assertFalse(WorkOrderTask.objects.get(pk=foreign.pk).is_done)
+
+    def test_toggle(self):
+        ids = [task.pk for task in self.tasks[:45]]
+        published = []
+        with mock.patch.object(events.get_broker(), 'publish', published.append), \
+                self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as ctx:
+            response = self.post_json('workorder_tasks_toggle', {'ids': ids, 'is_done': True})
+        self.assertEqual(response.json(), {'changed': 45, 'progress': {'task_total': 60, 'task_done': 45, 'ratio': 0.75}})
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "maintenance_workordertask"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual([(e['type'], e['task_done']) for e in published], [('task', 45)])
+        self.assertEqual(self.post_json('workorder_tasks_toggle', {'ids': ids, 'is_done': 'yes'}).status_code, 400)
+
+
+class CounterTest(TestCase):
+    """
+    ตัวนับ denormalized ของเครื่องจักรและใบงานตรงกับข้อมูลจริงทุกเส้นทางการบันทึก
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('lead', password='pass')
+        category = MachineCategory.objects.create(name='Lathe')
+        cls.lathe = Machine.objects.create(code='LA-1', name='Lathe', category=category)
+        cls.mill = Machine.objects.create(code='MI-1', name='Mill', category=category)
+
+    def assertCounts(self, machine, open_count, last):
+        machine.refresh_from_db()
+        self.assertEqual((machine.open_workorder_count, machine.last_maintenance_at), (open_count, last))
+
+    def test_workorder_lifecycle(self):
+        finished = timezone.now()
+        wo = WorkOrder.objects.create(code='WO-1', machine=self.lathe, summary='Chuck')
+        WorkOrder.objects.create(code='WO-2', machine=self.lathe, summary='Belt', status=WorkOrder.STATUS_INPROG)
+        self.assertCounts(self.lathe, 2, None)
+
+        wo.status, wo.finished_at = WorkOrder.STATUS_DONE, finished
+        wo.save()
+        self.assertCounts(self.lathe, 1, finished)
+
+        # ย้ายเครื่องและเปิดงานใหม่: ตัวนับของทั้งสองเครื่องถูกปรับ
+        wo.machine, wo.status = self.mill, WorkOrder.STATUS_OPEN
+        wo.save()
+        self.assertCounts(self.lathe, 1, None)
+        self.assertCounts(self.mill, 1, None)
+
+        wo.delete()
+        self.assertCounts(self.mill, 0, None)
+
+    def test_task_counters(self):
+        wo = WorkOrder.objects.create(code='WO-1', machine=self.lathe, summary='Chuck')
+        first = WorkOrderTask.objects.create(workorder=wo, title='Clean')
+        WorkOrderTask.objects.create(workorder=wo, title='Oil', is_done=True)
+        first.is_done = True
+        first.save()
+        checklist.apply(wo, created=[WorkOrderTask(title='Check')], deleted=[first.pk])
+        wo.refresh_from_db()
+        self.assertEqual((wo.task_total, wo.task_done), (2, 1))
+        checklist.toggle(wo, list(wo.tasks.values_list('pk', flat=True)), True)
+        wo.refresh_from_db()
+        self.assertEqual((wo.task_total, wo.task_done), (2, 2))
+
+    def test_rebuild_and_list_sorting(self):
+        WorkOrder.objects.create(code='WO-1', machine=self.mill, summary='Spindle')
+        wo = WorkOrder.objects.create(code='WO-2', machine=self.mill, summary='Coolant')
+        WorkOrderTask.objects.create(workorder=wo, title='Drain')
+        Machine.objects.update(open_workorder_count=0)
+        WorkOrder.objects.update(task_total=0)
+        call_command('rebuild_counters', stdout=io.StringIO())
+        self.assertCounts(self.mill, 2, None)
+        self.assertEqual(WorkOrder.objects.get(pk=wo.pk).task_total, 1)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('machine_list'), {'sort': 'open'})
+        self.assertEqual([m.code for m in response.context['object_list']], ['MI-1', 'LA-1'])
+        response = self.client.get(reverse('machine_list'), {'open': '1'})
+        self.assertEqual([m.code for m in response.context['object_list']], ['MI-1'])
+
+
+class ReliabilityTest(TestCase):
+    """
+    MTTR / MTBF / PM compliance / backlog คำนวณในฐานข้อมูลแล้วอ่านจากตาราง snapshot
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('analyst', password='pass')
+        cls.press = Machine.objects.create(code='PR-1', name='Press', category=MachineCategory.objects.create(name='Press'))
+        cls.oven = Machine.objects.create(code='OV-1', name='Oven', category=MachineCategory.objects.create(name='Oven'))
+        base = timezone.now().replace(day=1, hour=8, minute=0, second=0, microsecond=0) - timedelta(days=90)
+        # เสีย 3 ครั้ง ห่างกัน 10 และ 20 วัน: MTBF = 15 วัน, ซ่อม 2 และ 4 ชั่วโมง: MTTR = 3 ชั่วโมง
+        for i, (offset, hours) in enumerate([(0, 2), (10, 4), (30, None)]):
+            reported = base + timedelta(days=offset)
+            wo = WorkOrder.objects.create(
+                code=f'CM-{i}', wo_type=WorkOrder.TYPE_CM, machine=cls.press, summary='Breakdown',
+                status=WorkOrder.STATUS_DONE if hours else WorkOrder.STATUS_OPEN,
+                started_at=reported + timedelta(hours=1) if hours else None,
+                finished_at=reported + timedelta(hours=1 + hours) if hours else None,
+            )
+            WorkOrder.objects.filter(pk=wo.pk).update(reported_at=reported)
+        due = base.date() + timedelta(days=5)
+        WorkOrder.objects.create(code='PM-1', machine=cls.oven, summary='PM', due_date=due,
+                                 status=WorkOrder.STATUS_DONE, finished_at=base + timedelta(days=4))
+        WorkOrder.objects.create(code='PM-2', machine=cls.oven, summary='PM', due_date=due,
+                                 status=WorkOrder.STATUS_DONE, finished_at=base + timedelta(days=9))
+
+    def test_snapshot_and_report(self):
+        with CaptureQueriesContext(connection) as ctx:
+            reliability.snapshot(months=6)
+        queries = len(ctx.captured_queries)
+        WorkOrder.objects.create(code='CM-9', wo_type=WorkOrder.TYPE_CM, machine=self.oven, summary='Fan')
+        with CaptureQueriesContext(connection) as ctx:
+            reliability.snapshot(months=6)
+        # จำนวน query ไม่ขึ้นกับจำนวนใบงาน
+        self.assertEqual(len(ctx.captured_queries), queries)
+
+        rows = {row['label']: row for row in reliability.report('machine', months=6)['rows']}
+        press, oven = rows['PR-1'], rows['OV-1']
+        self.assertEqual((press['failures'], press['mtbf_hours'], press['mttr_hours']), (3, 360.0, 3.0))
+        self.assertEqual((press['backlog'], oven['backlog']), (1, 1))
+        self.assertEqual((oven['pm_due'], oven['pm_compliance']), (2, 50.0))
+        total = reliability.report('all', months=6)['rows'][0]
+        self.assertEqual((total['failures'], total['backlog'], total['pm_compliance']), (4, 2, 50.0))
+        category = reliability.report('category', months=6)['rows']
+        self.assertEqual([row['label'] for row in category], ['Oven', 'Press'])
+
+    def test_view_and_api(self):
+        reliability.snapshot(months=6)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('reliability'), {'group': 'category'})
+        self.assertContains(response, '360.0')
+        data = self.client.get(reverse('reliability_api'), {'group': 'all', 'months': 6}).json()
+        self.assertEqual(data['rows'][0]['mttr_hours'], 3.0)
+        self.assertEqual(data['trend'][-1]['period'], data['end'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ApiTest(TestCase):
+    """
+    JSON API: เลือกฟิลด์ได้ รายการลูกอ่านด้วย query เดียว และตอบ 304 จากเลขเวอร์ชันโดยไม่ query ตารางข้อมูล
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('mes', password='pass')
+        category = MachineCategory.objects.create(name='Mill')
+        cls.machines = [Machine.objects.create(code=f'ML-{i}', name=f'Mill {i}', category=category) for i in range(3)]
+        for i in range(3):
+            wo = WorkOrder.objects.create(code=f'WO-{i}', machine=cls.machines[0], summary='Check', assigned_to=cls.user)
+            WorkOrderTask.objects.create(workorder=wo, title='Inspect', is_done=bool(i))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_sparse_fields_and_pagination(self):
+        url = reverse('api_list', args=['machines'])
+        data = self.client.get(url, {'fields': 'code,open_workorders', 'limit': 2}).json()
+        self.assertEqual(data['results'], [
+            {'id': self.machines[0].pk, 'code': 'ML-0', 'open_workorders': 3},
+            {'id': self.machines[1].pk, 'code': 'ML-1', 'open_workorders': 0},
+        ])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['code'] for row in data['results']], ['ML-2'])
+        self.assertIsNone(data['next'])
+        response = self.client.get(url, {'fields': 'code,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json()['errors'])
+
+    def test_workorders_with_tasks_in_two_queries(self):
+        url = reverse('api_list', args=['workorders'])
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url, {'machine': self.machines[0].pk, 'fields': 'code,assigned_to,tasks'}).json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(data['results'][1]['assigned_to'], 'mes')
+        self.assertEqual(data['results'][1]['tasks'][0]['is_done'], True)
+        data_queries = [q for q in ctx.captured_queries if 'maintenance_workorder' in q['sql']]
+        self.assertEqual(len(data_queries), 2)
+        detail = self.client.get(reverse('api_detail', args=['workorders', 999999]))
+        self.assertEqual(detail.status_code, 404)
+
+    def test_conditional_get(self):
+        url = reverse('api_detail', args=['machines', self.machines[0].pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['category'], 'Mill')
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertFalse(any('maintenance_machine' in q['sql'] for q in ctx.captured_queries))
+        with self.captureOnCommitCallbacks(execute=True):
+            Machine.objects.filter(pk=self.machines[0].pk).update(name='Renamed')
+            caching.invalidate('machine')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['name'], 'Renamed')
+        # ตัวนับใบงานของเครื่องจักรเปลี่ยนเมื่อสร้างใบงาน แม้แถว machine จะไม่ถูกบันทึกผ่าน signal
+        with self.captureOnCommitCallbacks(execute=True):
+            WorkOrder.objects.create(code='WO-9', machine=self.machines[0], summary='Check')
+        counted = self.client.get(url, HTTP_IF_NONE_MATCH=changed['ETag'])
+        self.assertEqual(counted.status_code, 200)
+        self.assertEqual(counted.json()['open_workorders'], 4)
+        self.assertEqual(self.client.get(reverse('api_list', args=['nothing'])).status_code, 404)
+
+
+class InstrumentationTest(TestCase):
+    """
+    middleware วัดเวลา / จำนวน query / เวลา render ของ request ที่ถูกสุ่ม และส่งออกที่ /metrics
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('ops', password='pass', is_staff=True)
+        machine = Machine.objects.create(code='IN-1', name='Press', category=MachineCategory.objects.create(name='Press'))
+        WorkOrder.objects.create(code='WO-IN-1', machine=machine, summary='Leak')
+
+    def setUp(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        settings = override_settings(MAINTENANCE_METRICS_DIR=metrics_dir, MAINTENANCE_METRICS_SAMPLE_RATE=1,
+                                     MAINTENANCE_SLOW_QUERIES=2, MAINTENANCE_METRICS_TOKEN='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.user)
+
+    def test_sampled_request_is_logged(self):
+        with self.assertLogs('maintenance.requests', 'INFO') as logs:
+            self.client.get(reverse('workorder_list'))
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((entry['view'], entry['status'], entry['sampled']), ('workorder_list', 200, True))
+        self.assertGreater(entry['queries'], 0)
+        self.assertGreater(entry['template_ms'], 0)
+        self.assertEqual(len(entry['slow_queries']), 2)
+        self.assertGreaterEqual(entry['slow_queries'][0]['ms'], entry['slow_queries'][1]['ms'])
+
+    async def test_async_request_counts_queries(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        with self.assertLogs('maintenance.requests', 'INFO') as logs:
+            await client.get(reverse('workorder_list'))
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((entry['view'], entry['status']), ('workorder_list', 200))
+        self.assertGreater(entry['queries'], 0)
+
+    def test_unsampled_fast_request_is_not_logged(self):
+        with override_settings(MAINTENANCE_METRICS_SAMPLE_RATE=0), mock.patch.object(instrumentation, 'logger') as logger:
+            self.client.get(reverse('machine_list'))
+        logger.info.assert_not_called()
+        logger.warning.assert_not_called()
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('dashboard'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE maintenance_http_request_duration_seconds histogram', body)
+        self.assertIn('maintenance_http_requests_total{view="dashboard",method="GET",status="200"}', body)
+        self.assertIn('maintenance_http_request_duration_seconds_bucket{view="dashboard",le="+Inf"}', body)
+        self.assertIn('maintenance_db_queries_total{view="dashboard"}', body)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(MAINTENANCE_METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class BenchmarkTest(TestCase):
+    """
+    ข้อมูลจำลองสร้างด้วย bulk_create แล้วตารางสรุปตรงกับข้อมูลจริง และ benchmark วัด/เปรียบเทียบผลได้
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.media = tempfile.mkdtemp()
+        with override_settings(MEDIA_ROOT=cls.media):
+            cls.counts = synthetic.generate(categories=3, locations=2, machines=6, plans_per_machine=2, years=1,
+                                            workorders_per_machine_year=10, attachment_ratio=0.5, users=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media, ignore_errors=True)
+
+    def test_generated_data_is_consistent(self):
+        self.assertEqual(self.counts['machine'], 6)
+        self.assertEqual(self.counts['workorder'], 60)
+        self.assertEqual(WorkOrderStat.objects.aggregate(n=Sum('count'))['n'], 60)
+        open_count = WorkOrder.objects.filter(status__in=counters.OPEN_STATUSES).count()
+        self.assertEqual(Machine.objects.aggregate(n=Sum('open_workorder_count'))['n'], open_count)
+        self.assertEqual(WorkOrder.objects.aggregate(n=Sum('task_total'))['n'], WorkOrderTask.objects.count())
+        self.assertLess(WorkOrder.objects.aggregate(first=Min('reported_at'))['first'],
+                        timezone.now() - timedelta(days=60))
+
+    def test_run_and_compare(self):
+        report = benchmark.run(iterations=2, warmup=0, only=['dashboard', 'workorder_list', 'admin:workorder'])
+        self.assertEqual(set(report['results']), {'dashboard', 'workorder_list', 'admin:workorder'})
+        for result in report['results'].values():
+            self.assertEqual(result['status'], 200)
+            self.assertGreater(result['queries'], 0)
+        self.assertEqual(report['meta']['rows']['Machine'], 6)
+
+        baseline = json.loads(json.dumps(report))
+        self.assertEqual(benchmark.compare(report, baseline), [])
+        baseline['results']['dashboard']['p95_ms'] = report['results']['dashboard']['p95_ms'] / 2 - 1
+        baseline['results']['workorder_list']['queries'] -= 1
+        self.assertEqual([name for name, _ in benchmark.compare(report, baseline)], ['dashboard', 'workorder_list'])
+
+    def test_targets_cover_urls_and_admin(self):
+        names = {name for name, _ in benchmark.targets()}
+        self.assertTrue({'machine_detail', 'api_detail:workorders', 'autocomplete:user', 'admin:machine'} <= names)
+        self.assertNotIn('workorder_events', names)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+class ConnectionReuseTest(TransactionTestCase):
+    """
+    connection จาก pool / CONN_MAX_AGE ถูกใช้ซ้ำข้าม request แทนการเปิดใหม่ทุกครั้ง
+    """
+
+    def test_request_cycle_reuses_connections(self):
+        result = benchmark.connection_overhead(iterations=20)
+        self.assertIn(result['mode'], ('pool', f"conn_max_age={connection.settings_dict['CONN_MAX_AGE']}"))
+        self.assertLess(result['configured']['mean_ms'], result['reconnect']['mean_ms'])
+
+
+class JournalTest(TestCase):
+    """
+    ประวัติใบงาน: เขียนเป็นชุดเดียวตอนจบ request ครอบคลุมทุกเส้นทางการบันทึก และ query ระบุช่วงเวลาเสมอ
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('lead', password='pass')
+        category = MachineCategory.objects.create(name='Lathe')
+        machine = Machine.objects.create(code='LT-1', name='Lathe', category=category)
+        cls.wo = WorkOrder.objects.create(code='WO-1', machine=machine, summary='Noise')
+        cls.task = WorkOrderTask.objects.create(workorder=cls.wo, title='Inspect')
+
+    def events(self):
+        return list(WorkOrderEvent.objects.filter(workorder_id=self.wo.pk).order_by('pk')
+                    .values_list('kind', 'task_id', 'value_from', 'value_to', 'user_id'))
+
+    def test_request_events_written_in_one_insert(self):
+        def view(request):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.wo.status = WorkOrder.STATUS_INPROG
+                self.wo.assigned_to = self.user
+                self.wo.save()
+                checklist.toggle(self.wo, [self.task.pk], True)
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with CaptureQueriesContext(connection) as ctx:
+            journal.JournalMiddleware(view)(request)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "maintenance_workorderevent"')]
+        self.assertEqual(len(inserts), 1)
+        uid = self.user.pk
+        self.assertEqual(self.events(), [
+            (WorkOrderEvent.KIND_STATUS, None, 'OPEN', 'IN_PROGRESS', uid),
+            (WorkOrderEvent.KIND_ASSIGNEE, None, '', str(uid), uid),
+            (WorkOrderEvent.KIND_TASK_DONE, self.task.pk, '', '', uid),
+        ])
+
+    def test_task_changes(self):
+        task_id = self.task.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            checklist.apply(self.wo, created=[WorkOrderTask(title='Grease', is_done=True)])
+            self.task.title = 'Inspect belt'
+            self.task.save()
+            self.task.delete()
+        added = WorkOrderTask.objects.get(title='Grease').pk
+        self.assertEqual([row[:4] for row in self.events()], [
+            (WorkOrderEvent.KIND_TASK_ADDED, added, '', 'Grease'),
+            (WorkOrderEvent.KIND_TASK_DONE, added, '', ''),
+            (WorkOrderEvent.KIND_TASK_RENAMED, task_id, 'Inspect', 'Inspect belt'),
+            (WorkOrderEvent.KIND_TASK_REMOVED, task_id, 'Inspect belt', ''),
+        ])
+        # ไม่ได้ commit = ไม่มีประวัติ
+        with self.captureOnCommitCallbacks(execute=False):
+            self.wo.priority = WorkOrder.PRIORITY_HIGH
+            self.wo.save()
+        self.assertEqual(len(self.events()), 4)
+
+    def test_history_time_in_state_and_api(self):
+        start = self.wo.reported_at
+        journal.write([
+            journal.event(self.wo.pk, WorkOrderEvent.KIND_CREATED, value_to='OPEN', occurred_at=start),
+            journal.event(self.wo.pk, WorkOrderEvent.KIND_ASSIGNEE, '', self.user.pk, occurred_at=start),
+            journal.event(self.wo.pk, WorkOrderEvent.KIND_STATUS, 'OPEN', 'IN_PROGRESS',
+                          occurred_at=start + timedelta(hours=2)),
+            journal.event(self.wo.pk, WorkOrderEvent.KIND_STATUS, 'IN_PROGRESS', 'DONE',
+                          occurred_at=start + timedelta(hours=5)),
+        ], user_id=self.user.pk)
+        history = journal.history(self.wo)
+        self.assertEqual([(e.display_from, e.display_to) for e in history],
+                         [('', 'Open'), ('', 'lead'), ('Open', 'In progress'), ('In progress', 'Done')])
+
+        period = metrics.month_start(start)
+        rows = journal.time_in_state(period, metrics.shift_month(period, 1))
+        self.assertEqual([(r['status'], r['transitions'], r['avg_hours']) for r in rows],
+                         [('OPEN', 1, 2.0), ('IN_PROGRESS', 1, 3.0)])
+
+        self.client.force_login(self.user)
+        url = reverse('api_list', args=['events'])
+        # ไม่ระบุ until = ถึงตอนนี้ (สองเหตุการณ์หลังอยู่ในอนาคต)
+        data = self.client.get(url, {'workorder': self.wo.pk, 'fields': 'kind,user'}).json()
+        self.assertEqual([row['kind'] for row in data['results']], [1, 3])
+        self.assertEqual(data['results'][0]['user'], 'lead')
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        data = self.client.get(url, {'workorder': self.wo.pk, 'until': tomorrow}).json()
+        self.assertEqual(len(data['results']), 4)
+        later = (timezone.localdate() + timedelta(days=2)).isoformat()
+        self.assertEqual(self.client.get(url, {'since': later, 'until': later}).json()['results'], [])
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+    def test_partitions_and_pruning(self):
+        old = metrics.shift_month(metrics.month_start(timezone.localdate()), -25)
+        occurred_at = timezone.make_aware(datetime.combine(old.replace(day=10), time.min))
+        journal.write([journal.event(self.wo.pk, WorkOrderEvent.KIND_STATUS, 'OPEN', 'DONE', occurred_at=occurred_at)])
+        created = journal.ensure_partitions(months_ahead=1)
+        self.assertEqual(len(created), 3)
+        self.assertIn(old, created)
+        self.assertEqual(journal.ensure_partitions(months_ahead=1), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {journal.partition_name(old)}')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        plan = journal.audit(occurred_at - timedelta(days=1), occurred_at + timedelta(days=1)).explain()
+        self.assertIn(journal.partition_name(old), plan)
+        self.assertNotIn(f'{journal.TABLE}_default', plan)
+
+
+class ArchiveTest(TestCase):
+    """
+    ใบงานที่ปิดแล้วและเก่าย้ายไปตารางเก็บถาวรพร้อมงานย่อย / ไฟล์แนบ รายงานยังอ่านครบผ่าน WorkOrderHistory
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.tech = User.objects.create_user('tech', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        category = MachineCategory.objects.create(name='Pump')
+        cls.machine = Machine.objects.create(code='PU-1', name='Pump', category=category)
+        old = timezone.now() - timedelta(days=400)
+        rows = [('OLD-1', WorkOrder.STATUS_DONE, old), ('OLD-2', WorkOrder.STATUS_CANCEL, old),
+                ('OLD-OPEN', WorkOrder.STATUS_OPEN, old), ('NEW-1', WorkOrder.STATUS_DONE, timezone.now())]
+        for code, status, reported in rows:
+            wo = WorkOrder.objects.create(
+                code=code, machine=cls.machine, summary='Seal', status=status, assigned_to=cls.tech,
+                finished_at=reported + timedelta(hours=2) if status == WorkOrder.STATUS_DONE else None,
+            )
+            WorkOrder.objects.filter(pk=wo.pk).update(reported_at=reported)
+            WorkOrderTask.objects.create(workorder=wo, title='Replace seal', is_done=True)
+        cls.old = WorkOrder.objects.get(code='OLD-1')
+        Attachment.objects.create(workorder=cls.old, file='attachments/seal.png')
+        counters.rebuild()
+        metrics.rebuild()
+
+    def test_moves_closed_old_workorders_in_batches(self):
+        before = list(WorkOrderHistory.objects.order_by('pk').values_list('pk', 'code', 'status'))
+        with self.captureOnCommitCallbacks(execute=True):
+            totals = archive.archive(after_days=365, batch_size=1)
+        self.assertEqual(totals, {'archivedworkorder': 2, 'archivedworkordertask': 2, 'archivedattachment': 1})
+        self.assertCountEqual(WorkOrder.objects.values_list('code', flat=True), ['OLD-OPEN', 'NEW-1'])
+        archived = ArchivedWorkOrder.objects.get(code='OLD-1')
+        self.assertEqual(archived.pk, self.old.pk)
+        self.assertEqual((archived.task_total, archived.task_done), (1, 1))
+        self.assertEqual(ArchivedWorkOrderTask.objects.filter(workorder=archived).count(), 1)
+        self.assertEqual(ArchivedAttachment.objects.get().workorder_id, archived.pk)
+        self.assertFalse(Attachment.objects.exists())
+        # view รวมสองตารางให้ผลเหมือนเดิม
+        self.assertEqual(list(WorkOrderHistory.objects.order_by('pk').values_list('pk', 'code', 'status')), before)
+        self.assertEqual(WorkOrderHistory.objects.filter(is_archived=True).count(), 2)
+        self.assertEqual(archive.archive(after_days=365), {})
+
+    def test_reporting_covers_archived_workorders(self):
+        stats = list(WorkOrderStat.objects.order_by('pk').values_list('period', 'status', 'count'))
+        last = Machine.objects.values_list('last_maintenance_at', flat=True).get()
+        archive.archive(after_days=365)
+        metrics.rebuild()
+        counters.rebuild()
+        self.assertEqual(list(WorkOrderStat.objects.order_by('pk').values_list('period', 'status', 'count')), stats)
+        self.assertEqual(Machine.objects.values_list('last_maintenance_at', flat=True).get(), last)
+        # ประวัติผูกกับ id เดิม จึงยังเปิดดูได้จากใบงานที่เก็บถาวร
+        WorkOrderEvent.objects.create(workorder_id=self.old.pk, kind=WorkOrderEvent.KIND_STATUS,
+                                      occurred_at=self.old.finished_at, value_from='IN_PROGRESS', value_to='DONE')
+        history = journal.history(ArchivedWorkOrder.objects.get(code='OLD-1'))
+        self.assertEqual([item.display_to for item in history], ['Done'])
+
+    def test_archived_attachment_access_and_code_reuse(self):
+        archive.archive(after_days=365)
+        self.assertTrue(media.can_access(self.tech, 'attachments/seal.png'))
+        self.assertFalse(media.can_access(self.other, 'attachments/seal.png'))
+        form = WorkOrderForm(data={'code': 'OLD-1', 'wo_type': WorkOrder.TYPE_CM, 'priority': WorkOrder.PRIORITY_MED,
+                                   'status': WorkOrder.STATUS_OPEN, 'machine': self.machine.pk, 'summary': 'Seal'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('code', form.errors)
+
+
+class BootstrapTest(TestCase):
+    """
+    manage.py bootstrap ทำทุกขั้นตอนใน process เดียว และข้ามขั้นตอนที่ไม่มีอะไรเปลี่ยน
+    """
+
+    def setUp(self):
+        self.source, self.static_root, self.fixtures = (tempfile.mkdtemp() for _ in range(3))
+        for path in (self.source, self.static_root, self.fixtures):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        self.write(f'{self.source}/app.css', 'body {}')
+        self.write_fixture('Press')
+        settings = override_settings(
+            STATICFILES_DIRS=[self.source], STATIC_ROOT=self.static_root,
+            FIXTURE_DIRS=[self.fixtures], MAINTENANCE_BOOTSTRAP_FIXTURES=['seed.json'],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        env = mock.patch.dict(os.environ, {'DJANGO_SUPERUSER_USERNAME': 'admin', 'DJANGO_SUPERUSER_EMAIL': 'a@b.c',
+                                           'DJANGO_SUPERUSER_PASSWORD': 'pass'})
+        env.start()
+        self.addCleanup(env.stop)
+
+    @staticmethod
+    def write(path, text):
+        with open(path, 'w') as fh:
+            fh.write(text)
+
+    def write_fixture(self, name):
+        self.write(f'{self.fixtures}/seed.json', json.dumps([
+            {'model': 'maintenance.machinecategory', 'pk': 1, 'fields': {'name': name}},
+            {'model': 'maintenance.machine', 'pk': 1, 'fields': {'code': 'SD-1', 'name': 'Seed', 'category': 1}},
+            {'model': 'maintenance.workorder', 'pk': 1, 'fields': {'code': 'SD-WO', 'machine': 1, 'summary': 'Seed',
+                                                                  'reported_at': '2026-01-05T08:00:00Z'}},
+            {'model': 'maintenance.workordertask', 'pk': 1, 'fields': {'workorder': 1, 'title': 'Check'}},
+        ]))
+
+    def bootstrap(self):
+        out = io.StringIO()
+        call_command('bootstrap', stdout=out)
+        return {line[:20].strip(): line[21:66].strip() for line in out.getvalue().splitlines()[:-1]}
+
+    def test_first_run_then_skips_unchanged_steps(self):
+        steps = self.bootstrap()
+        self.assertEqual(steps['collectstatic'], 'collected')
+        self.assertEqual(steps['migrate'], 'skipped (no pending migrations)')
+        self.assertEqual(steps['superuser'], 'created admin')
+        self.assertEqual(steps['fixtures'], 'seed.json loaded')
+        self.assertTrue(os.path.exists(f'{self.static_root}/app.css'))
+        self.assertTrue(get_user_model().objects.get(username='admin').is_superuser)
+        self.assertTrue(BootstrapRecord.objects.filter(name='fixture:seed.json').exists())
+
+        steps = self.bootstrap()
+        self.assertEqual(steps['collectstatic'], 'skipped (source unchanged)')
+        self.assertEqual(steps['superuser'], 'admin exists')
+        self.assertEqual(steps['fixtures'], 'seed.json unchanged')
+        self.assertEqual(steps['forecast'], 'skipped (no data changes)')
+        self.assertEqual(steps['reliability'], 'skipped (no data changes)')
+
+    def test_changed_sources_run_again(self):
+        self.bootstrap()
+        self.write(f'{self.source}/app.css', 'body { margin: 0 }')
+        self.write_fixture('Lathe')
+        steps = self.bootstrap()
+        self.assertEqual(steps['collectstatic'], 'collected')
+        self.assertEqual(steps['fixtures'], 'seed.json loaded')
+        self.assertRegex(steps['forecast'], r'^\d+ occurrences$')
+        self.assertEqual(MachineCategory.objects.get(pk=1).name, 'Lathe')
+        # loaddata บันทึกแบบ raw ตัวนับและสถิติต้องถูกคำนวณใหม่หลังโหลด
+        self.assertEqual(Machine.objects.values_list('open_workorder_count', flat=True).get(pk=1), 1)
+        self.assertEqual(WorkOrder.objects.values_list('task_total', 'task_done').get(pk=1), (1, 0))
+        self.assertEqual(WorkOrderStat.objects.aggregate(n=Sum('count'))['n'], 1)
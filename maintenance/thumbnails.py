@@ -0,0 +1,122 @@
+"""
+สร้างรูปย่อ (thumbnail) ของรูปเครื่องจักรและไฟล์แนบ ด้วย Pillow
+
+แต่ละรูปต้นฉบับจะได้ไฟล์ย่อหลายขนาด (SIZES) ทั้ง WebP และ JPEG เก็บไว้ข้างไฟล์ต้นฉบับ
+เช่น machines/pump.jpg -> machines/pump.jpg.md.webp, machines/pump.jpg.md.jpg
+(เก็บชื่อเต็มรวมนามสกุล pump.jpg กับ pump.png จึงไม่ใช้รูปย่อชุดเดียวกัน)
+ไฟล์ย่อถูกหมุนตาม EXIF orientation แล้วบันทึกโดยไม่มี EXIF (ตัดข้อมูล GPS/กล้องทิ้ง)
+
+งานสร้างรูปทำใน thread pool หลัง transaction commit (ไม่ขวาง request)
+ตั้งจำนวน worker ได้ด้วย settings.MAINTENANCE_THUMBNAIL_WORKERS (0 = ทำทันทีใน thread เดิม)
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# ขนาดด้านยาวสุด (px) ของแต่ละชื่อขนาด
+SIZES = {
+    'sm': 160,
+    'md': 480,
+    'lg': 1280,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DEFAULT_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def derivative_name(name, size, ext):
+    return f'{name}.{size}.{ext}'
+
+
+def derivative_names(name):
+    return [derivative_name(name, size, ext) for size in SIZES for ext in FORMATS]
+
+
+def generate(name, storage=default_storage, force=False):
+    """
+    สร้างไฟล์ย่อทุกขนาดของรูป name ที่ยังไม่มี คืนค่ารายชื่อไฟล์ที่สร้าง
+    รูปที่เล็กกว่าขนาดเป้าหมายจะไม่ถูกขยาย
+    """
+    todo = [(size, ext) for size in SIZES for ext in FORMATS
+            if force or not storage.exists(derivative_name(name, size, ext))]
+    if not todo:
+        return []
+    try:
+        with storage.open(name, 'rb') as fh:
+            image = Image.open(fh)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning('Cannot create thumbnails for %s', name, exc_info=True)
+        return []
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    created = []
+    for size in sorted({size for size, _ in todo}, key=SIZES.get, reverse=True):
+        resized = image.copy()
+        resized.thumbnail((SIZES[size], SIZES[size]), Image.Resampling.LANCZOS)
+        for ext in [ext for s, ext in todo if s == size]:
+            fmt, options = FORMATS[ext]
+            frame = resized
+            if fmt == 'JPEG' and frame.mode == 'RGBA':
+                # JPEG ไม่มี alpha: วางบนพื้นขาว
+                frame = Image.new('RGB', resized.size, 'white')
+                frame.paste(resized, mask=resized.getchannel('A'))
+            buffer = BytesIO()
+            # ไม่ส่ง exif= จึงไม่มี metadata ติดไปกับไฟล์ย่อ
+            frame.save(buffer, fmt, **options)
+            target = derivative_name(name, size, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            created.append(storage.save(target, ContentFile(buffer.getvalue())))
+    return created
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'MAINTENANCE_THUMBNAIL_WORKERS', DEFAULT_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+        return _executor
+
+
+def _run(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Thumbnail generation failed for %s', name)
+
+
+def schedule(name):
+    """ส่งงานสร้างรูปย่อเข้า worker pool (หรือทำทันทีถ้าตั้ง workers = 0)"""
+    if not name:
+        return
+    if getattr(settings, 'MAINTENANCE_THUMBNAIL_WORKERS', DEFAULT_WORKERS) == 0:
+        _run(name)
+    else:
+        _get_executor().submit(_run, name)
+
+
+def url_for(file, size='md', ext='webp', storage=default_storage):
+    """URL ของรูปย่อ ถ้ายังสร้างไม่เสร็จจะคืน URL ของไฟล์ต้นฉบับแทน"""
+    if not file:
+        return ''
+    name = derivative_name(file.name, size, ext)
+    if storage.exists(name):
+        return storage.url(name)
+    return file.url
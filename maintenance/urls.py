@@ -1,19 +1,33 @@
 from django.urls import path
-from . import views
+from . import instrumentation, views
 
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='dashboard'),
+    path('metrics', instrumentation.metrics_view, name='metrics'),
+    path('import/', views.ImportView.as_view(), name='import'),
+    path('autocomplete/<str:kind>/', views.AutocompleteView.as_view(), name='autocomplete'),
+    path('reliability/', views.ReliabilityView.as_view(), name='reliability'),
+    path('reliability/api/', views.ReliabilityApiView.as_view(), name='reliability_api'),
+    path('api/<str:resource>/', views.ApiView.as_view(), name='api_list'),
+    path('api/<str:resource>/<int:pk>/', views.ApiView.as_view(), name='api_detail'),
 
     path('machines/', views.MachineListView.as_view(), name='machine_list'),
+    path('machines/export/', views.MachineExportView.as_view(), name='machine_export'),
     path('machines/create/', views.MachineCreateView.as_view(), name='machine_create'),
     path('machines/<int:pk>/', views.MachineDetailView.as_view(), name='machine_detail'),
     path('machines/<int:pk>/edit/', views.MachineUpdateView.as_view(), name='machine_edit'),
 
     path('plans/', views.PlanListView.as_view(), name='plan_list'),
+    path('plans/export/', views.PlanExportView.as_view(), name='plan_export'),
     path('plans/create/', views.PlanCreateView.as_view(), name='plan_create'),
+    path('plans/workload/', views.PlanWorkloadView.as_view(), name='plan_workload'),
     path('plans/<int:pk>/edit/', views.PlanUpdateView.as_view(), name='plan_edit'),
 
     path('workorders/', views.WorkOrderListView.as_view(), name='workorder_list'),
+    path('workorders/export/', views.WorkOrderExportView.as_view(), name='workorder_export'),
+    path('workorders/events/', views.workorder_events, name='workorder_events'),
     path('workorders/create/', views.WorkOrderCreateView.as_view(), name='workorder_create'),
     path('workorders/<int:pk>/edit/', views.WorkOrderUpdateView.as_view(), name='workorder_edit'),
+    path('workorders/<int:pk>/tasks/', views.WorkOrderChecklistView.as_view(), name='workorder_tasks'),
+    path('workorders/<int:pk>/tasks/toggle/', views.WorkOrderChecklistToggleView.as_view(), name='workorder_tasks_toggle'),
 ]
\ No newline at end of file
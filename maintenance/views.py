@@ -1,46 +1,317 @@
+import asyncio
+import io
+import json
+from datetime import date
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DetailView
-from django.shortcuts import redirect, render
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.views.generic import View, TemplateView, ListView, CreateView, UpdateView, DetailView, FormView
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
+from . import api, caching, checklist, events, forecast, importer, journal, metrics, reliability, search
+from .exports import ExportMixin
 from .models import Machine, MaintenancePlan, WorkOrder
-from .forms import MachineForm, MaintenancePlanForm, WorkOrderForm, WorkOrderTaskFormSet
+from .forms import ImportForm, MachineForm, MaintenancePlanForm, WorkOrderForm, WorkOrderTaskFormSet
+from .caching import CachedPageMixin
+from .pagination import KeysetPaginationMixin
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """
+    LoginRequiredMixin สำหรับ view แบบ async (handler เป็น async def)
+    ตรวจผู้ใช้ด้วย request.auser() เพื่อไม่ให้แตะฐานข้อมูลแบบ sync ใน event loop
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+
+
+class AsyncListMixin:
+    """
+    ListView แบบ async สำหรับหน้ารายการที่ช่างเปิด / refresh บ่อย (เหมือน DashboardView)
+    คิวรีและแบ่งหน้าใน sync_to_async แล้วคืน TemplateResponse ซึ่ง handler ของ Django render ใน thread ต่อเอง
+    ภายใต้ ASGI จึงไม่ผูก worker ไว้ระหว่างรอฐานข้อมูล
+    """
+
+    async def get(self, request, *args, **kwargs):
+        return self.render_to_response(await sync_to_async(self.get_list_context)())
+
+    def get_list_context(self):
+        self.object_list = self.get_queryset()
+        return self.get_context_data()
 
-class DashboardView(LoginRequiredMixin, TemplateView):
+
+class DashboardView(AsyncLoginRequiredMixin, TemplateView):
     """
     หน้าแดชบอร์ดหลัก แสดงภาพรวมของระบบบำรุงรักษา
     ประกอบด้วย จำนวนเครื่องจักรทั้งหมด, Work Order ที่เปิดอยู่, 
     และแผนบำรุงรักษาที่ใกล้ครบกำหนด (7 วัน)
+    ตัวเลขของกราฟทั้งหมดอ่านจากตารางสรุป WorkOrderStat (ดู metrics.py)
+    เป็น async view: ภายใต้ ASGI ไม่ผูก worker ไว้ระหว่างรอฐานข้อมูล
     """
     template_name = 'maintenance/dashboard.html'
 
+    async def get(self, request, *args, **kwargs):
+        stats, due_soon = await sync_to_async(self.get_dashboard_data)()
+        return self.render_to_response(self.get_context_data(stats=stats, due_soon=due_soon, **kwargs))
+
+    @staticmethod
+    def get_dashboard_data():
+        # ตัวเลขและรายการ PM ใกล้ถึงกำหนด 7 วัน cache ไว้จนกว่าข้อมูลจะเปลี่ยน (หรือขึ้นวันใหม่)
+        return caching.get_or_set(
+            'dashboard', ('machine', 'plan', 'workorder'), (date.today(),),
+            lambda: (metrics.dashboard_metrics(months=6), list(MaintenancePlan.objects.due_within(days=7))),
+        )
+
+    def get_context_data(self, stats, due_soon, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx.update(stats)
+        ctx['due_soon'] = due_soon
+        # เครื่องที่ใช้งานอยู่และมี PM ใกล้ครบกำหนด นับแยกจาก "ใช้งานปกติ" ให้สามส่วนรวมเท่าจำนวนเครื่องทั้งหมด
+        needs_pm = len({plan.machine_id for plan in due_soon if plan.machine.is_active})
+        ctx['chart_data'] = {
+            'by_type': [stats['by_type'][code] for code, _ in WorkOrder.TYPE_CHOICES],
+            'machine_status': [stats['machine_active'] - needs_pm, needs_pm, stats['machine_inactive']],
+            'trend_labels': stats['trend_labels'],
+            'trend_pm': stats['trend'][WorkOrder.TYPE_PM],
+            'trend_cm': stats['trend'][WorkOrder.TYPE_CM],
+            'priority': [stats['open_by_priority'][code] for code in (
+                WorkOrder.PRIORITY_HIGH, WorkOrder.PRIORITY_MED, WorkOrder.PRIORITY_LOW)],
+        }
+        return ctx
+
+
+class ImportView(LoginRequiredMixin, FormView):
+    """
+    หน้าอัปโหลดไฟล์ CSV เพื่อนำเข้าเครื่องจักร แผน หรือใบสั่งงานจำนวนมาก (ดู importer.py)
+    แสดงสรุปผลและรายการข้อผิดพลาดรายแถวหลังนำเข้า
+    """
+    form_class = ImportForm
+    template_name = 'maintenance/import.html'
+    max_errors_shown = 200
+
+    def form_valid(self, form):
+        stream = io.TextIOWrapper(form.cleaned_data['file'], encoding='utf-8-sig', newline='')
+        result = importer.import_csv(form.cleaned_data['kind'], stream, user=self.request.user)
+        return self.render_to_response(self.get_context_data(
+            form=form,
+            result=result,
+            errors=result['errors'][:self.max_errors_shown],
+        ))
+
+
+class AutocompleteView(LoginRequiredMixin, View):
+    """
+    JSON สำหรับช่อง typeahead ของฟอร์ม (ดู AutocompleteSelect ใน forms.py)
+    GET /autocomplete/<kind>/?q=...  ->  {"results": [{"id": ..., "text": ...}, ...]}
+    ผลลัพธ์ถูก cache ตามคำค้นจนกว่าข้อมูลของกลุ่มนั้นจะเปลี่ยน
+    """
+    limit = 20
+    # kind -> (กลุ่ม cache ที่ขึ้นอยู่ด้วย, ชื่อ method ที่สร้าง queryset)
+    kinds = {
+        'machine': (('machine',), 'machines'),
+        'plan': (('machine', 'plan'), 'plans'),
+        'user': (('user',), 'users'),
+    }
+
+    def get(self, request, kind):
+        if kind not in self.kinds:
+            raise Http404
+        labels, method = self.kinds[kind]
+        q = request.GET.get('q', '').strip()
+        machine = request.GET.get('machine', '')
+        machine = int(machine) if machine.isdigit() else None
+        results = caching.get_or_set(
+            'autocomplete', labels, (kind, q, machine),
+            lambda: [{'id': obj.pk, 'text': str(obj)} for obj in getattr(self, method)(q, machine)[:self.limit]],
+        )
+        return JsonResponse({'results': results})
+
+    @staticmethod
+    def machines(q, machine):
+        qs = Machine.objects.filter(is_active=True).only('code', 'name')
+        if q:
+            return search.search(qs, q).order_by('-search_rank', 'code')
+        return qs.order_by('code')
+
+    @staticmethod
+    def plans(q, machine):
+        qs = MaintenancePlan.objects.select_related('machine').only('title', 'machine__code')
+        if machine:
+            qs = qs.filter(machine_id=machine)
+        if q:
+            qs = qs.filter(Q(title__icontains=q) | Q(machine__code__icontains=q))
+        return qs.order_by('machine__code', 'title')
+
+    @staticmethod
+    def users(q, machine):
+        qs = get_user_model().objects.filter(is_active=True)
+        if q:
+            qs = qs.filter(username__icontains=q)
+        return qs.order_by('username')
+
+
+class ReliabilityMixin:
+    """อ่านพารามิเตอร์ ?group=machine|category|location|all และ ?months=N ของรายงานความน่าเชื่อถือ"""
+    default_months = 12
+    max_months = 120
+
+    def get_report_params(self):
+        group = self.request.GET.get('group', 'machine')
+        if group not in reliability.GROUPS:
+            group = 'machine'
+        months = self.request.GET.get('months', '')
+        months = min(int(months), self.max_months) if months.isdigit() and int(months) > 0 else self.default_months
+        return group, months
+
+
+class ReliabilityView(LoginRequiredMixin, ReliabilityMixin, TemplateView):
+    """
+    หน้ารายงาน MTTR / MTBF / PM compliance / backlog แยกตามเครื่องจักร ประเภท หรือสถานที่
+    อ่านจากตาราง ReliabilitySnapshot (ดู reliability.py) จึงเร็วแม้ดูย้อนหลังหลายปี
+    """
+    template_name = 'maintenance/reliability.html'
+    month_options = (3, 6, 12, 24, 60)
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx['machine_count'] = Machine.objects.count()
-        ctx['wo_open'] = WorkOrder.objects.filter(status=WorkOrder.STATUS_OPEN).count()
-        ctx['due_soon'] = MaintenancePlan.due_within(days=7)  # PM ใกล้ถึงกำหนด 7 วัน
+        group, months = self.get_report_params()
+        ctx.update(reliability.report(group, months))
+        ctx['group'] = group
+        ctx['months'] = months
+        ctx['groups'] = list(reliability.GROUPS)
+        ctx['month_options'] = self.month_options
+        ctx['trend'] = reliability.trend(months)
+        ctx['time_in_state'] = journal.time_in_state(ctx['start'], ctx['end']) if ctx['start'] else []
         return ctx
 
 
+class ReliabilityApiView(LoginRequiredMixin, ReliabilityMixin, View):
+    """
+    JSON ของรายงานความน่าเชื่อถือ
+    GET /reliability/api/?group=category&months=24  ->  {"group", "start", "end", "rows": [...], "trend": [...]}
+    """
+
+    def get(self, request):
+        group, months = self.get_report_params()
+        data = reliability.report(group, months)
+        return JsonResponse({'group': group, 'months': months, **data, 'trend': reliability.trend(months)})
+
+
+class ApiView(LoginRequiredMixin, View):
+    """
+    JSON API แบบอ่านอย่างเดียว (ดู api.py)
+    GET /api/<resource>/ และ /api/<resource>/<pk>/ รองรับ If-None-Match / If-Modified-Since
+    ถ้าข้อมูลไม่เปลี่ยนตอบ 304 โดยอ่านแค่เลขเวอร์ชันจาก cache ไม่ query ตารางข้อมูล
+    """
+    raise_exception = True  # client ของ API ได้ 403 แทนการ redirect ไปหน้า login
+
+    def get(self, request, resource, pk=None):
+        if resource not in api.RESOURCES:
+            raise Http404
+        resource = api.RESOURCES[resource]
+        etag = resource.etag(request)
+        last_modified = resource.last_modified()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            try:
+                if pk is None:
+                    rows, last_id = api.list_page(resource, request.GET)
+                    response = JsonResponse({'results': rows, 'next': self.next_url(request, last_id)})
+                else:
+                    row = api.detail(resource, pk, request.GET)
+                    if row is None:
+                        return JsonResponse({'errors': {'__all__': ['ไม่พบข้อมูล']}}, status=404)
+                    response = JsonResponse(row)
+            except api.ApiError as exc:
+                return JsonResponse({'errors': exc.errors}, status=400)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # ให้ client ตรวจกับ server ทุกครั้ง (ได้ 304 ถ้าไม่เปลี่ยน)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @staticmethod
+    def next_url(request, last_id):
+        if last_id is None:
+            return None
+        params = request.GET.copy()
+        params['after'] = last_id
+        return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
 # ===== Machines =====
-class MachineListView(LoginRequiredMixin, ListView):
+class MachineListView(AsyncLoginRequiredMixin, AsyncListMixin, CachedPageMixin, KeysetPaginationMixin, ListView):
     """
     หน้าแสดงรายการเครื่องจักรทั้งหมด
-    รองรับการค้นหาตามชื่อหรือรหัสเครื่องจักร
-    แสดงผลแบบ pagination (10 รายการต่อหน้า)
+    รองรับการค้นหาตามรหัส ชื่อ หรือหมายเลขเครื่อง (ผ่าน search.py เรียงตามความเกี่ยวข้อง)
+    แสดงผลแบบ keyset pagination ตามรหัสเครื่อง (10 รายการต่อหน้า)
+    ผลของแต่ละหน้าถูก cache ไว้จนกว่าข้อมูลที่แสดงจะเปลี่ยน (ดู caching.py)
     """
     model = Machine
     template_name = 'maintenance/machine_list.html'
     paginate_by = 10
+    keyset_fields = ('code',)
+    # ?sort=... -> keyset ที่ใช้เรียง (มี index รองรับทุกแบบ ดู Machine.Meta.indexes)
+    sort_options = {
+        'open': ('-open_workorder_count', 'code'),
+        'stale': ('last_maintenance_at', 'code'),
+    }
+    # ตัวนับของเครื่องจักรเปลี่ยนตามใบงาน
+    cache_depends_on = ('machine', 'workorder')
+
+    def get_keyset_fields(self):
+        # ผลการค้นหาเรียงตาม rank จึงใช้ Paginator ปกติ
+        if self.request.GET.get('q', '').strip():
+            return None
+        return self.sort_options.get(self.request.GET.get('sort'), self.keyset_fields)
 
     def get_queryset(self):
         qs = super().get_queryset().select_related('category', 'location').order_by('code')
-        q = self.request.GET.get('q')
+        if self.request.GET.get('open'):
+            qs = qs.filter(open_workorder_count__gt=0)
+        q = self.request.GET.get('q', '').strip()
         if q:
-            qs = qs.filter(name__icontains=q) | qs.filter(code__icontains=q)
+            qs = search.search(qs, q).order_by('-search_rank', 'code')
+        elif self.request.GET.get('sort') in self.sort_options:
+            qs = qs.order_by(*self.sort_options[self.request.GET['sort']])
         return qs
 
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['sort'] = self.request.GET.get('sort', '')
+        return ctx
+
+
+class MachineExportView(ExportMixin, MachineListView):
+    """
+    ส่งออกรายการเครื่องจักรเป็น CSV / XLSX แบบ streaming
+    ใช้ตัวกรองเดียวกับหน้ารายการ (?q=...) เลือกรูปแบบด้วย ?format=csv|xlsx
+    """
+    export_filename = 'machines'
+    export_fields = (
+        ('code', 'code'),
+        ('name', 'name'),
+        ('category', 'category__name'),
+        ('location', 'location__name'),
+        ('serial_no', 'serial_no'),
+        ('purchase_date', 'purchase_date'),
+        ('is_active', 'is_active'),
+        ('open_workorders', 'open_workorder_count'),
+        ('last_maintenance_at', 'last_maintenance_at'),
+    )
+
 
 class MachineCreateView(LoginRequiredMixin, CreateView):
     """
@@ -75,20 +346,64 @@ class MachineDetailView(LoginRequiredMixin, DetailView):
     model = Machine
     template_name = 'maintenance/machine_detail.html'
 
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        # ตารางแผน PM ใช้ fragment cache ที่ผูกกับเวอร์ชันของแผน
+        ctx['plans_cache_version'] = caching.version_token('plan')
+        ctx['cache_timeout'] = caching.get_timeout()
+        return ctx
+
 
 # ===== Plans =====
-class PlanListView(LoginRequiredMixin, ListView):
+class PlanListView(AsyncLoginRequiredMixin, AsyncListMixin, CachedPageMixin, KeysetPaginationMixin, ListView):
     """
     หน้าแสดงรายการแผนการบำรุงรักษา
     เรียงลำดับตามวันครบกำหนด (next_due_date)
-    แสดงผลแบบ pagination และรวมข้อมูลเครื่องจักรที่เกี่ยวข้อง
+    แสดงผลแบบ keyset pagination และรวมข้อมูลเครื่องจักรที่เกี่ยวข้อง
+    ผลของแต่ละหน้าถูก cache ไว้จนกว่าข้อมูลที่แสดงจะเปลี่ยน (ดู caching.py)
     """
     model = MaintenancePlan
     template_name = 'maintenance/plan_list.html'
     paginate_by = 10
+    keyset_fields = ('next_due_date', 'id')
+    cache_depends_on = ('machine', 'plan')
 
     def get_queryset(self):
-        return MaintenancePlan.objects.select_related('machine').order_by('next_due_date')
+        return MaintenancePlan.objects.with_machine().order_by('next_due_date')
+
+
+class PlanExportView(ExportMixin, PlanListView):
+    """
+    ส่งออกแผนการบำรุงรักษาเป็น CSV / XLSX แบบ streaming เรียงตามวันครบกำหนดเหมือนหน้ารายการ
+    """
+    export_filename = 'plans'
+    export_fields = (
+        ('id', 'id'),
+        ('machine_code', 'machine__code'),
+        ('machine_name', 'machine__name'),
+        ('location', 'machine__location__name'),
+        ('title', 'title'),
+        ('frequency_value', 'frequency_value'),
+        ('frequency_unit', 'frequency_unit'),
+        ('last_done_date', 'last_done_date'),
+        ('next_due_date', 'next_due_date'),
+    )
+
+
+class PlanWorkloadView(LoginRequiredMixin, TemplateView):
+    """
+    หน้าแสดงภาระงาน PM ล่วงหน้ารายเดือน แยกตามสถานที่
+    อ่านจากปฏิทิน PM (PMCalendarEntry) ที่พยากรณ์ไว้แล้ว ไม่ต้องคำนวณทีละแผน
+    """
+    template_name = 'maintenance/plan_workload.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        periods, rows = forecast.monthly_workload()
+        ctx['periods'] = periods
+        ctx['rows'] = rows
+        ctx['totals'] = [sum(counts) for counts in zip(*(counts for _, counts in rows))] if rows else []
+        return ctx
 
 
 class PlanCreateView(LoginRequiredMixin, CreateView):
@@ -128,18 +443,101 @@ class PlanUpdateView(LoginRequiredMixin, UpdateView):
 
 
 # ===== WorkOrders (+ Inline tasks) =====
-class WorkOrderListView(LoginRequiredMixin, ListView):
+class WorkOrderListView(AsyncLoginRequiredMixin, AsyncListMixin, CachedPageMixin, KeysetPaginationMixin, ListView):
     """
     หน้าแสดงรายการใบสั่งงานบำรุงรักษา
-    เรียงลำดับตามวันที่รายงาน (ล่าสุดก่อน)
+    เรียงลำดับตามวันที่รายงาน (ล่าสุดก่อน) แบบ keyset pagination พร้อมจำนวนโดยประมาณ
     รวมข้อมูลเครื่องจักรและแผนที่เกี่ยวข้อง
+    รองรับการค้นหาตามรหัส หัวข้อ หรือบันทึกของใบงาน
+    ผลของแต่ละหน้าถูก cache ไว้จนกว่าข้อมูลที่แสดงจะเปลี่ยน (ดู caching.py)
     """
     model = WorkOrder
     template_name = 'maintenance/workorder_list.html'
     paginate_by = 10
+    keyset_fields = ('-reported_at', '-id')
+    estimate_total = True
+    cache_depends_on = ('machine', 'plan', 'workorder')
+
+    def get_keyset_fields(self):
+        return None if self.request.GET.get('q', '').strip() else self.keyset_fields
 
     def get_queryset(self):
-        return WorkOrder.objects.select_related('machine', 'plan').order_by('-reported_at')
+        qs = WorkOrder.objects.select_related('machine', 'plan', 'assigned_to').order_by('-reported_at')
+        q = self.request.GET.get('q', '').strip()
+        if q:
+            qs = search.search(qs, q).order_by('-search_rank', '-reported_at')
+        return qs
+
+
+class WorkOrderExportView(ExportMixin, WorkOrderListView):
+    """
+    ส่งออกประวัติใบสั่งงานเป็น CSV / XLSX แบบ streaming สำหรับงาน audit
+    รวมข้อมูลเครื่องจักร แผน ผู้รับผิดชอบ และสัดส่วนงานย่อยที่เสร็จแล้ว
+    ใช้ตัวกรองเดียวกับหน้ารายการ (?q=...)
+    """
+    export_filename = 'workorders'
+    export_fields = (
+        ('code', 'code'),
+        ('type', 'wo_type'),
+        ('priority', 'priority'),
+        ('status', 'status'),
+        ('machine_code', 'machine__code'),
+        ('machine_name', 'machine__name'),
+        ('plan', 'plan__title'),
+        ('reported_by', 'reported_by__username'),
+        ('assigned_to', 'assigned_to__username'),
+        ('reported_at', 'reported_at'),
+        ('due_date', 'due_date'),
+        ('started_at', 'started_at'),
+        ('finished_at', 'finished_at'),
+        ('summary', 'summary'),
+        ('tasks_done', 'task_done'),
+        ('tasks_total', 'task_total'),
+    )
+
+    def get_export_header(self):
+        return super().get_export_header() + ['task_ratio']
+
+    def export_rows(self, rows):
+        # ต่อท้ายด้วยสัดส่วนงานย่อยที่เสร็จ (0-1)
+        for row in rows:
+            done, total = row[-2], row[-1]
+            yield row + (round(done / total, 4) if total else '',)
+
+
+EVENT_HEARTBEAT = 15  # วินาที: ส่ง comment กัน proxy ตัด connection ที่เงียบ
+
+
+async def workorder_events(request):
+    """
+    Server-Sent Events: ส่งการเปลี่ยนสถานะ ผู้รับผิดชอบ และงานย่อยของ Work Order แบบ real-time
+    ต้องรันภายใต้ ASGI เพื่อถือ connection ค้างไว้ได้โดยไม่กิน worker
+    ภายใต้ WSGI จะตอบกลับทันทีและให้ browser เชื่อมต่อใหม่ทุก 30 วินาที (เทียบเท่า polling)
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('retry: 30000\n\n', content_type='text/event-stream')
+
+    async def stream():
+        subscription = events.get_broker().subscribe()
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await subscription.get(timeout=EVENT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                yield events.format_sse(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # ให้ nginx ส่งต่อทันทีไม่ buffer
+    return response
 
 
 class WorkOrderCreateView(LoginRequiredMixin, CreateView):
@@ -164,9 +562,10 @@ class WorkOrderCreateView(LoginRequiredMixin, CreateView):
         form = self.get_form()
         formset = WorkOrderTaskFormSet(self.request.POST)
         if form.is_valid() and formset.is_valid():
-            self.object = form.save()
-            formset.instance = self.object
-            formset.save()
+            with transaction.atomic():
+                self.object = form.save()
+                formset.instance = self.object
+                checklist.save_formset(formset)
             return redirect(self.success_url)
         return render(request, self.template_name, {'form': form, 'formset': formset})
 
@@ -186,14 +585,72 @@ class WorkOrderUpdateView(LoginRequiredMixin, UpdateView):
         self.object = self.get_object()
         form = self.get_form()
         formset = WorkOrderTaskFormSet(instance=self.object)
-        return render(request, self.template_name, {'form': form, 'formset': formset})
+        return render(request, self.template_name, self.get_form_context(form, formset))
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
         form = self.get_form()
         formset = WorkOrderTaskFormSet(self.request.POST, instance=self.object)
         if form.is_valid() and formset.is_valid():
-            self.object = form.save()
-            formset.save()
+            with transaction.atomic():
+                self.object = form.save()
+                checklist.save_formset(formset)
             return redirect(self.success_url)
-        return render(request, self.template_name, {'form': form, 'formset': formset})
\ No newline at end of file
+        return render(request, self.template_name, self.get_form_context(form, formset))
+
+    def get_form_context(self, form, formset):
+        # ประวัติการเปลี่ยนแปลงจาก journal (ไม่ได้เก็บบนตาราง WorkOrder)
+        return {'form': form, 'formset': formset, 'history': journal.history(self.object)}
+
+
+class WorkOrderChecklistView(LoginRequiredMixin, View):
+    """
+    JSON API ของรายการงานย่อยในใบงาน (ไม่ต้อง render ฟอร์มทั้งหน้าใหม่)
+    GET  -> {"tasks": [...], "progress": {...}}
+    POST {"create": [...], "update": [...], "delete": [...]} บันทึกทั้งชุดใน transaction เดียว
+    """
+
+    def get(self, request, pk):
+        workorder = get_object_or_404(WorkOrder.objects.only('task_total', 'task_done'), pk=pk)
+        tasks = list(workorder.tasks.order_by('pk').values('id', 'title', 'is_done'))
+        return JsonResponse({'tasks': tasks, 'progress': {
+            'task_total': workorder.task_total, 'task_done': workorder.task_done,
+            'ratio': checklist.ratio(workorder.task_done, workorder.task_total),
+        }})
+
+    def post(self, request, pk):
+        workorder = get_object_or_404(WorkOrder.objects.only('pk'), pk=pk)
+        payload = _json_body(request)
+        changes, errors = checklist.parse_changes(workorder, payload)
+        if errors:
+            return JsonResponse({'errors': errors}, status=400)
+        checklist.apply(workorder, **changes)
+        return JsonResponse({
+            'created': [task.pk for task in changes['created']],
+            'progress': checklist.progress(workorder.pk),
+        })
+
+
+class WorkOrderChecklistToggleView(LoginRequiredMixin, View):
+    """
+    ติ๊กงานย่อยหลายข้อพร้อมกัน: POST {"ids": [...], "is_done": true}
+    ตอบกลับจำนวนที่เปลี่ยนและความคืบหน้าใหม่ของใบงาน
+    """
+
+    def post(self, request, pk):
+        workorder = get_object_or_404(WorkOrder.objects.only('pk'), pk=pk)
+        payload = _json_body(request)
+        ids = payload.get('ids') if isinstance(payload, dict) else None
+        is_done = payload.get('is_done') if isinstance(payload, dict) else None
+        if not isinstance(ids, list) or not all(type(i) is int for i in ids) or not isinstance(is_done, bool):
+            return JsonResponse({'errors': {'__all__': ['ต้องระบุ ids (list ของตัวเลข) และ is_done (true/false)']}},
+                                status=400)
+        changed = checklist.toggle(workorder, ids, is_done)
+        return JsonResponse({'changed': changed, 'progress': checklist.progress(workorder.pk)})
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        return None
\ No newline at end of file
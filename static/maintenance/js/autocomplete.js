@@ -0,0 +1,55 @@
+// ช่อง typeahead สำหรับ <select data-autocomplete-url> (ดู AutocompleteSelect ใน forms.py)
+// select เดิมถูกซ่อนไว้และยังเป็นค่าที่ส่งไปกับฟอร์ม ช่องข้อความค้นหาผ่าน JSON endpoint
+document.addEventListener('DOMContentLoaded', () => {
+  document.querySelectorAll('select[data-autocomplete-url]').forEach((select) => {
+    const input = document.createElement('input')
+    const list = document.createElement('datalist')
+    list.id = `${select.id}_list`
+    input.type = 'search'
+    input.className = 'form-control'
+    input.setAttribute('list', list.id)
+    input.autocomplete = 'off'
+    input.placeholder = 'พิมพ์เพื่อค้นหา...'
+    input.value = select.value ? select.selectedOptions[0].textContent : ''
+    select.classList.add('d-none')
+    select.after(input, list)
+
+    const found = new Map()
+    let timer = null
+
+    const fetchResults = async () => {
+      const params = new URLSearchParams({ q: input.value })
+      // แผนกรองตามเครื่องจักรที่เลือกในฟอร์มเดียวกัน
+      const machine = select.form?.querySelector('select[name="machine"]')
+      if (select.name === 'plan' && machine?.value) params.set('machine', machine.value)
+      const response = await fetch(`${select.dataset.autocompleteUrl}?${params}`)
+      if (!response.ok) return
+      const { results } = await response.json()
+      list.replaceChildren(...results.map((item) => {
+        found.set(item.text, item.id)
+        const option = document.createElement('option')
+        option.value = item.text
+        return option
+      }))
+    }
+
+    input.addEventListener('input', () => {
+      clearTimeout(timer)
+      timer = setTimeout(fetchResults, 200)
+    })
+    input.addEventListener('change', () => {
+      if (!input.value) {
+        select.value = ''
+        return
+      }
+      const id = found.get(input.value)
+      if (id === undefined) return
+      let option = [...select.options].find((o) => o.value === String(id))
+      if (!option) {
+        option = new Option(input.value, id)
+        select.add(option)
+      }
+      select.value = String(id)
+    })
+  })
+})
@@ -0,0 +1,49 @@
+// ติ๊กงานย่อยของใบงานที่บันทึกแล้วได้ทันทีโดยไม่ต้องกด Save ทั้งฟอร์ม (ดู views.WorkOrderChecklistToggleView)
+// การติ๊กหลายข้อติดกันถูกรวมเป็น request เดียว แล้วอัปเดตแถบความคืบหน้าจากผลที่ server ตอบกลับ
+document.addEventListener('DOMContentLoaded', () => {
+  const progress = document.getElementById('checklist-progress')
+  if (!progress) return
+  const form = progress.closest('form')
+  const bar = progress.querySelector('.progress-bar')
+  const boxes = () => form.querySelectorAll('tr[data-task-id] input[type="checkbox"][name$="-is_done"]')
+  const pending = new Map()
+  let timer = null
+
+  const render = ({ task_done: done, task_total: total, ratio }) => {
+    bar.style.width = `${Math.round(ratio * 100)}%`
+    bar.textContent = total ? `${done}/${total}` : ''
+  }
+
+  const send = async (isDone, ids) => {
+    const response = await fetch(progress.dataset.toggleUrl, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': form.querySelector('[name="csrfmiddlewaretoken"]').value,
+      },
+      body: JSON.stringify({ ids, is_done: isDone }),
+    })
+    if (response.ok) render((await response.json()).progress)
+  }
+
+  const flush = () => {
+    // หนึ่ง request ต่อค่า is_done (ติ๊ก / เอาติ๊กออก)
+    for (const isDone of [true, false]) {
+      const ids = [...pending].filter(([, done]) => done === isDone).map(([id]) => id)
+      if (ids.length) send(isDone, ids)
+    }
+    pending.clear()
+  }
+
+  boxes().forEach((box) => {
+    box.addEventListener('change', () => {
+      pending.set(Number(box.closest('tr').dataset.taskId), box.checked)
+      clearTimeout(timer)
+      timer = setTimeout(flush, 400)
+    })
+  })
+
+  const checked = [...boxes()].filter((box) => box.checked).length
+  const total = boxes().length
+  render({ task_done: checked, task_total: total, ratio: total ? checked / total : 0 })
+})
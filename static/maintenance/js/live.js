@@ -0,0 +1,47 @@
+// อัปเดต Work Order แบบ real-time ผ่าน Server-Sent Events (ดู views.workorder_events)
+// - หน้ารายการ: แก้ badge สถานะ ผู้รับผิดชอบ และจำนวนงานย่อยของแถวที่แสดงอยู่
+// - หน้าแดชบอร์ด: แสดงรายการเปลี่ยนแปลงล่าสุดใน #live-feed
+document.addEventListener('DOMContentLoaded', () => {
+  const script = document.querySelector('script[data-events-url]')
+  if (!script || !window.EventSource) return
+
+  const STATUS_BADGES = {
+    OPEN: 'badge bg-secondary',
+    IN_PROGRESS: 'badge bg-info text-dark',
+    DONE: 'badge bg-success',
+    CANCELLED: 'badge bg-dark',
+  }
+  const feed = document.getElementById('live-feed')
+  const source = new EventSource(script.dataset.eventsUrl)
+
+  const row = (id) => document.querySelector(`tr[data-wo-id="${id}"]`)
+
+  const addToFeed = (text) => {
+    if (!feed) return
+    feed.querySelector('.live-empty')?.remove()
+    const item = document.createElement('li')
+    item.className = 'list-group-item small'
+    item.textContent = `${new Date().toLocaleTimeString()} · ${text}`
+    feed.prepend(item)
+    while (feed.children.length > 10) feed.lastElementChild.remove()
+  }
+
+  source.addEventListener('workorder', (e) => {
+    const wo = JSON.parse(e.data)
+    const tr = row(wo.id)
+    if (tr) {
+      const badge = document.createElement('span')
+      badge.className = STATUS_BADGES[wo.status] || 'badge bg-dark'
+      badge.textContent = wo.status_display
+      tr.querySelector('.wo-status').replaceChildren(badge)
+      tr.querySelector('.wo-assigned').textContent = wo.assigned_to || '-'
+    }
+    addToFeed(`${wo.code}: ${wo.status_display}${wo.assigned_to ? ' → ' + wo.assigned_to : ''}`)
+  })
+
+  source.addEventListener('task', (e) => {
+    const tasks = JSON.parse(e.data)
+    const tr = row(tasks.id)
+    if (tr) tr.querySelector('.wo-tasks').textContent = `(${tasks.task_done}/${tasks.task_total})`
+  })
+})